@@ -1,23 +1,190 @@
 from fastapi import APIRouter, HTTPException, Depends, BackgroundTasks
-from typing import Dict, Any
+from fastapi.responses import StreamingResponse
+from typing import Dict, Any, AsyncIterator, Awaitable, Callable, Optional, Tuple
+from app.core.config import settings
 from app.models.requests import (
-    SummarizeRequest, QuestionAnswerRequest,
-    ToneRewriteRequest, TranslateRequest
+    SummarizeRequest, LongSummarizeRequest, QuestionAnswerRequest,
+    DocumentQuestionRequest, ToneRewriteRequest, TranslateRequest, BatchSubmitRequest
 )
-from app.models.responses import BaseResponse, AITaskResponse
-from app.services.ai_service import ai_service
+from app.models.responses import BaseResponse, AITaskResponse, JobStatus
+from app.services.ai_service import ai_service, AIServiceError
+from app.services.batch_service import micro_batcher
+from app.services.cache_keys import cache_keys
 from app.services.cache_service import cache_service
+from app.services.coalescing_service import request_coalescer
+from app.services.similarity_cache import similarity_cache
+from app.services.document_service import document_service
 from app.services.job_service import job_service
+from app.services.payload_store import payload_store
+from app.services.summarization_service import long_document_summarizer
 from app.workers.celery_worker import (
-    process_summarize_task, process_question_answer_task,
-    process_tone_rewrite_task, process_translate_task
+    process_summarize_task, process_long_summarize_task, process_question_answer_task,
+    process_tone_rewrite_task, process_translate_task, enqueue_batch
 )
 from app.api.dependencies import get_current_user, validate_request_size
+from app.utils.helpers import format_sse_event
 from app.utils.logger import app_logger
 import time
 
 router = APIRouter(prefix="/ai", tags=["ai"])
 
+async def _get_or_generate(
+    cache_key: str,
+    result_field: str,
+    generate: Callable[[], Awaitable[str]],
+    similarity_scope: Optional[str] = None,
+    similarity_text: Optional[str] = None,
+    wait_timeout: Optional[float] = None
+) -> Tuple[Dict[str, Any], bool]:
+    """Return (result_data, cached), coalescing concurrent misses on the same key
+    
+    Stale or nearly stale hits are served immediately while one background
+    refresh regenerates them. With a similarity scope, an exact miss may
+    still be answered from a near-duplicate request's result, marked as
+    approximate. Deterministic upstream failures are negatively cached, so
+    repeats of the same request fail fast without calling the model.
+    wait_timeout bounds how long a coalesced caller waits for a slow producer.
+    """
+    async def produce() -> Dict[str, Any]:
+        await _raise_recorded_failure(cache_key)
+        start_time = time.time()
+        try:
+            value = await generate()
+        except AIServiceError as e:
+            if e.deterministic:
+                await cache_service.set_negative(cache_key, str(e), e.reason)
+            raise
+        processing_time = time.time() - start_time
+        result_data = {result_field: value, "processing_time": processing_time}
+        stored = await cache_service.set(
+            cache_key, result_data, stale_ttl=settings.cache_stale_ttl, compute_time=processing_time
+        )
+        if stored and similarity_scope:
+            await similarity_cache.add(similarity_scope, similarity_text, cache_key)
+        return result_data
+    
+    cached_result, refresh = await cache_service.get_with_refresh(cache_key)
+    if cached_result:
+        if refresh:
+            request_coalescer.schedule_refresh(cache_key, produce)
+        return cached_result, True
+    
+    if similarity_scope:
+        match = await similarity_cache.lookup(similarity_scope, similarity_text)
+        if match:
+            result_data, similarity = match
+            return {**result_data, "approximate": True, "similarity": round(similarity, 4)}, True
+    
+    result_data, shared = await request_coalescer.run(cache_key, produce, wait_timeout)
+    if shared:
+        app_logger.info(f"Served coalesced result for key: {cache_key}")
+    return result_data, False
+
+async def _raise_recorded_failure(cache_key: str):
+    """Re-raise a deterministic failure recently recorded for a key"""
+    failure = await cache_service.get_negative(cache_key)
+    if failure:
+        raise AIServiceError(failure["error"], failure["reason"])
+
+async def _submit_job(
+    task_type: str,
+    payload: Dict[str, Any],
+    task,
+    cache_key: str,
+    result_field: str
+) -> Dict[str, Any]:
+    """Create a job for a request, queueing its task only when no result or identical job exists
+    
+    A fresh result under the sync route's cache key yields a job that is
+    already completed, and a duplicate of an unfinished job attaches to it.
+    Otherwise the payload is stored once and the task is queued with only
+    its reference.
+    """
+    cached_result, refresh = await cache_service.get_with_refresh(cache_key)
+    if cached_result and not refresh:
+        job_id = await job_service.create_job(
+            task_type, result={result_field: cached_result[result_field], "task_type": task_type}
+        )
+        return {"job_id": job_id, "cached": True, "deduplicated": False}
+    
+    job_id, attached = await job_service.claim_inflight(cache_key)
+    if not attached:
+        try:
+            payload_ref = await payload_store.put(payload)
+            await job_service.create_job(task_type, payload_ref, job_id=job_id)
+            task.apply_async((job_id, payload_ref), task_id=job_id)
+        except Exception as e:
+            # Fail the job, so callers that attached meanwhile stop waiting for it,
+            # and let later identical submissions start afresh
+            await job_service.update_job_status(job_id, JobStatus.FAILED, error=f"Could not queue task: {str(e)}")
+            await job_service.release_inflight(cache_key, job_id)
+            raise
+    return {"job_id": job_id, "cached": False, "deduplicated": attached}
+
+def _submission_message(task_name: str, submission: Dict[str, Any]) -> str:
+    """Response message describing what became of an async submission"""
+    if submission["cached"]:
+        return f"{task_name} result served from cache"
+    if submission["deduplicated"]:
+        return f"{task_name} task already in progress; attached to the existing job"
+    return f"{task_name} task queued successfully"
+
+def _error_status(error: Exception) -> int:
+    """HTTP status for an endpoint failure: 422 when the input itself cannot be processed"""
+    if isinstance(error, AIServiceError) and error.deterministic:
+        return 422
+    return 500
+
+def _cached_data(result_data: Dict[str, Any], result_field: str) -> Dict[str, Any]:
+    """Response data for a cache hit, flagging approximate (near-duplicate) hits"""
+    data = {result_field: result_data[result_field], "cached": True}
+    if result_data.get("approximate"):
+        data.update(approximate=True, similarity=result_data["similarity"])
+    return data
+
+async def _stream_events(
+    cache_key: str,
+    result_field: str,
+    stream_factory: Callable[[], AsyncIterator[str]]
+) -> AsyncIterator[str]:
+    """Stream model output as SSE and cache the assembled result once complete"""
+    cached_result = await cache_service.get(cache_key)
+    if cached_result:
+        yield format_sse_event({"text": cached_result[result_field]})
+        yield format_sse_event({result_field: cached_result[result_field], "cached": True}, event="done")
+        return
+    
+    start_time = time.time()
+    chunks = []
+    try:
+        await _raise_recorded_failure(cache_key)
+        async for chunk in stream_factory():
+            chunks.append(chunk)
+            yield format_sse_event({"text": chunk})
+    except Exception as e:
+        app_logger.error(f"Error streaming {result_field}: {str(e)}")
+        if isinstance(e, AIServiceError) and e.deterministic:
+            await cache_service.set_negative(cache_key, str(e), e.reason)
+        yield format_sse_event({"detail": str(e), "status_code": _error_status(e)}, event="error")
+        return
+    
+    processing_time = time.time() - start_time
+    result_data = {result_field: "".join(chunks).strip(), "processing_time": processing_time}
+    await cache_service.set(cache_key, result_data, stale_ttl=settings.cache_stale_ttl, compute_time=processing_time)
+    yield format_sse_event({**result_data, "cached": False}, event="done")
+
+def _streaming_response(
+    cache_key: str,
+    result_field: str,
+    stream_factory: Callable[[], AsyncIterator[str]]
+) -> StreamingResponse:
+    """Wrap an SSE generator in a non-buffered streaming response"""
+    return StreamingResponse(
+        _stream_events(cache_key, result_field, stream_factory),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @router.post("/summarize", response_model=BaseResponse)
 async def summarize_text_sync(
     request: SummarizeRequest,
@@ -26,27 +193,20 @@ async def summarize_text_sync(
 ):
     """Synchronously summarize text"""
     try:
-        # Check cache first
-        cache_key = cache_service.create_key("summary", f"{request.text}_{request.max_length}")
-        cached_result = await cache_service.get(cache_key)
+        cache_key = cache_keys.summarize(request)
+        result_data, cached = await _get_or_generate(
+            cache_key, "summary", lambda: ai_service.summarize_text(request),
+            similarity_scope=cache_keys.summarize_scope(request), similarity_text=request.text
+        )
         
-        if cached_result:
+        if cached:
             app_logger.info("Returning cached summary")
             return BaseResponse(
                 success=True,
                 message="Text summarized successfully (cached)",
-                data={"summary": cached_result["summary"], "cached": True}
+                data=_cached_data(result_data, "summary")
             )
         
-        # Generate summary
-        start_time = time.time()
-        summary = await ai_service.summarize_text(request)
-        processing_time = time.time() - start_time
-        
-        # Cache result
-        result_data = {"summary": summary, "processing_time": processing_time}
-        await cache_service.set(cache_key, result_data)
-        
         return BaseResponse(
             success=True,
             message="Text summarized successfully",
@@ -54,7 +214,16 @@ async def summarize_text_sync(
         )
     except Exception as e:
         app_logger.error(f"Error in summarize endpoint: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
+        raise HTTPException(status_code=_error_status(e), detail=str(e))
+
+@router.post("/summarize/stream")
+async def summarize_text_stream(
+    request: SummarizeRequest,
+    user: Dict = Depends(get_current_user)
+):
+    """Stream a summary as Server-Sent Events"""
+    cache_key = cache_keys.summarize(request)
+    return _streaming_response(cache_key, "summary", lambda: ai_service.stream_summary(request))
 
 @router.post("/summarize/async", response_model=BaseResponse)
 async def summarize_text_async(
@@ -63,21 +232,71 @@ async def summarize_text_async(
 ):
     """Asynchronously summarize text"""
     try:
-        # Create job
-        job_id = job_service.create_job("summarize", request.dict())
-        
-        # Queue task
-        process_summarize_task.delay(job_id, request.dict())
+        submission = await _submit_job(
+            "summarize", request.dict(), process_summarize_task,
+            cache_keys.summarize(request), "summary"
+        )
         
         return BaseResponse(
             success=True,
-            message="Summarization task queued successfully",
-            data={"job_id": job_id}
+            message=_submission_message("Summarization", submission),
+            data=submission
         )
     except Exception as e:
         app_logger.error(f"Error in async summarize endpoint: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/summarize/long", response_model=BaseResponse)
+async def summarize_long_text_sync(
+    request: LongSummarizeRequest,
+    user: Dict = Depends(get_current_user),
+    _: None = Depends(validate_request_size)
+):
+    """Synchronously summarize a long document with map-reduce"""
+    try:
+        cache_key = cache_keys.summarize_long(request)
+        result_data, cached = await _get_or_generate(
+            cache_key, "summary", lambda: long_document_summarizer.summarize(request),
+            wait_timeout=settings.long_summary_timeout
+        )
+        
+        if cached:
+            return BaseResponse(
+                success=True,
+                message="Document summarized successfully (cached)",
+                data=_cached_data(result_data, "summary")
+            )
+        
+        return BaseResponse(
+            success=True,
+            message="Document summarized successfully",
+            data={**result_data, "cached": False}
+        )
+    except Exception as e:
+        app_logger.error(f"Error in long summarize endpoint: {str(e)}")
+        raise HTTPException(status_code=_error_status(e), detail=str(e))
+
+@router.post("/summarize/long/async", response_model=BaseResponse)
+async def summarize_long_text_async(
+    request: LongSummarizeRequest,
+    user: Dict = Depends(get_current_user)
+):
+    """Asynchronously summarize a long document with map-reduce"""
+    try:
+        submission = await _submit_job(
+            "summarize_long", request.dict(), process_long_summarize_task,
+            cache_keys.summarize_long(request), "summary"
+        )
+        
+        return BaseResponse(
+            success=True,
+            message=_submission_message("Long document summarization", submission),
+            data=submission
+        )
+    except Exception as e:
+        app_logger.error(f"Error in async long summarize endpoint: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.post("/question-answer", response_model=BaseResponse)
 async def answer_question_sync(
     request: QuestionAnswerRequest,
@@ -85,34 +304,72 @@ async def answer_question_sync(
 ):
     """Synchronously answer question"""
     try:
-        # Check cache
-        cache_key = cache_service.create_key("qa", f"{request.context}_{request.question}")
-        cached_result = await cache_service.get(cache_key)
+        cache_key = cache_keys.question_answer(request)
+        result_data, cached = await _get_or_generate(
+            cache_key, "answer", lambda: ai_service.answer_question(request)
+        )
         
-        if cached_result:
+        if cached:
             return BaseResponse(
                 success=True,
                 message="Question answered successfully (cached)",
-                data={"answer": cached_result["answer"], "cached": True}
+                data=_cached_data(result_data, "answer")
             )
         
-        # Generate answer
-        start_time = time.time()
-        answer = await ai_service.answer_question(request)
-        processing_time = time.time() - start_time
+        return BaseResponse(
+            success=True,
+            message="Question answered successfully",
+            data={**result_data, "cached": False}
+        )
+    except Exception as e:
+        app_logger.error(f"Error in question-answer endpoint: {str(e)}")
+        raise HTTPException(status_code=_error_status(e), detail=str(e))
+
+@router.post("/question-answer/stream")
+async def answer_question_stream(
+    request: QuestionAnswerRequest,
+    user: Dict = Depends(get_current_user)
+):
+    """Stream an answer as Server-Sent Events"""
+    cache_key = cache_keys.question_answer(request)
+    return _streaming_response(cache_key, "answer", lambda: ai_service.stream_answer(request))
+
+@router.post("/question-answer/document", response_model=BaseResponse)
+async def answer_document_question_sync(
+    request: DocumentQuestionRequest,
+    user: Dict = Depends(get_current_user)
+):
+    """Answer a question against a previously ingested document"""
+    try:
+        index = await document_service.get_index(request.doc_id)
+        if index is None:
+            raise HTTPException(status_code=404, detail="Document not found")
+        
+        cache_key = cache_keys.document_question(request)
         
-        # Cache result
-        result_data = {"answer": answer, "processing_time": processing_time}
-        await cache_service.set(cache_key, result_data)
+        async def generate() -> str:
+            passages = index.top_passages(request.question, request.top_k, request.max_context_tokens)
+            return await ai_service.answer_from_passages(passages, request.question)
+        
+        result_data, cached = await _get_or_generate(cache_key, "answer", generate)
+        
+        if cached:
+            return BaseResponse(
+                success=True,
+                message="Question answered successfully (cached)",
+                data=_cached_data(result_data, "answer")
+            )
         
         return BaseResponse(
             success=True,
             message="Question answered successfully",
             data={**result_data, "cached": False}
         )
+    except HTTPException:
+        raise
     except Exception as e:
-        app_logger.error(f"Error in question-answer endpoint: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
+        app_logger.error(f"Error in document question-answer endpoint: {str(e)}")
+        raise HTTPException(status_code=_error_status(e), detail=str(e))
 
 @router.post("/question-answer/async", response_model=BaseResponse)
 async def answer_question_async(
@@ -121,13 +378,15 @@ async def answer_question_async(
 ):
     """Asynchronously answer question"""
     try:
-        job_id = job_service.create_job("question_answer", request.dict())
-        process_question_answer_task.delay(job_id, request.dict())
+        submission = await _submit_job(
+            "question_answer", request.dict(), process_question_answer_task,
+            cache_keys.question_answer(request), "answer"
+        )
         
         return BaseResponse(
             success=True,
-            message="Question answering task queued successfully",
-            data={"job_id": job_id}
+            message=_submission_message("Question answering", submission),
+            data=submission
         )
     except Exception as e:
         app_logger.error(f"Error in async question-answer endpoint: {str(e)}")
@@ -140,23 +399,20 @@ async def rewrite_tone_sync(
 ):
     """Synchronously rewrite text tone"""
     try:
-        cache_key = cache_service.create_key("tone", f"{request.text}_{request.target_tone}")
-        cached_result = await cache_service.get(cache_key)
+        cache_key = cache_keys.tone_rewrite(request)
+        result_data, cached = await _get_or_generate(
+            cache_key, "rewritten_text",
+            lambda: micro_batcher.rewrite_tone(request) if micro_batcher.accepts(request.text)
+            else ai_service.rewrite_tone(request)
+        )
         
-        if cached_result:
+        if cached:
             return BaseResponse(
                 success=True,
                 message="Text tone rewritten successfully (cached)",
-                data={"rewritten_text": cached_result["rewritten_text"], "cached": True}
+                data=_cached_data(result_data, "rewritten_text")
             )
         
-        start_time = time.time()
-        rewritten_text = await ai_service.rewrite_tone(request)
-        processing_time = time.time() - start_time
-        
-        result_data = {"rewritten_text": rewritten_text, "processing_time": processing_time}
-        await cache_service.set(cache_key, result_data)
-        
         return BaseResponse(
             success=True,
             message="Text tone rewritten successfully",
@@ -164,7 +420,16 @@ async def rewrite_tone_sync(
         )
     except Exception as e:
         app_logger.error(f"Error in tone-rewrite endpoint: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
+        raise HTTPException(status_code=_error_status(e), detail=str(e))
+
+@router.post("/tone-rewrite/stream")
+async def rewrite_tone_stream(
+    request: ToneRewriteRequest,
+    user: Dict = Depends(get_current_user)
+):
+    """Stream a tone rewrite as Server-Sent Events"""
+    cache_key = cache_keys.tone_rewrite(request)
+    return _streaming_response(cache_key, "rewritten_text", lambda: ai_service.stream_tone_rewrite(request))
 
 @router.post("/tone-rewrite/async", response_model=BaseResponse)
 async def rewrite_tone_async(
@@ -173,13 +438,15 @@ async def rewrite_tone_async(
 ):
     """Asynchronously rewrite text tone"""
     try:
-        job_id = job_service.create_job("tone_rewrite", request.dict())
-        process_tone_rewrite_task.delay(job_id, request.dict())
+        submission = await _submit_job(
+            "tone_rewrite", request.dict(), process_tone_rewrite_task,
+            cache_keys.tone_rewrite(request), "rewritten_text"
+        )
         
         return BaseResponse(
             success=True,
-            message="Tone rewriting task queued successfully",
-            data={"job_id": job_id}
+            message=_submission_message("Tone rewriting", submission),
+            data=submission
         )
     except Exception as e:
         app_logger.error(f"Error in async tone-rewrite endpoint: {str(e)}")
@@ -192,26 +459,21 @@ async def translate_text_sync(
 ):
     """Synchronously translate text"""
     try:
-        cache_key = cache_service.create_key(
-            "translate", 
-            f"{request.text}_{request.target_language}_{request.source_language}"
+        cache_key = cache_keys.translate(request)
+        result_data, cached = await _get_or_generate(
+            cache_key, "translation",
+            lambda: micro_batcher.translate(request) if micro_batcher.accepts(request.text)
+            else ai_service.translate_text(request),
+            similarity_scope=cache_keys.translate_scope(request), similarity_text=request.text
         )
-        cached_result = await cache_service.get(cache_key)
         
-        if cached_result:
+        if cached:
             return BaseResponse(
                 success=True,
                 message="Text translated successfully (cached)",
-                data={"translation": cached_result["translation"], "cached": True}
+                data=_cached_data(result_data, "translation")
             )
         
-        start_time = time.time()
-        translation = await ai_service.translate_text(request)
-        processing_time = time.time() - start_time
-        
-        result_data = {"translation": translation, "processing_time": processing_time}
-        await cache_service.set(cache_key, result_data)
-        
         return BaseResponse(
             success=True,
             message="Text translated successfully",
@@ -219,7 +481,16 @@ async def translate_text_sync(
         )
     except Exception as e:
         app_logger.error(f"Error in translate endpoint: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
+        raise HTTPException(status_code=_error_status(e), detail=str(e))
+
+@router.post("/translate/stream")
+async def translate_text_stream(
+    request: TranslateRequest,
+    user: Dict = Depends(get_current_user)
+):
+    """Stream a translation as Server-Sent Events"""
+    cache_key = cache_keys.translate(request)
+    return _streaming_response(cache_key, "translation", lambda: ai_service.stream_translation(request))
 
 @router.post("/translate/async", response_model=BaseResponse)
 async def translate_text_async(
@@ -228,14 +499,38 @@ async def translate_text_async(
 ):
     """Asynchronously translate text"""
     try:
-        job_id = job_service.create_job("translate", request.dict())
-        process_translate_task.delay(job_id, request.dict())
+        submission = await _submit_job(
+            "translate", request.dict(), process_translate_task,
+            cache_keys.translate(request), "translation"
+        )
         
         return BaseResponse(
             success=True,
-            message="Translation task queued successfully",
-            data={"job_id": job_id}
+            message=_submission_message("Translation", submission),
+            data=submission
         )
     except Exception as e:
         app_logger.error(f"Error in async translate endpoint: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/batch", response_model=BaseResponse)
+async def submit_batch(
+    request: BatchSubmitRequest,
+    user: Dict = Depends(get_current_user),
+    _: None = Depends(validate_request_size)
+):
+    """Queue many items of any task type as one batch; track them with GET /jobs/batch/{batch_id}"""
+    try:
+        payload_refs = await payload_store.put_many([item.payload for item in request.items])
+        items = [(item.task_type.value, payload_ref) for item, payload_ref in zip(request.items, payload_refs)]
+        batch_id, job_ids = await job_service.create_batch(items)
+        enqueue_batch([(job_id, task_type, payload_ref) for job_id, (task_type, payload_ref) in zip(job_ids, items)])
+        
+        return BaseResponse(
+            success=True,
+            message=f"Batch of {len(items)} tasks queued successfully",
+            data={"batch_id": batch_id, "total": len(items)}
+        )
+    except Exception as e:
+        app_logger.error(f"Error in batch submit endpoint: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,60 @@
+from fastapi import APIRouter, HTTPException, Depends
+from typing import Dict
+from app.models.requests import DocumentIngestRequest
+from app.models.responses import BaseResponse
+from app.services.document_service import document_service
+from app.api.dependencies import get_current_user, validate_request_size
+from app.utils.logger import app_logger
+
+router = APIRouter(prefix="/documents", tags=["documents"])
+
+@router.post("", response_model=BaseResponse)
+async def ingest_document(
+    request: DocumentIngestRequest,
+    user: Dict = Depends(get_current_user),
+    _: None = Depends(validate_request_size)
+):
+    """Ingest a document once and get a doc_id for repeated questions"""
+    try:
+        document = await document_service.ingest(request.text, request.title)
+        return BaseResponse(
+            success=True,
+            message="Document ingested successfully" if document["created"] else "Document already ingested",
+            data=document
+        )
+    except Exception as e:
+        app_logger.error(f"Error ingesting document: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/{doc_id}", response_model=BaseResponse)
+async def get_document(
+    doc_id: str,
+    user: Dict = Depends(get_current_user)
+):
+    """Get document metadata"""
+    try:
+        document = await document_service.get_metadata(doc_id)
+        if not document:
+            raise HTTPException(status_code=404, detail="Document not found")
+        return BaseResponse(success=True, message="Document found", data=document)
+    except HTTPException:
+        raise
+    except Exception as e:
+        app_logger.error(f"Error getting document: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+@router.delete("/{doc_id}", response_model=BaseResponse)
+async def delete_document(
+    doc_id: str,
+    user: Dict = Depends(get_current_user)
+):
+    """Delete a document and its passage index"""
+    try:
+        if not await document_service.delete(doc_id):
+            raise HTTPException(status_code=404, detail="Document not found")
+        return BaseResponse(success=True, message="Document deleted", data={"doc_id": doc_id})
+    except HTTPException:
+        raise
+    except Exception as e:
+        app_logger.error(f"Error deleting document: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal server error")
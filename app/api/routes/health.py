@@ -3,6 +3,8 @@ from datetime import datetime
 from app.core.config import settings
 from app.models.responses import HealthResponse
 from app.services.cache_service import cache_service
+from app.services.payload_store import payload_store
+from app.services.similarity_cache import similarity_cache
 from app.utils.logger import app_logger
 from app.utils.monitoring import SystemMonitor
 
@@ -15,11 +17,7 @@ async def health_check():
     
     # Check Redis connection
     try:
-        if cache_service.redis_client:
-            cache_service.redis_client.ping()
-            services["redis"] = "healthy"
-        else:
-            services["redis"] = "unhealthy"
+        services["redis"] = "healthy" if await cache_service.ping() else "unhealthy"
     except Exception as e:
         services["redis"] = "unhealthy"
         app_logger.error(f"Redis health check failed: {str(e)}")
@@ -63,4 +61,17 @@ async def get_metrics():
         return {"success": True, "data": metrics}
     except Exception as e:
         app_logger.error(f"Error getting metrics: {str(e)}")
-        return {"success": False, "error": str(e)}
\ No newline at end of file
+        return {"success": False, "error": str(e)}
+
+@router.get("/cache")
+async def get_cache_stats():
+    """Get cache counters for this process and namespace budget usage"""
+    return {
+        "success": True,
+        "data": {
+            **cache_service.get_stats(),
+            "budgets": await cache_service.get_budget_usage(),
+            "similarity": similarity_cache.stats,
+            "payloads": payload_store.stats
+        }
+    }
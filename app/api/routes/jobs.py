@@ -1,20 +1,112 @@
-from fastapi import APIRouter, HTTPException, Depends
-from typing import Dict
-from app.models.responses import BaseResponse, JobResponse
-from app.services.job_service import job_service
+from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi.responses import StreamingResponse
+from typing import Any, AsyncIterator, Dict
+from app.core.config import settings
+from app.models.responses import BaseResponse, BatchStatusResponse, JobResponse
+from app.services.job_service import job_service, TERMINAL_STATUSES
+from app.workers.celery_worker import revoke_tasks
 from app.api.dependencies import get_current_user
+from app.utils.helpers import format_sse_event
 from app.utils.logger import app_logger
 
 router = APIRouter(prefix="/jobs", tags=["jobs"])
 
+async def _status_events(updates: AsyncIterator[Any], is_final) -> AsyncIterator[str]:
+    """Format watched states as SSE: "status" for each change, "done" for the final one"""
+    try:
+        async for state in updates:
+            if state is None:
+                yield ": keepalive\n\n"
+                continue
+            final = is_final(state)
+            yield format_sse_event(state.model_dump(mode="json"), event="done" if final else "status")
+    except Exception as e:
+        app_logger.error(f"Error streaming job events: {str(e)}")
+        yield format_sse_event({"detail": str(e)}, event="error")
+
+def _event_stream(events: AsyncIterator[str]) -> StreamingResponse:
+    """Wrap an SSE generator in a non-buffered streaming response"""
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.get("/batch/{batch_id}", response_model=BatchStatusResponse)
+async def get_batch_status(
+    batch_id: str,
+    offset: int = Query(0, ge=0, description="Index of the first item to return"),
+    limit: int = Query(100, ge=1, le=1000, description="Max items to return"),
+    user: Dict = Depends(get_current_user)
+):
+    """Get a batch's aggregate counts and progress, with one page of per-item results"""
+    try:
+        batch = await job_service.get_batch_status(batch_id, offset, limit)
+        if not batch:
+            raise HTTPException(status_code=404, detail="Batch not found")
+        return batch
+    except HTTPException:
+        raise
+    except Exception as e:
+        app_logger.error(f"Error getting batch status: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+@router.delete("/batch/{batch_id}", response_model=BaseResponse)
+async def cancel_batch(
+    batch_id: str,
+    user: Dict = Depends(get_current_user)
+):
+    """Cancel every job of a batch that has not finished yet"""
+    try:
+        job_ids = await job_service.get_batch_job_ids(batch_id)
+        if not job_ids:
+            raise HTTPException(status_code=404, detail="Batch not found")
+        
+        cancelled, _ = await job_service.cancel_jobs(job_ids)
+        revoke_tasks([task_id for _, task_id in cancelled])
+        return BaseResponse(
+            success=True,
+            message=f"Cancelled {len(cancelled)} of {len(job_ids)} jobs",
+            data={"batch_id": batch_id, "cancelled": len(cancelled), "total": len(job_ids)}
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        app_logger.error(f"Error cancelling batch: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+@router.get("/batch/{batch_id}/events")
+async def stream_batch_events(
+    batch_id: str,
+    user: Dict = Depends(get_current_user)
+):
+    """Stream a batch's counts and progress as Server-Sent Events until every job has finished"""
+    try:
+        if not await job_service.get_batch_status(batch_id, limit=0):
+            raise HTTPException(status_code=404, detail="Batch not found")
+    except HTTPException:
+        raise
+    except Exception as e:
+        app_logger.error(f"Error getting batch status: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+    
+    updates = job_service.watch_batch(batch_id, settings.job_events_timeout, settings.job_events_heartbeat)
+    return _event_stream(_status_events(updates, lambda batch: batch.progress >= 1.0))
+
 @router.get("/{job_id}", response_model=JobResponse)
 async def get_job_status(
     job_id: str,
+    wait: float = Query(0, ge=0, le=60, description="Long-poll: seconds to wait for the job to finish"),
     user: Dict = Depends(get_current_user)
 ):
-    """Get job status and result"""
+    """Get job status and result, optionally waiting for the job to finish"""
     try:
-        job = await job_service.get_job_status(job_id)
+        if wait > 0:
+            job = None
+            async for job in job_service.watch_job(job_id, wait):
+                pass
+        else:
+            job = await job_service.get_job_status(job_id)
         if not job:
             raise HTTPException(status_code=404, detail="Job not found")
         return job
@@ -24,26 +116,56 @@ async def get_job_status(
         app_logger.error(f"Error getting job status: {str(e)}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
+@router.get("/{job_id}/events")
+async def stream_job_events(
+    job_id: str,
+    user: Dict = Depends(get_current_user)
+):
+    """Stream a job's status changes as Server-Sent Events until it finishes"""
+    try:
+        if not await job_service.get_job_status(job_id):
+            raise HTTPException(status_code=404, detail="Job not found")
+    except HTTPException:
+        raise
+    except Exception as e:
+        app_logger.error(f"Error getting job status: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+    
+    updates = job_service.watch_job(job_id, settings.job_events_timeout, settings.job_events_heartbeat)
+    return _event_stream(_status_events(updates, lambda job: job.status in TERMINAL_STATUSES))
+
 @router.delete("/{job_id}", response_model=BaseResponse)
 async def cancel_job(
     job_id: str,
     user: Dict = Depends(get_current_user)
 ):
-    """Cancel a job (if possible)"""
+    """Cancel a pending or running job
+    
+    A job shared by identical submissions keeps running for the others;
+    each cancellation withdraws one submission and the last one cancels it.
+    """
     try:
-        # In a real implementation, you'd use Celery's revoke functionality
-        # For now, we'll just mark it as cancelled in our cache
-        job = await job_service.get_job_status(job_id)
-        if not job:
-            raise HTTPException(status_code=404, detail="Job not found")
+        cancelled, withdrawn = await job_service.cancel_jobs([job_id])
+        if withdrawn:
+            return BaseResponse(
+                success=True,
+                message="Submission withdrawn; the job continues for other identical submissions",
+                data={"job_id": job_id, "status": "withdrawn"}
+            )
+        if not cancelled:
+            job = await job_service.get_job_status(job_id)
+            if not job:
+                raise HTTPException(status_code=404, detail="Job not found")
+            raise HTTPException(status_code=409, detail=f"Job already {job.status.value}")
         
+        revoke_tasks([task_id for _, task_id in cancelled])
         return BaseResponse(
             success=True,
-            message="Job cancellation requested",
-            data={"job_id": job_id, "note": "Cancellation support depends on job status"}
+            message="Job cancelled successfully",
+            data={"job_id": job_id, "status": "cancelled"}
         )
     except HTTPException:
         raise
     except Exception as e:
         app_logger.error(f"Error cancelling job: {str(e)}")
-        raise HTTPException(status_code=500, detail="Internal server error")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail="Internal server error")
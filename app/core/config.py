@@ -15,12 +15,106 @@ class Settings(BaseSettings):
     max_request_size: int = 10000
     
     # Google AI settings
-    google_api_key: str
+    google_api_key: str = ""  # Required by the gemini backend
     ai_model: str = "gemini-1.5-flash"
+    ai_max_concurrency: int = 16  # Max in-flight upstream calls per process
+    ai_backend: str = "gemini"  # "gemini" or "stub" (offline, deterministic)
+    
+    # Stub backend settings for offline load tests and benchmarks
+    stub_latency_ms: float = 200.0
+    stub_latency_distribution: str = "fixed"  # "fixed", "uniform" or "lognormal"
+    stub_latency_jitter_ms: float = 50.0  # Half-width of the uniform distribution
+    stub_latency_sigma: float = 0.5  # Shape of the lognormal distribution
+    stub_error_rate: float = 0.0
+    stub_output_words: int = 40
+    stub_stream_chunk_chars: int = 16
+    stub_stream_delay_ms: float = 20.0
+    stub_seed: Optional[int] = None
+    stub_block_marker: str = "[stub-blocked]"  # Prompts containing this are refused deterministically
+    
+    # Long-document summarization settings
+    long_summary_chunk_chars: int = 8000  # Must stay within SummarizeRequest's 10,000-char limit
+    long_summary_chunk_summary_length: int = 500
+    long_summary_concurrency: int = 4
+    long_summary_timeout: int = 1800  # Max seconds a long-document summary may take (task limit, coalescing wait)
+    
+    # Question answering passage selection settings
+    qa_passage_chars: int = 800
+    
+    # Document store settings
+    document_ttl: int = 604800  # 7 days
+    document_index_cache_size: int = 32  # Warm passage indexes kept in memory per process
     
     # Redis settings
     redis_url: str = "redis://localhost:6379/0"
     cache_ttl: int = 3600
+    redis_max_connections: int = 50
+    redis_socket_timeout: float = 2.0
+    redis_socket_connect_timeout: float = 2.0
+    redis_health_check_interval: int = 30
+    redis_mode: str = "single"  # single, sharded (consistent hashing over redis_shard_urls) or cluster
+    redis_shard_urls: str = ""  # Comma-separated node URLs for sharded mode
+    redis_shard_vnodes: int = 160  # Virtual nodes per shard on the hash ring
+    redis_pubsub_url: str = ""  # Node for pub/sub in sharded/cluster mode (defaults to the first shard / REDIS_URL)
+    
+    # Near-duplicate (SimHash) result cache settings
+    similarity_cache_enabled: bool = False
+    similarity_cache_thresholds: str = "summary:0.95,translate:0.97"  # namespace:min similarity
+    similarity_cache_min_tokens: int = 20
+    similarity_cache_max_band_size: int = 512  # Newest fingerprints kept per LSH band
+    
+    # Cached value encoding settings
+    cache_codec: str = "msgpack"  # msgpack or json
+    cache_compress_min_bytes: int = 1024  # zlib-compress encoded values at least this large (0 disables)
+    cache_compression_level: int = 1
+    
+    # In-process L1 cache settings
+    l1_cache_enabled: bool = True
+    l1_cache_max_entries: int = 10000
+    l1_cache_max_bytes: int = 67108864  # 64 MB
+    l1_cache_ttl: int = 300  # Upper bound; never longer than the Redis TTL
+    l1_cache_prefixes: str = "summary,summary_long,qa,qa_doc,tone,translate"
+    cache_invalidation_channel: str = "cache:invalidate"
+    
+    # Cache admission, TTL and memory budget settings
+    cache_policy_enabled: bool = True
+    cache_min_ttl: int = 300
+    cache_max_ttl: int = 86400
+    cache_policy_reference_seconds: float = 2.0  # Results this slow to produce get CACHE_TTL when seen once
+    cache_policy_reference_bytes: int = 16384  # Larger results get proportionally shorter TTLs
+    cache_admission_min_seconds: float = 0.05  # Cheaper results are only cached once requested again
+    cache_namespace_budgets_mb: str = (
+        "summary:64,summary_long:32,summary_chunk:64,qa:64,qa_doc:32,tone:32,translate:32"
+    )
+    
+    # Stale-while-revalidate settings
+    cache_stale_ttl: int = 600  # Seconds a result may be served stale while it is refreshed (0 disables)
+    cache_xfetch_beta: float = 1.0  # Higher values refresh earlier before the soft expiry
+    cache_refresh_lock_ttl: int = 30
+    
+    # Negative cache settings for deterministic upstream failures
+    negative_cache_enabled: bool = True
+    negative_cache_ttl: int = 300
+    
+    # Request coalescing settings
+    coalesce_enabled: bool = True
+    coalesce_lock_ttl: int = 120  # Seconds a leader may hold a key before followers take over
+    coalesce_wait_timeout: float = 60.0  # Max seconds a follower waits for the leader's result
+    
+    # Micro-batching settings for short translate/tone-rewrite requests
+    batching_enabled: bool = False
+    batch_window_ms: int = 10
+    batch_max_size: int = 16
+    batch_max_text_length: int = 500
+    batch_fallback_to_single: bool = True
+    
+    # Job settings
+    job_ttl: int = 86400  # Seconds a job record lives after creation, and after it finishes
+    job_events_timeout: int = 900  # Max seconds a job/batch event stream stays open
+    job_events_heartbeat: int = 15  # Seconds between keepalive comments on idle event streams
+    job_batch_event_interval: float = 0.5  # Min seconds between batch progress events
+    job_dedup_enabled: bool = True  # Attach identical async submissions to the job already producing them
+    job_dedup_window: int = 3600  # Max seconds a submission can attach to an earlier identical job
     
     # Celery settings
     celery_broker_url: str = "redis://localhost:6379/1"
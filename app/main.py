@@ -6,7 +6,9 @@ import time
 import os
 
 from app.core.config import settings
-from app.api.routes import health, ai_tasks, jobs
+from app.api.routes import health, ai_tasks, jobs, documents
+from app.services.cache_service import cache_service
+from app.services.job_service import job_service
 from app.utils.logger import app_logger
 
 # Create logs directory
@@ -64,6 +66,7 @@ async def internal_error_handler(request: Request, exc: Exception):
 app.include_router(health.router, prefix=settings.api_v1_prefix)
 app.include_router(ai_tasks.router, prefix=settings.api_v1_prefix)
 app.include_router(jobs.router, prefix=settings.api_v1_prefix)
+app.include_router(documents.router, prefix=settings.api_v1_prefix)
 
 # Root endpoint
 @app.get("/")
@@ -82,11 +85,14 @@ async def startup_event():
     """Application startup"""
     app_logger.info(f"Starting {settings.app_name} v{settings.version}")
     app_logger.info(f"Debug mode: {settings.debug}")
+    await cache_service.start_invalidation_listener()
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Application shutdown"""
     app_logger.info(f"Shutting down {settings.app_name}")
+    await job_service.stop_event_listener()
+    await cache_service.close()
 
 if __name__ == "__main__":
     import uvicorn
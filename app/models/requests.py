@@ -1,9 +1,10 @@
-from pydantic import BaseModel, Field
-from typing import Optional, Dict, Any
+from pydantic import BaseModel, Field, model_validator
+from typing import Optional, Dict, Any, List
 from enum import Enum
 
 class AITaskType(str, Enum):
     SUMMARIZE = "summarize"
+    SUMMARIZE_LONG = "summarize_long"
     QUESTION_ANSWER = "question_answer"
     TONE_REWRITE = "tone_rewrite"
     TRANSLATE = "translate"
@@ -12,9 +13,46 @@ class SummarizeRequest(BaseModel):
     text: str = Field(..., min_length=10, max_length=10000, description="Text to summarize")
     max_length: Optional[int] = Field(200, ge=50, le=1000, description="Maximum summary length")
 
+class LongSummarizeRequest(BaseModel):
+    text: str = Field(..., min_length=10, max_length=1_000_000, description="Long document to summarize in chunks")
+    max_length: Optional[int] = Field(200, ge=50, le=1000, description="Maximum summary length")
+
+# Longest context sent to the model whole; longer ones require passage selection
+QA_FULL_CONTEXT_MAX_LENGTH = 5000
+
 class QuestionAnswerRequest(BaseModel):
-    context: str = Field(..., min_length=10, max_length=5000, description="Context for answering")
+    context: str = Field(
+        ..., min_length=10, max_length=200_000,
+        description=f"Context for answering (over {QA_FULL_CONTEXT_MAX_LENGTH} characters requires passage_selection)"
+    )
     question: str = Field(..., min_length=5, max_length=500, description="Question to answer")
+    passage_selection: bool = Field(
+        False,
+        description="Send only the passages most relevant to the question (BM25-ranked) instead of the whole context"
+    )
+    top_k: int = Field(5, ge=1, le=50, description="Max passages to send when passage_selection is enabled")
+    max_context_tokens: int = Field(
+        1500, ge=100, le=32000, description="Approximate token budget for selected passages"
+    )
+    
+    @model_validator(mode="after")
+    def validate_context_length(self) -> "QuestionAnswerRequest":
+        """Only accept contexts too long to send whole when passage selection will trim them"""
+        if not self.passage_selection and len(self.context) > QA_FULL_CONTEXT_MAX_LENGTH:
+            raise ValueError(
+                f"context longer than {QA_FULL_CONTEXT_MAX_LENGTH} characters requires passage_selection"
+            )
+        return self
+
+class DocumentIngestRequest(BaseModel):
+    text: str = Field(..., min_length=10, max_length=1_000_000, description="Document to chunk and index")
+    title: Optional[str] = Field(None, max_length=200, description="Optional document title")
+
+class DocumentQuestionRequest(BaseModel):
+    doc_id: str = Field(..., min_length=1, max_length=64, description="ID returned by POST /documents")
+    question: str = Field(..., min_length=5, max_length=500, description="Question to answer")
+    top_k: int = Field(5, ge=1, le=50, description="Max passages to send to the model")
+    max_context_tokens: int = Field(1500, ge=100, le=32000, description="Approximate token budget for passages")
 
 class ToneRewriteRequest(BaseModel):
     text: str = Field(..., min_length=5, max_length=2000, description="Text to rewrite")
@@ -23,4 +61,26 @@ class ToneRewriteRequest(BaseModel):
 class TranslateRequest(BaseModel):
     text: str = Field(..., min_length=1, max_length=2000, description="Text to translate")
     target_language: str = Field(..., min_length=2, max_length=20, description="Target language")
-    source_language: Optional[str] = Field(None, min_length=2, max_length=20, description="Source language (auto-detect if not provided)")
\ No newline at end of file
+    source_language: Optional[str] = Field(None, min_length=2, max_length=20, description="Source language (auto-detect if not provided)")
+
+# Request model validating each task type's payload
+TASK_REQUEST_MODELS = {
+    AITaskType.SUMMARIZE: SummarizeRequest,
+    AITaskType.SUMMARIZE_LONG: LongSummarizeRequest,
+    AITaskType.QUESTION_ANSWER: QuestionAnswerRequest,
+    AITaskType.TONE_REWRITE: ToneRewriteRequest,
+    AITaskType.TRANSLATE: TranslateRequest
+}
+
+class BatchItem(BaseModel):
+    task_type: AITaskType = Field(..., description="Task to run on this item")
+    payload: Dict[str, Any] = Field(..., description="Request body of the task's /async endpoint")
+    
+    @model_validator(mode="after")
+    def validate_payload(self) -> "BatchItem":
+        """Validate the payload against its task's request model, filling in defaults"""
+        self.payload = TASK_REQUEST_MODELS[self.task_type](**self.payload).dict()
+        return self
+
+class BatchSubmitRequest(BaseModel):
+    items: List[BatchItem] = Field(..., min_length=1, max_length=10000, description="Items to process as one batch")
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 from datetime import datetime
 from enum import Enum
 
@@ -8,6 +8,7 @@ class JobStatus(str, Enum):
     PROCESSING = "processing"
     COMPLETED = "completed"
     FAILED = "failed"
+    CANCELLED = "cancelled"
 
 class BaseResponse(BaseModel):
     success: bool
@@ -22,6 +23,16 @@ class JobResponse(BaseModel):
     result: Optional[Dict[str, Any]] = None
     error: Optional[str] = None
 
+class BatchStatusResponse(BaseModel):
+    batch_id: str
+    total: int
+    counts: Dict[str, int]
+    progress: float
+    created_at: datetime
+    offset: int
+    limit: int
+    items: List[JobResponse]
+
 class AITaskResponse(BaseModel):
     task_id: str
     status: str
@@ -0,0 +1,175 @@
+"""
+Model backends behind AIService
+
+A backend turns a prompt into text, either all at once or as a stream of
+chunks. Calls are blocking; AIService runs them in its bounded executor.
+"""
+
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+from typing import Iterator, Optional, Protocol
+from app.core.config import settings
+from app.utils.logger import app_logger
+
+class ModelBackend(Protocol):
+    """Interface every model backend implements"""
+    
+    name: str
+    
+    def generate(self, prompt: str) -> str:
+        """Generate the full response text for a prompt"""
+        ...
+    
+    def stream(self, prompt: str) -> Iterator[str]:
+        """Yield response text chunks for a prompt as they are produced"""
+        ...
+    
+    def classify_error(self, error: Exception) -> Optional[str]:
+        """Reason code if an error will recur for the same prompt (e.g. a safety block), None if transient"""
+        ...
+
+class GeminiBackend:
+    """Google Generative AI (Gemini) backend"""
+    
+    name = "gemini"
+    
+    def __init__(self):
+        import google.generativeai as genai
+        
+        if not settings.google_api_key:
+            raise ValueError("GOOGLE_API_KEY is required for the gemini backend")
+        genai.configure(api_key=settings.google_api_key)
+        self.model = genai.GenerativeModel(settings.ai_model)
+    
+    def generate(self, prompt: str) -> str:
+        """Generate the full response text for a prompt"""
+        return self.model.generate_content(prompt).text
+    
+    def stream(self, prompt: str) -> Iterator[str]:
+        """Yield response text chunks for a prompt as they are produced"""
+        for chunk in self.model.generate_content(prompt, stream=True):
+            if chunk.text:
+                yield chunk.text
+    
+    def classify_error(self, error: Exception) -> Optional[str]:
+        """Reason code if an error will recur for the same prompt (e.g. a safety block), None if transient"""
+        from google.api_core import exceptions as api_exceptions
+        from google.generativeai.types import BlockedPromptException, StopCandidateException
+        
+        if isinstance(error, BlockedPromptException):
+            return "prompt_blocked"
+        if isinstance(error, StopCandidateException):
+            return "response_blocked"
+        if isinstance(error, api_exceptions.InvalidArgument):
+            message = str(error).lower()
+            return "prompt_too_long" if "token" in message or "too long" in message else "invalid_request"
+        # response.text raises ValueError when the candidate was withheld (safety/recitation)
+        if isinstance(error, ValueError) and "response.text" in str(error):
+            return "response_blocked"
+        return None
+
+class StubBackendError(Exception):
+    """Failure injected by the stub backend"""
+
+class StubBlockedError(Exception):
+    """Deterministic refusal of a prompt containing the stub block marker"""
+
+class StubBackend:
+    """Offline backend with deterministic output and simulated latency/errors
+    
+    The response text depends only on the prompt, so caching behaves exactly
+    as with a real model. Latency is sampled from the configured distribution
+    and transient failures are injected at the configured rate. Prompts
+    containing STUB_BLOCK_MARKER are always refused, like a safety block.
+    """
+    
+    name = "stub"
+    
+    _BATCH_PATTERN = re.compile(r"JSON array of exactly (\d+) strings.*?Input:\n(.*)\n\nOutput:", re.S)
+    
+    def __init__(self):
+        self._rng = random.Random(settings.stub_seed)
+        self._lock = threading.Lock()
+    
+    def _sample_latency(self) -> float:
+        """Sample a response latency in seconds"""
+        mean = settings.stub_latency_ms / 1000
+        if mean <= 0:
+            return 0.0
+        with self._lock:
+            if settings.stub_latency_distribution == "uniform":
+                spread = settings.stub_latency_jitter_ms / 1000
+                return max(0.0, self._rng.uniform(mean - spread, mean + spread))
+            if settings.stub_latency_distribution == "lognormal":
+                sigma = settings.stub_latency_sigma
+                return self._rng.lognormvariate(math.log(mean) - sigma ** 2 / 2, sigma)
+        return mean
+    
+    def _maybe_fail(self):
+        """Raise an injected failure at the configured error rate"""
+        with self._lock:
+            failed = self._rng.random() < settings.stub_error_rate
+        if failed:
+            raise StubBackendError("Stub backend injected failure")
+    
+    @staticmethod
+    def _check_blocked(prompt: str):
+        """Refuse prompts containing the block marker"""
+        if settings.stub_block_marker and settings.stub_block_marker in prompt:
+            raise StubBlockedError("Stub backend blocked the prompt")
+    
+    @staticmethod
+    def _respond(prompt: str) -> str:
+        """Deterministic response text for a prompt"""
+        digest = hashlib.blake2b(prompt.encode(), digest_size=8).hexdigest()
+        
+        batch = StubBackend._BATCH_PATTERN.search(prompt)
+        if batch:
+            texts = json.loads(batch.group(2))
+            return json.dumps([f"[stub {digest}:{i}] {text}" for i, text in enumerate(texts)])
+        
+        words = prompt.split()
+        picker = random.Random(digest)
+        body = " ".join(picker.choice(words) for _ in range(settings.stub_output_words))
+        return f"[stub {digest}] {body}"
+    
+    def generate(self, prompt: str) -> str:
+        """Generate the full response text for a prompt"""
+        time.sleep(self._sample_latency())
+        self._check_blocked(prompt)
+        self._maybe_fail()
+        return self._respond(prompt)
+    
+    def stream(self, prompt: str) -> Iterator[str]:
+        """Yield response text in fixed-size chunks with a delay between them"""
+        time.sleep(self._sample_latency())
+        self._check_blocked(prompt)
+        self._maybe_fail()
+        text = self._respond(prompt)
+        size = max(1, settings.stub_stream_chunk_chars)
+        for start in range(0, len(text), size):
+            if start:
+                time.sleep(settings.stub_stream_delay_ms / 1000)
+            yield text[start:start + size]
+    
+    def classify_error(self, error: Exception) -> Optional[str]:
+        """Reason code if an error will recur for the same prompt, None if transient"""
+        return "prompt_blocked" if isinstance(error, StubBlockedError) else None
+
+BACKENDS = {
+    GeminiBackend.name: GeminiBackend,
+    StubBackend.name: StubBackend
+}
+
+def create_backend() -> ModelBackend:
+    """Instantiate the backend selected by the AI_BACKEND setting"""
+    backend_class = BACKENDS.get(settings.ai_backend)
+    if backend_class is None:
+        raise ValueError(f"Unknown AI backend: {settings.ai_backend} (expected one of {', '.join(BACKENDS)})")
+    app_logger.info(f"Using {settings.ai_backend} AI backend")
+    return backend_class()
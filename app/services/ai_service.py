@@ -1,102 +1,291 @@
-import google.generativeai as genai
-from typing import Dict, Any, Optional
+import asyncio
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Optional, AsyncIterator, List
 from app.core.config import settings
 from app.models.requests import (
     SummarizeRequest, QuestionAnswerRequest, 
     ToneRewriteRequest, TranslateRequest
 )
+from app.services.ai_backends import create_backend
+from app.services.retrieval_service import select_passages
 from app.utils.logger import app_logger
 from app.utils.helpers import timing_decorator
 
+# Bump whenever a prompt template below changes, so cached results from the old prompts stop matching
+PROMPT_VERSION = 1
+
+class AIServiceError(Exception):
+    """Upstream model failure, with a reason code when retrying the same input cannot succeed"""
+    
+    def __init__(self, message: str, reason: Optional[str] = None):
+        super().__init__(message)
+        self.reason = reason
+    
+    @property
+    def deterministic(self) -> bool:
+        """Whether the same request will fail again (safety block, prompt too long, ...)"""
+        return self.reason is not None
+
 class AIService:
-    """Google Generative AI service"""
+    """Generative AI service running prompts on the configured model backend"""
     
     def __init__(self):
-        genai.configure(api_key=settings.google_api_key)
-        self.model = genai.GenerativeModel(settings.ai_model)
-        app_logger.info(f"Initialized AI service with model: {settings.ai_model}")
+        self.backend = create_backend()
+        # Bounded pool for blocking SDK calls so upstream latency never stalls the event loop
+        self.executor = ThreadPoolExecutor(
+            max_workers=settings.ai_max_concurrency,
+            thread_name_prefix="ai-upstream"
+        )
+        app_logger.info(
+            f"Initialized AI service with {self.backend.name} backend, model: {settings.ai_model} "
+            f"(max concurrency: {settings.ai_max_concurrency})"
+        )
     
-    @timing_decorator
-    async def summarize_text(self, request: SummarizeRequest) -> str:
-        """Summarize text using AI"""
-        prompt = f"""Summarize the following text in approximately {request.max_length} characters.
+    def _error(self, action: str, error: Exception) -> AIServiceError:
+        """Wrap an upstream error, classifying it with the backend"""
+        if isinstance(error, AIServiceError):
+            return error
+        return AIServiceError(f"{action} failed: {str(error)}", self.backend.classify_error(error))
+    
+    async def _generate(self, prompt: str) -> str:
+        """Run a generation request off the event loop and return the stripped text"""
+        loop = asyncio.get_running_loop()
+        text = await loop.run_in_executor(self.executor, self.backend.generate, prompt)
+        return text.strip()
+    
+    async def _stream(self, prompt: str) -> AsyncIterator[str]:
+        """Stream generated text chunks from an executor thread as they arrive"""
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        stop = threading.Event()
+        done = object()
+        
+        def produce():
+            try:
+                for chunk in self.backend.stream(prompt):
+                    if stop.is_set():
+                        break
+                    loop.call_soon_threadsafe(queue.put_nowait, chunk)
+            except Exception as e:
+                loop.call_soon_threadsafe(queue.put_nowait, e)
+            finally:
+                loop.call_soon_threadsafe(queue.put_nowait, done)
+        
+        producer = loop.run_in_executor(self.executor, produce)
+        try:
+            while True:
+                item = await queue.get()
+                if item is done:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            # Stop pulling from upstream if the client went away mid-stream
+            stop.set()
+            await asyncio.shield(producer)
+    
+    @staticmethod
+    def build_summarize_prompt(request: SummarizeRequest) -> str:
+        """Build the summarization prompt"""
+        return f"""Summarize the following text in approximately {request.max_length} characters.
 Focus on the key points and main ideas. Make it concise and clear.
 
 Text to summarize:
 {request.text}
 
 Summary:"""
-        
+
+    @staticmethod
+    def build_question_answer_prompt(request: QuestionAnswerRequest) -> str:
+        """Build the question answering prompt"""
+        context = request.context
+        if request.passage_selection:
+            context = select_passages(
+                request.context, request.question,
+                request.top_k, request.max_context_tokens, settings.qa_passage_chars
+            )
+        return AIService.build_context_answer_prompt(context, request.question)
+    
+    @staticmethod
+    def build_context_answer_prompt(context: str, question: str) -> str:
+        """Build the question answering prompt for a context that needs no further trimming"""
+        return f"""Based on the following context, answer the question accurately and concisely.
+If the answer is not available in the context, say so clearly.
+
+Context:
+{context}
+
+Question: {question}
+
+Answer:"""
+
+    @staticmethod
+    def build_tone_rewrite_prompt(request: ToneRewriteRequest) -> str:
+        """Build the tone rewriting prompt"""
+        return f"""Rewrite the following text to match the target tone: {request.target_tone}
+Keep the meaning intact while changing the style and tone appropriately.
+
+Original text:
+{request.text}
+
+Rewritten text ({request.target_tone} tone):"""
+
+    @staticmethod
+    def build_translate_prompt(request: TranslateRequest) -> str:
+        """Build the translation prompt"""
+        source_lang = f"from {request.source_language} " if request.source_language else ""
+        return f"""Translate the following text {source_lang}to {request.target_language}.
+Provide only the translation, no explanations.
+
+Text to translate:
+{request.text}
+
+Translation:"""
+
+    @staticmethod
+    def build_batch_prompt(instruction: str, texts: List[str]) -> str:
+        """Build a prompt that applies one instruction to many short texts"""
+        return f"""{instruction}
+Apply the instruction to each string in the JSON array below independently.
+Return only a JSON array of exactly {len(texts)} strings, in the same order, with no other text.
+
+Input:
+{json.dumps(texts, ensure_ascii=False)}
+
+Output:"""
+
+    @staticmethod
+    def parse_batch_response(text: str, expected: int) -> List[str]:
+        """Parse a JSON array answer to a batch prompt, raising ValueError if malformed"""
+        cleaned = text.strip()
+        if cleaned.startswith("```"):
+            cleaned = cleaned.strip("`").strip()
+            if cleaned.startswith("json"):
+                cleaned = cleaned[4:]
+        results = json.loads(cleaned)
+        if (
+            not isinstance(results, list)
+            or len(results) != expected
+            or not all(isinstance(item, str) for item in results)
+        ):
+            raise ValueError(f"Expected a JSON array of {expected} strings")
+        return [item.strip() for item in results]
+    
+    @timing_decorator
+    async def summarize_text(self, request: SummarizeRequest) -> str:
+        """Summarize text using AI"""
         try:
-            response = self.model.generate_content(prompt)
-            result = response.text.strip()
+            result = await self._generate(self.build_summarize_prompt(request))
             app_logger.info(f"Successfully summarized text of {len(request.text)} characters")
             return result
         except Exception as e:
             app_logger.error(f"Error summarizing text: {str(e)}")
-            raise Exception(f"AI summarization failed: {str(e)}")
+            raise self._error("AI summarization", e) from e
     
     @timing_decorator
     async def answer_question(self, request: QuestionAnswerRequest) -> str:
         """Answer question based on context"""
-        prompt = f"""Based on the following context, answer the question accurately and concisely.
-If the answer is not available in the context, say so clearly.
-
-Context:
-{request.context}
-
-Question: {request.question}
-
-Answer:"""
-        
         try:
-            response = self.model.generate_content(prompt)
-            result = response.text.strip()
+            result = await self._generate(self.build_question_answer_prompt(request))
             app_logger.info("Successfully answered question")
             return result
         except Exception as e:
             app_logger.error(f"Error answering question: {str(e)}")
-            raise Exception(f"AI question answering failed: {str(e)}")
+            raise self._error("AI question answering", e) from e
+    
+    @timing_decorator
+    async def answer_from_passages(self, passages: List[str], question: str) -> str:
+        """Answer question based on passages already selected from a stored document"""
+        try:
+            result = await self._generate(self.build_context_answer_prompt("\n\n".join(passages), question))
+            app_logger.info(f"Successfully answered question from {len(passages)} passages")
+            return result
+        except Exception as e:
+            app_logger.error(f"Error answering question: {str(e)}")
+            raise self._error("AI question answering", e) from e
     
     @timing_decorator
     async def rewrite_tone(self, request: ToneRewriteRequest) -> str:
         """Rewrite text with different tone"""
-        prompt = f"""Rewrite the following text to match the target tone: {request.target_tone}
-Keep the meaning intact while changing the style and tone appropriately.
-
-Original text:
-{request.text}
-
-Rewritten text ({request.target_tone} tone):"""
-        
         try:
-            response = self.model.generate_content(prompt)
-            result = response.text.strip()
+            result = await self._generate(self.build_tone_rewrite_prompt(request))
             app_logger.info(f"Successfully rewrote text to {request.target_tone} tone")
             return result
         except Exception as e:
             app_logger.error(f"Error rewriting tone: {str(e)}")
-            raise Exception(f"AI tone rewriting failed: {str(e)}")
+            raise self._error("AI tone rewriting", e) from e
     
     @timing_decorator
     async def translate_text(self, request: TranslateRequest) -> str:
         """Translate text to target language"""
-        source_lang = f"from {request.source_language} " if request.source_language else ""
-        prompt = f"""Translate the following text {source_lang}to {request.target_language}.
-Provide only the translation, no explanations.
-
-Text to translate:
-{request.text}
-
-Translation:"""
-        
         try:
-            response = self.model.generate_content(prompt)
-            result = response.text.strip()
+            result = await self._generate(self.build_translate_prompt(request))
             app_logger.info(f"Successfully translated text to {request.target_language}")
             return result
         except Exception as e:
             app_logger.error(f"Error translating text: {str(e)}")
-            raise Exception(f"AI translation failed: {str(e)}")
+            raise self._error("AI translation", e) from e
+    
+    @timing_decorator
+    async def rewrite_tone_batch(self, texts: List[str], target_tone: str) -> List[str]:
+        """Rewrite several short texts to the same tone in one model call"""
+        instruction = (
+            f"Rewrite each text to match the target tone: {target_tone}. "
+            "Keep the meaning intact while changing the style and tone appropriately."
+        )
+        result = await self._generate(self.build_batch_prompt(instruction, texts))
+        app_logger.info(f"Successfully rewrote batch of {len(texts)} texts to {target_tone} tone")
+        return self.parse_batch_response(result, len(texts))
+    
+    @timing_decorator
+    async def translate_batch(self, texts: List[str], target_language: str, source_language: Optional[str] = None) -> List[str]:
+        """Translate several short texts to the same language in one model call"""
+        source_lang = f"from {source_language} " if source_language else ""
+        instruction = (
+            f"Translate each text {source_lang}to {target_language}. "
+            "Provide only the translation, no explanations."
+        )
+        result = await self._generate(self.build_batch_prompt(instruction, texts))
+        app_logger.info(f"Successfully translated batch of {len(texts)} texts to {target_language}")
+        return self.parse_batch_response(result, len(texts))
+    
+    async def stream_summary(self, request: SummarizeRequest) -> AsyncIterator[str]:
+        """Stream a summary chunk by chunk"""
+        try:
+            async for chunk in self._stream(self.build_summarize_prompt(request)):
+                yield chunk
+        except Exception as e:
+            app_logger.error(f"Error streaming summary: {str(e)}")
+            raise self._error("AI summarization", e) from e
+    
+    async def stream_answer(self, request: QuestionAnswerRequest) -> AsyncIterator[str]:
+        """Stream an answer chunk by chunk"""
+        try:
+            async for chunk in self._stream(self.build_question_answer_prompt(request)):
+                yield chunk
+        except Exception as e:
+            app_logger.error(f"Error streaming answer: {str(e)}")
+            raise self._error("AI question answering", e) from e
+    
+    async def stream_tone_rewrite(self, request: ToneRewriteRequest) -> AsyncIterator[str]:
+        """Stream a tone rewrite chunk by chunk"""
+        try:
+            async for chunk in self._stream(self.build_tone_rewrite_prompt(request)):
+                yield chunk
+        except Exception as e:
+            app_logger.error(f"Error streaming tone rewrite: {str(e)}")
+            raise self._error("AI tone rewriting", e) from e
+    
+    async def stream_translation(self, request: TranslateRequest) -> AsyncIterator[str]:
+        """Stream a translation chunk by chunk"""
+        try:
+            async for chunk in self._stream(self.build_translate_prompt(request)):
+                yield chunk
+        except Exception as e:
+            app_logger.error(f"Error streaming translation: {str(e)}")
+            raise self._error("AI translation", e) from e
 
-ai_service = AIService()
\ No newline at end of file
+ai_service = AIService()
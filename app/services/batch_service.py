@@ -0,0 +1,131 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+from app.core.config import settings
+from app.models.requests import ToneRewriteRequest, TranslateRequest
+from app.services.ai_service import ai_service
+from app.utils.logger import app_logger
+
+class _PendingBatch:
+    """Requests collected for one group while its batch window is open"""
+    
+    def __init__(self, batch_call: Callable[[List[Any]], Awaitable[List[str]]], single_call: Callable[[Any], Awaitable[str]]):
+        self.batch_call = batch_call
+        self.single_call = single_call
+        self.requests: List[Any] = []
+        self.futures: List[asyncio.Future] = []
+        self.timer: Optional[asyncio.Task] = None
+
+class MicroBatcher:
+    """Collect short translate/tone requests for a few milliseconds and send them as one model call
+    
+    Requests are grouped by target language or tone. A batch is flushed when
+    the window closes or the group reaches the max batch size. If the model's
+    answer cannot be split back per request, each request falls back to its
+    own call when fallback is enabled.
+    """
+    
+    def __init__(self):
+        self._pending: Dict[Tuple, _PendingBatch] = {}
+        # Strong references to running batches, so they are not garbage-collected mid-flight
+        self._executing: Set[asyncio.Task] = set()
+        self.stats = {"batches": 0, "batched_requests": 0, "fallbacks": 0}
+    
+    @staticmethod
+    def accepts(text: str) -> bool:
+        """Whether a request is short enough to be batched"""
+        return settings.batching_enabled and len(text) <= settings.batch_max_text_length
+    
+    async def translate(self, request: TranslateRequest) -> str:
+        """Translate through a batch shared with other requests for the same languages"""
+        group = ("translate", request.target_language.lower(), (request.source_language or "").lower())
+        return await self._submit(
+            group,
+            request,
+            lambda requests: ai_service.translate_batch(
+                [r.text for r in requests], request.target_language, request.source_language
+            ),
+            ai_service.translate_text
+        )
+    
+    async def rewrite_tone(self, request: ToneRewriteRequest) -> str:
+        """Rewrite tone through a batch shared with other requests for the same tone"""
+        group = ("tone", request.target_tone.lower())
+        return await self._submit(
+            group,
+            request,
+            lambda requests: ai_service.rewrite_tone_batch([r.text for r in requests], request.target_tone),
+            ai_service.rewrite_tone
+        )
+    
+    async def _submit(
+        self,
+        group: Tuple,
+        request: Any,
+        batch_call: Callable[[List[Any]], Awaitable[List[str]]],
+        single_call: Callable[[Any], Awaitable[str]]
+    ) -> str:
+        """Add a request to its group's pending batch and wait for its result"""
+        batch = self._pending.get(group)
+        if batch is None:
+            batch = self._pending[group] = _PendingBatch(batch_call, single_call)
+            batch.timer = asyncio.create_task(self._flush_later(group, batch))
+        
+        future = asyncio.get_running_loop().create_future()
+        batch.requests.append(request)
+        batch.futures.append(future)
+        
+        if len(batch.requests) >= settings.batch_max_size:
+            batch.timer.cancel()
+            self._flush(group, batch)
+        
+        return await future
+    
+    async def _flush_later(self, group: Tuple, batch: _PendingBatch):
+        """Flush a group once its batch window has elapsed"""
+        await asyncio.sleep(settings.batch_window_ms / 1000)
+        self._flush(group, batch)
+    
+    def _flush(self, group: Tuple, batch: _PendingBatch):
+        """Detach a batch from its group and execute it in the background"""
+        if self._pending.get(group) is batch:
+            del self._pending[group]
+            task = asyncio.create_task(self._execute(batch))
+            self._executing.add(task)
+            task.add_done_callback(self._batch_done)
+    
+    def _batch_done(self, task: asyncio.Task):
+        """Release a finished batch task and log any error it raised"""
+        self._executing.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            app_logger.error(f"Batch execution failed: {str(task.exception())}")
+    
+    async def _execute(self, batch: _PendingBatch):
+        """Run one batch and resolve every waiting caller"""
+        requests = batch.requests
+        try:
+            if len(requests) == 1:
+                results = [await batch.single_call(requests[0])]
+            else:
+                results = await batch.batch_call(requests)
+                self.stats["batches"] += 1
+                self.stats["batched_requests"] += len(requests)
+        except Exception as e:
+            if len(requests) > 1 and settings.batch_fallback_to_single:
+                app_logger.warning(f"Batch of {len(requests)} failed, falling back to single calls: {str(e)}")
+                self.stats["fallbacks"] += 1
+                results = await asyncio.gather(
+                    *(batch.single_call(request) for request in requests),
+                    return_exceptions=True
+                )
+            else:
+                results = [e] * len(requests)
+        
+        for future, result in zip(batch.futures, results):
+            if future.done():
+                continue
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+micro_batcher = MicroBatcher()
@@ -0,0 +1,121 @@
+"""
+Canonical cache keys for AI results
+
+Keys hash a normalized, structured view of the request together with the
+task, the model identity and the prompt-template version, so equivalent
+requests share an entry and a model or prompt change rolls the cache over.
+"""
+
+import hashlib
+import json
+import re
+import unicodedata
+from typing import Any, Dict, Optional
+from app.core.config import settings
+from app.models.requests import (
+    AITaskType, SummarizeRequest, LongSummarizeRequest, QuestionAnswerRequest,
+    DocumentQuestionRequest, ToneRewriteRequest, TranslateRequest
+)
+from app.services.ai_service import PROMPT_VERSION, ai_service
+
+_WHITESPACE = re.compile(r"\s+")
+
+def normalize_text(text: Optional[str]) -> Optional[str]:
+    """Unicode-normalize text and collapse runs of whitespace"""
+    if text is None:
+        return None
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFC", text)).strip()
+
+def normalize_label(label: Optional[str]) -> Optional[str]:
+    """Normalize a short label (tone, language, question) case-insensitively"""
+    text = normalize_text(label)
+    return text.casefold() if text is not None else None
+
+class CacheKeyBuilder:
+    """Build namespaced keys like ``summary:<blake2b digest>`` for every cached AI result"""
+    
+    def __init__(self, prompt_version: int = PROMPT_VERSION):
+        self.prompt_version = prompt_version
+    
+    @property
+    def model(self) -> str:
+        """Identity of the model producing results"""
+        return f"{ai_service.backend.name}/{settings.ai_model}"
+    
+    def build(self, namespace: str, task: str, fields: Dict[str, Any]) -> str:
+        """Hash the fields structurally (JSON, sorted keys) so values can never run together"""
+        canonical = json.dumps(
+            {"task": task, "model": self.model, "prompt": self.prompt_version, "fields": fields},
+            sort_keys=True, separators=(",", ":"), ensure_ascii=False
+        )
+        digest = hashlib.blake2b(canonical.encode(), digest_size=16).hexdigest()
+        return f"{namespace}:{digest}"
+    
+    def summarize(self, request: SummarizeRequest) -> str:
+        """Key for a single-prompt summary"""
+        return self.build("summary", AITaskType.SUMMARIZE.value, {
+            "text": normalize_text(request.text),
+            "max_length": request.max_length
+        })
+    
+    def summarize_scope(self, request: SummarizeRequest) -> str:
+        """Key over everything but the text, grouping summaries that may share near-duplicate results"""
+        return self.build("summary", AITaskType.SUMMARIZE.value, {"max_length": request.max_length})
+    
+    def summary_chunk(self, chunk: str, max_length: int) -> str:
+        """Key for the summary of one long-document chunk"""
+        return self.build("summary_chunk", AITaskType.SUMMARIZE.value, {
+            "text": normalize_text(chunk),
+            "max_length": max_length
+        })
+    
+    def summarize_long(self, request: LongSummarizeRequest) -> str:
+        """Key for a map-reduce summary, which also depends on the chunking settings"""
+        return self.build("summary_long", AITaskType.SUMMARIZE_LONG.value, {
+            "text": normalize_text(request.text),
+            "max_length": request.max_length,
+            "chunk_chars": settings.long_summary_chunk_chars,
+            "chunk_summary_length": settings.long_summary_chunk_summary_length
+        })
+    
+    def question_answer(self, request: QuestionAnswerRequest) -> str:
+        """Key for a Q&A answer, including passage selection options when enabled"""
+        fields = {
+            "context": normalize_text(request.context),
+            "question": normalize_label(request.question)
+        }
+        if request.passage_selection:
+            fields["passages"] = [request.top_k, request.max_context_tokens, settings.qa_passage_chars]
+        return self.build("qa", AITaskType.QUESTION_ANSWER.value, fields)
+    
+    def document_question(self, request: DocumentQuestionRequest) -> str:
+        """Key for a Q&A answer over an ingested document"""
+        return self.build("qa_doc", AITaskType.QUESTION_ANSWER.value, {
+            "doc_id": request.doc_id,
+            "question": normalize_label(request.question),
+            "passages": [request.top_k, request.max_context_tokens]
+        })
+    
+    def tone_rewrite(self, request: ToneRewriteRequest) -> str:
+        """Key for a tone rewrite"""
+        return self.build("tone", AITaskType.TONE_REWRITE.value, {
+            "text": normalize_text(request.text),
+            "target_tone": normalize_label(request.target_tone)
+        })
+    
+    def translate(self, request: TranslateRequest) -> str:
+        """Key for a translation"""
+        return self.build("translate", AITaskType.TRANSLATE.value, {
+            "text": normalize_text(request.text),
+            "target_language": normalize_label(request.target_language),
+            "source_language": normalize_label(request.source_language)
+        })
+    
+    def translate_scope(self, request: TranslateRequest) -> str:
+        """Key over everything but the text, grouping translations that may share near-duplicate results"""
+        return self.build("translate", AITaskType.TRANSLATE.value, {
+            "target_language": normalize_label(request.target_language),
+            "source_language": normalize_label(request.source_language)
+        })
+
+cache_keys = CacheKeyBuilder()
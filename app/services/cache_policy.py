@@ -0,0 +1,81 @@
+"""
+Cost-aware admission and TTL policy for cached AI results
+"""
+
+import hashlib
+import math
+from typing import Dict, Optional
+import numpy as np
+from app.core.config import settings
+
+class FrequencySketch:
+    """Approximate per-key access counts in fixed memory (count-min sketch)
+    
+    Counters are halved every ``sample_size`` increments so the estimate
+    tracks recent popularity rather than all-time totals.
+    """
+    
+    def __init__(self, width: int = 65536, depth: int = 4):
+        self.width = width
+        self.depth = depth
+        self.table = np.zeros((depth, width), dtype=np.uint32)
+        self.sample_size = width * 10
+        self.additions = 0
+    
+    def _indexes(self, key: str) -> np.ndarray:
+        """One counter position per row"""
+        digest = hashlib.blake2b(key.encode(), digest_size=4 * self.depth).digest()
+        return np.frombuffer(digest, dtype=np.uint32) % self.width
+    
+    def record(self, key: str):
+        """Count one access to a key"""
+        self.table[np.arange(self.depth), self._indexes(key)] += 1
+        self.additions += 1
+        if self.additions >= self.sample_size:
+            self.table >>= 1
+            self.additions //= 2
+    
+    def estimate(self, key: str) -> int:
+        """Estimated recent access count of a key"""
+        return int(self.table[np.arange(self.depth), self._indexes(key)].min())
+
+class CachePolicy:
+    """Decide whether and for how long to cache a generated result
+    
+    A result that took CACHE_POLICY_REFERENCE_SECONDS to produce, was
+    requested once and is small gets the base TTL. Slower, more frequently
+    requested results are kept longer, large ones shorter, within
+    [CACHE_MIN_TTL, CACHE_MAX_TTL]. Cheap results seen for the first time
+    are not cached at all.
+    """
+    
+    def __init__(self):
+        self.sketch = FrequencySketch()
+        self.stats = {"admitted": 0, "rejected": 0}
+    
+    def record_access(self, key: str):
+        """Count a lookup of a key, hit or miss"""
+        self.sketch.record(key)
+    
+    def ttl_for(self, key: str, compute_time: float, size: int, base_ttl: int) -> Optional[int]:
+        """TTL for a freshly generated result, or None to skip caching it"""
+        frequency = max(1, self.sketch.estimate(key))
+        if compute_time < settings.cache_admission_min_seconds and frequency <= 1:
+            self.stats["rejected"] += 1
+            return None
+        
+        cost = max(compute_time, 0.001) / settings.cache_policy_reference_seconds
+        reuse = 1 + math.log2(frequency)
+        size_penalty = 1 + size / settings.cache_policy_reference_bytes
+        ttl = base_ttl * cost * reuse / size_penalty
+        self.stats["admitted"] += 1
+        return int(min(settings.cache_max_ttl, max(settings.cache_min_ttl, ttl)))
+
+def parse_budgets(spec: str) -> Dict[str, int]:
+    """Parse "namespace:megabytes,..." into byte budgets"""
+    budgets = {}
+    for item in spec.split(","):
+        namespace, _, megabytes = item.partition(":")
+        if namespace.strip() and megabytes.strip():
+            budgets[namespace.strip()] = int(float(megabytes) * 1024 * 1024)
+    return budgets
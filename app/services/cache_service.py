@@ -1,46 +1,245 @@
-import json
-import redis
-from typing import Optional, Any
+import asyncio
+import math
+import random
+import time
+import uuid
+from typing import Optional, Any, Dict, List, Tuple
 from app.core.config import settings
 from app.core.security import create_cache_key
+from app.services.cache_policy import CachePolicy, parse_budgets
+from app.services.local_cache import LocalCache
+from app.services.redis_sharding import close_redis_client, create_redis_clients
+from app.utils.codec import ValueCodec
 from app.utils.logger import app_logger
 
+# Delete a lock only if it is still held by the caller's token
+RELEASE_LOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+# Extend a lock's TTL only if it is still held by the caller's token
+EXTEND_LOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("expire", KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+# Account a key's bytes against its namespace budget and evict the soonest-expiring
+# keys while over budget (the new key included). Expired keys are forgotten first.
+# KEYS: zset of keys by hard expiry, hash of key sizes, total bytes counter
+# ARGV: key, size, expires_at, budget, now
+CHARGE_BUDGET_SCRIPT = """
+local function forget(member)
+    local size = tonumber(redis.call("hget", KEYS[2], member) or "0")
+    redis.call("hdel", KEYS[2], member)
+    redis.call("zrem", KEYS[1], member)
+    return redis.call("decrby", KEYS[3], size)
+end
+for _, member in ipairs(redis.call("zrangebyscore", KEYS[1], "-inf", ARGV[5], "LIMIT", 0, 100)) do
+    forget(member)
+end
+forget(ARGV[1])
+redis.call("hset", KEYS[2], ARGV[1], ARGV[2])
+redis.call("zadd", KEYS[1], ARGV[3], ARGV[1])
+local total = redis.call("incrby", KEYS[3], ARGV[2])
+local budget = tonumber(ARGV[4])
+local evicted = {}
+while total > budget do
+    local victim = redis.call("zrange", KEYS[1], 0, 0)[1]
+    if not victim then break end
+    total = forget(victim)
+    table.insert(evicted, victim)
+end
+return evicted
+"""
+
+# Remove a deleted key from its namespace budget (same KEYS as above, ARGV: key)
+FORGET_BUDGET_SCRIPT = """
+local size = tonumber(redis.call("hget", KEYS[2], ARGV[1]) or "0")
+redis.call("hdel", KEYS[2], ARGV[1])
+redis.call("zrem", KEYS[1], ARGV[1])
+return redis.call("decrby", KEYS[3], size)
+"""
+
+# Marks values stored with a soft expiry for stale-while-revalidate
+SWR_MARKER = "__swr__"
+
+# Prefix of negative entries recording deterministic failures for a result key
+NEGATIVE_PREFIX = "neg:"
+
 class CacheService:
-    """Redis caching service"""
+    """Two-tier cache: an in-process L1 in front of Redis (single node, sharded or Cluster, per REDIS_MODE)
+    
+    Only result namespaces listed in L1_CACHE_PREFIXES are held in L1. Writes
+    and deletes of those keys are broadcast over Redis pub/sub so other
+    processes drop their L1 copies. Generated results pass through a
+    cost-aware admission/TTL policy, and namespaces listed in
+    CACHE_NAMESPACE_BUDGETS_MB are kept within a byte budget.
+    """
     
     def __init__(self):
+        self.instance_id = uuid.uuid4().hex
+        self.stats = {"redis_hits": 0, "redis_misses": 0, "invalidations_received": 0, "negative_hits": 0, "negative_sets": 0}
+        self.l1 = LocalCache(settings.l1_cache_max_entries, settings.l1_cache_max_bytes) if settings.l1_cache_enabled else None
+        self.l1_prefixes = {prefix.strip() for prefix in settings.l1_cache_prefixes.split(",") if prefix.strip()}
+        self._listener_task: Optional[asyncio.Task] = None
+        self.policy = CachePolicy()
+        self.budgets = parse_budgets(settings.cache_namespace_budgets_mb)
+        self.budget_evictions = {namespace: 0 for namespace in self.budgets}
+        self.codec = ValueCodec(settings.cache_codec, settings.cache_compress_min_bytes, settings.cache_compression_level)
         try:
-            self.redis_client = redis.from_url(settings.redis_url, decode_responses=True)
-            self.redis_client.ping()
-            app_logger.info("Connected to Redis successfully")
+            # Connections are opened lazily, so creating the clients never blocks startup
+            self.redis_client, self.pubsub_client = create_redis_clients()
         except Exception as e:
-            app_logger.error(f"Failed to connect to Redis: {str(e)}")
+            app_logger.error(f"Failed to configure Redis: {str(e)}")
             self.redis_client = None
+            self.pubsub_client = None
+    
+    async def ping(self) -> bool:
+        """Check Redis connectivity (every node when sharded)"""
+        if not self.redis_client:
+            return False
+        
+        try:
+            return bool(await self.redis_client.ping())
+        except Exception as e:
+            app_logger.error(f"Redis ping failed: {str(e)}")
+            return False
+    
+    async def close(self):
+        """Stop the invalidation listener and release all pooled connections"""
+        await self.stop_invalidation_listener()
+        if self.pubsub_client is not None and self.pubsub_client is not self.redis_client:
+            await close_redis_client(self.pubsub_client)
+        if self.redis_client is not None:
+            await close_redis_client(self.redis_client)
+    
+    def _in_l1_namespace(self, key: str) -> bool:
+        """Whether a key's namespace is held in L1s, so changes to it must be published
+        
+        This does not depend on this process having an L1: workers run
+        without one, but their writes still replace what API processes hold.
+        """
+        return settings.l1_cache_enabled and key.split(":", 1)[0] in self.l1_prefixes
+    
+    def _use_l1(self, key: str) -> bool:
+        """Whether a key's namespace is held in the in-process L1"""
+        return self.l1 is not None and self._in_l1_namespace(key)
     
     async def get(self, key: str) -> Optional[Any]:
-        """Get value from cache"""
+        """Get value from cache, including values past their soft expiry"""
+        value, _ = await self.get_with_refresh(key)
+        return value
+    
+    async def get_with_refresh(self, key: str) -> Tuple[Optional[Any], bool]:
+        """Get value from cache plus whether the caller should refresh it
+        
+        Values written with a stale_ttl stay readable until their hard expiry.
+        Refresh is due once the soft expiry has passed, and probabilistically
+        shortly before it (XFetch): the more expensive the value was to compute,
+        the earlier one of the readers is asked to regenerate it.
+        """
+        if settings.cache_policy_enabled:
+            self.policy.record_access(key)
+        entry = await self._get_entry(key)
+        if not isinstance(entry, dict) or SWR_MARKER not in entry:
+            return entry, False
+        
+        early = -entry["delta"] * settings.cache_xfetch_beta * math.log(1.0 - random.random())
+        return entry["value"], time.time() + early >= entry["fresh_until"]
+    
+    async def _get_entry(self, key: str) -> Optional[Any]:
+        """Get the stored entry, trying the in-process L1 before Redis"""
+        use_l1 = self._use_l1(key)
+        if use_l1:
+            value = self.l1.get(key)
+            if value is not None:
+                app_logger.debug(f"L1 cache hit for key: {key}")
+                return value
+        
         if not self.redis_client:
             return None
         
         try:
-            cached_data = self.redis_client.get(key)
+            # The remaining TTL comes in the same round trip: it bounds L1 copies
+            # and locates the soft expiry of stale-while-revalidate entries
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                cached_data, ttl_ms = await pipe.get(key).pttl(key).execute()
+            
             if cached_data:
+                self.stats["redis_hits"] += 1
                 app_logger.info(f"Cache hit for key: {key}")
-                return json.loads(cached_data)
+                value = self._with_fresh_until(self.codec.decode(cached_data), ttl_ms)
+                if use_l1 and ttl_ms > 0:
+                    self.l1.set(key, value, min(ttl_ms / 1000, settings.l1_cache_ttl), len(cached_data))
+                return value
+            self.stats["redis_misses"] += 1
         except Exception as e:
             app_logger.error(f"Error getting cache for key {key}: {str(e)}")
         
         return None
     
-    async def set(self, key: str, value: Any, ttl: int = None) -> bool:
-        """Set value in cache"""
+    @staticmethod
+    def _with_fresh_until(value: Any, ttl_ms: int) -> Any:
+        """Resolve a stale-while-revalidate entry's soft expiry from its remaining TTL
+        
+        Entries store how long they may be served stale rather than an absolute
+        soft expiry, so they can be serialized before their TTL is chosen.
+        Entries written with an absolute fresh_until are returned as-is.
+        """
+        if isinstance(value, dict) and SWR_MARKER in value and "fresh_until" not in value and ttl_ms > 0:
+            value["fresh_until"] = time.time() + ttl_ms / 1000 - value["stale_for"]
+        return value
+    
+    async def set(self, key: str, value: Any, ttl: int = None, stale_ttl: int = 0, compute_time: float = 0.0) -> bool:
+        """Set value in cache and invalidate other processes' L1 copies
+        
+        With stale_ttl, the value is fresh for ttl seconds and may then be
+        served stale for stale_ttl more while it is refreshed. compute_time
+        (seconds taken to produce it) marks a generated result: it drives
+        early refresh and the admission/TTL policy, so ttl is only a base.
+        """
         if not self.redis_client:
             return False
         
         try:
             ttl = ttl or settings.cache_ttl
-            serialized_value = json.dumps(value, default=str)
-            result = self.redis_client.setex(key, ttl, serialized_value)
+            if stale_ttl > 0:
+                value = {SWR_MARKER: 1, "value": value, "stale_for": stale_ttl, "delta": compute_time}
+            serialized_value = self.codec.encode(value)
+            
+            if compute_time > 0 and settings.cache_policy_enabled:
+                ttl = self.policy.ttl_for(key, compute_time, len(serialized_value), ttl)
+                if ttl is None:
+                    app_logger.info(f"Cache admission skipped cheap one-off key: {key}")
+                    return False
+            if stale_ttl > 0:
+                ttl += stale_ttl
+            
+            evicted = await self._charge_budget(key, len(serialized_value), ttl)
+            if evicted:
+                await self._drop(evicted)
+                if key in evicted:
+                    app_logger.warning(f"Cache budget too small to keep key: {key}")
+                    return False
+            
+            try:
+                result = await self.redis_client.setex(key, ttl, serialized_value)
+            except Exception:
+                # Nothing was written, so the charge must not stay on the budget
+                await self._release_budget(key)
+                raise
+            if self._use_l1(key):
+                self.l1.set(
+                    key, self._with_fresh_until(value, ttl * 1000),
+                    min(ttl, settings.l1_cache_ttl), len(serialized_value)
+                )
+            if self._in_l1_namespace(key):
+                await self._publish_invalidation([key])
             app_logger.info(f"Cache set for key: {key}, TTL: {ttl}")
             return result
         except Exception as e:
@@ -48,20 +247,324 @@ class CacheService:
             return False
     
     async def delete(self, key: str) -> bool:
-        """Delete value from cache"""
+        """Delete value from cache and invalidate other processes' L1 copies"""
+        if self._use_l1(key):
+            self.l1.delete(key)
+        
         if not self.redis_client:
             return False
         
         try:
-            result = self.redis_client.delete(key)
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                pipe.delete(key)
+                budget_keys = self._budget_keys(key)
+                if budget_keys:
+                    pipe.eval(FORGET_BUDGET_SCRIPT, 3, *budget_keys, key)
+                result = (await pipe.execute())[0]
+            if self._in_l1_namespace(key):
+                await self._publish_invalidation([key])
             app_logger.info(f"Cache deleted for key: {key}")
             return bool(result)
         except Exception as e:
             app_logger.error(f"Error deleting cache for key {key}: {str(e)}")
             return False
     
+    async def get_negative(self, key: str) -> Optional[Dict[str, Any]]:
+        """Recorded deterministic failure for a result key, if any"""
+        if not self.redis_client or not settings.negative_cache_enabled:
+            return None
+        
+        try:
+            cached_data = await self.redis_client.get(NEGATIVE_PREFIX + key)
+        except Exception as e:
+            app_logger.error(f"Error getting negative cache for key {key}: {str(e)}")
+            return None
+        if not cached_data:
+            return None
+        self.stats["negative_hits"] += 1
+        app_logger.info(f"Negative cache hit for key: {key}")
+        return self.codec.decode(cached_data)
+    
+    async def set_negative(self, key: str, error: str, reason: str) -> bool:
+        """Record a deterministic failure for a result key so repeats fail fast
+        
+        Negative entries are small and short-lived, so they bypass L1, the
+        admission policy and namespace budgets.
+        """
+        if not self.redis_client or not settings.negative_cache_enabled:
+            return False
+        
+        try:
+            value = self.codec.encode({"error": error, "reason": reason})
+            result = await self.redis_client.setex(NEGATIVE_PREFIX + key, settings.negative_cache_ttl, value)
+            self.stats["negative_sets"] += 1
+            app_logger.info(f"Negative cache set for key: {key} ({reason}), TTL: {settings.negative_cache_ttl}")
+            return result
+        except Exception as e:
+            app_logger.error(f"Error setting negative cache for key {key}: {str(e)}")
+            return False
+    
+    async def exists(self, key: str) -> bool:
+        """Check whether a key is cached, without reading its value"""
+        if self._use_l1(key) and self.l1.get(key) is not None:
+            return True
+        if not self.redis_client:
+            return False
+        
+        try:
+            return bool(await self.redis_client.exists(key))
+        except Exception as e:
+            app_logger.error(f"Error checking cache for key {key}: {str(e)}")
+            return False
+    
+    async def dump_many(self, keys: List[Any]) -> List[Tuple[str, bytes, int]]:
+        """Raw encoded values and remaining TTLs in ms (-1 for none) of the keys that still exist"""
+        async with self.redis_client.pipeline(transaction=False) as pipe:
+            for key in keys:
+                pipe.get(key)
+                pipe.pttl(key)
+            results = await pipe.execute()
+        
+        return [
+            (key.decode() if isinstance(key, bytes) else key, value, ttl_ms)
+            for key, value, ttl_ms in zip(keys, results[::2], results[1::2])
+            if value is not None and ttl_ms != -2
+        ]
+    
+    async def restore_many(self, entries: List[Tuple[str, bytes, int]], overwrite: bool = False) -> Tuple[int, int]:
+        """Write raw encoded entries in one pipeline, keeping existing keys unless overwrite
+        
+        Returns (written, evicted), where evicted counts keys removed to keep
+        namespaces within their budgets.
+        """
+        async with self.redis_client.pipeline(transaction=False) as pipe:
+            for key, value, ttl_ms in entries:
+                pipe.set(key, value, px=ttl_ms if ttl_ms > 0 else None, nx=not overwrite)
+            results = await pipe.execute()
+        
+        written = [entry for entry, result in zip(entries, results) if result]
+        if overwrite:
+            replaced = [key for key, _, _ in written if self._in_l1_namespace(key)]
+            if self.l1 is not None:
+                for key in replaced:
+                    self.l1.delete(key)
+            await self._publish_invalidation(replaced)
+        
+        now = time.time()
+        charged = [(entry, self._budget_keys(entry[0])) for entry in written]
+        charged = [(entry, budget_keys) for entry, budget_keys in charged if budget_keys]
+        evicted = []
+        if charged:
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                for (key, value, ttl_ms), budget_keys in charged:
+                    expires_at = now + (ttl_ms / 1000 if ttl_ms > 0 else settings.cache_max_ttl)
+                    budget = self.budgets[key.split(":", 1)[0]]
+                    pipe.eval(CHARGE_BUDGET_SCRIPT, 3, *budget_keys, key, len(value), expires_at, budget, now)
+                for victims in await pipe.execute():
+                    evicted.extend(victim.decode() for victim in victims)
+        if evicted:
+            for victim in evicted:
+                self.budget_evictions[victim.split(":", 1)[0]] += 1
+            await self._drop(evicted)
+        return len(written), len(evicted)
+    
+    def _budget_keys(self, key: str) -> Optional[List[str]]:
+        """Accounting keys for a key's namespace, or None if the namespace has no budget"""
+        namespace = key.split(":", 1)[0]
+        if namespace not in self.budgets:
+            return None
+        # Hash tags keep a namespace's accounting keys together on Redis Cluster
+        return [f"budget:{{{namespace}}}:keys", f"budget:{{{namespace}}}:sizes", f"budget:{{{namespace}}}:bytes"]
+    
+    async def _charge_budget(self, key: str, size: int, ttl: int) -> List[str]:
+        """Account a write against its namespace budget, returning the keys evicted to stay within it"""
+        budget_keys = self._budget_keys(key)
+        if not budget_keys:
+            return []
+        
+        now = time.time()
+        namespace = key.split(":", 1)[0]
+        evicted = await self.redis_client.eval(
+            CHARGE_BUDGET_SCRIPT, 3, *budget_keys, key, size, now + ttl, self.budgets[namespace], now
+        )
+        evicted = [victim.decode() for victim in evicted]
+        if evicted:
+            self.budget_evictions[namespace] += len(evicted)
+            app_logger.info(f"Evicting {len(evicted)} keys to keep {namespace} within its cache budget")
+        return evicted
+    
+    async def _release_budget(self, key: str):
+        """Remove a key's charge from its namespace budget, logging rather than raising on failure"""
+        budget_keys = self._budget_keys(key)
+        if not budget_keys:
+            return
+        try:
+            await self.redis_client.eval(FORGET_BUDGET_SCRIPT, 3, *budget_keys, key)
+        except Exception as e:
+            app_logger.error(f"Error releasing cache budget for key {key}: {str(e)}")
+    
+    async def _drop(self, keys: List[str]):
+        """Delete keys already removed from budget accounting, invalidating L1 copies"""
+        async with self.redis_client.pipeline(transaction=False) as pipe:
+            # One DEL per key, so keys on different shards/slots never share a command
+            for key in keys:
+                pipe.delete(key)
+            await pipe.execute()
+        
+        cached = [key for key in keys if self._in_l1_namespace(key)]
+        if self.l1 is not None:
+            for key in cached:
+                self.l1.delete(key)
+        await self._publish_invalidation(cached)
+    
+    async def _publish_invalidation(self, keys: List[str]):
+        """Tell other processes to drop their L1 copies of keys (one message per batch)"""
+        if not keys:
+            return
+        await self.publish(settings.cache_invalidation_channel, f"{self.instance_id}|" + "\n".join(keys))
+    
+    async def get_budget_usage(self) -> Dict[str, Dict[str, int]]:
+        """Bytes and entries used by each budgeted namespace"""
+        if not self.redis_client or not self.budgets:
+            return {}
+        
+        try:
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                for namespace in self.budgets:
+                    keys_key, _, bytes_key = self._budget_keys(f"{namespace}:")
+                    pipe.get(bytes_key)
+                    pipe.zcard(keys_key)
+                results = await pipe.execute()
+        except Exception as e:
+            app_logger.error(f"Error reading cache budget usage: {str(e)}")
+            return {}
+        
+        return {
+            namespace: {
+                "budget_bytes": budget,
+                "used_bytes": int(results[2 * i] or 0),
+                "entries": results[2 * i + 1],
+                "evictions": self.budget_evictions[namespace]
+            }
+            for i, (namespace, budget) in enumerate(self.budgets.items())
+        }
+    
+    async def start_invalidation_listener(self):
+        """Start applying L1 invalidations published by other processes"""
+        if self.l1 is None or not self.pubsub_client or self._listener_task:
+            return
+        self._listener_task = asyncio.create_task(self._listen_for_invalidations())
+    
+    async def stop_invalidation_listener(self):
+        """Stop the invalidation listener if it is running"""
+        if self._listener_task:
+            self._listener_task.cancel()
+            try:
+                await self._listener_task
+            except asyncio.CancelledError:
+                pass
+            self._listener_task = None
+    
+    async def _listen_for_invalidations(self):
+        """Drop L1 entries written or deleted elsewhere, reconnecting on errors"""
+        while True:
+            pubsub = self.pubsub_client.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(settings.cache_invalidation_channel)
+                # Invalidations may have been missed while disconnected
+                self.l1.clear()
+                while True:
+                    message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                    if message is None:
+                        continue
+                    origin, _, keys = message["data"].decode().partition("|")
+                    if origin != self.instance_id:
+                        for key in keys.split("\n"):
+                            self.l1.delete(key)
+                        self.stats["invalidations_received"] += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                app_logger.error(f"Cache invalidation listener error: {str(e)}")
+                await asyncio.sleep(1)
+            finally:
+                try:
+                    await pubsub.close()
+                except Exception:
+                    pass
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """L1 and Redis hit/miss counters for this process"""
+        return {
+            "redis": dict(self.stats),
+            "l1": self.l1.info() if self.l1 else None,
+            "codec": {"name": self.codec.codec.name, **self.codec.stats},
+            "admission": dict(self.policy.stats)
+        }
+    
+    async def acquire_lock(self, key: str, token: str, ttl: int) -> Optional[bool]:
+        """Try to take a short-lived lock; returns None when Redis is unavailable"""
+        if not self.redis_client:
+            return None
+        
+        try:
+            return bool(await self.redis_client.set(key, token, nx=True, ex=ttl))
+        except Exception as e:
+            app_logger.error(f"Error acquiring lock {key}: {str(e)}")
+            return None
+    
+    async def release_lock(self, key: str, token: str) -> bool:
+        """Release a lock previously taken with the same token"""
+        if not self.redis_client:
+            return False
+        
+        try:
+            return bool(await self.redis_client.eval(RELEASE_LOCK_SCRIPT, 1, key, token))
+        except Exception as e:
+            app_logger.error(f"Error releasing lock {key}: {str(e)}")
+            return False
+    
+    async def extend_lock(self, key: str, token: str, ttl: int) -> bool:
+        """Restart the TTL of a lock still held with the same token; returns False if it was lost"""
+        if not self.redis_client:
+            return False
+        
+        try:
+            return bool(await self.redis_client.eval(EXTEND_LOCK_SCRIPT, 1, key, token, ttl))
+        except Exception as e:
+            app_logger.error(f"Error extending lock {key}: {str(e)}")
+            return False
+    
+    async def publish(self, channel: str, message: str) -> int:
+        """Publish a message on a pub/sub channel"""
+        if not self.pubsub_client:
+            return 0
+        
+        try:
+            return await self.pubsub_client.publish(channel, message)
+        except Exception as e:
+            app_logger.error(f"Error publishing to {channel}: {str(e)}")
+            return 0
+    
+    async def publish_many(self, messages: List[Tuple[str, str]]) -> None:
+        """Publish (channel, message) pairs in one round trip"""
+        if not self.pubsub_client or not messages:
+            return
+        
+        try:
+            async with self.pubsub_client.pipeline(transaction=False) as pipe:
+                for channel, message in messages:
+                    pipe.publish(channel, message)
+                await pipe.execute()
+        except Exception as e:
+            app_logger.error(f"Error publishing {len(messages)} messages: {str(e)}")
+    
+    def pubsub(self):
+        """New pub/sub connection on the node that carries notifications"""
+        return self.pubsub_client.pubsub()
+    
     def create_key(self, prefix: str, content: str) -> str:
         """Create cache key"""
         return create_cache_key(prefix, content)
 
-cache_service = CacheService()
\ No newline at end of file
+cache_service = CacheService()
@@ -0,0 +1,183 @@
+import asyncio
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from app.core.config import settings
+from app.services.cache_service import cache_service
+from app.utils.logger import app_logger
+
+class RequestCoalescer:
+    """Collapse concurrent identical requests into a single upstream call
+    
+    Within a process, callers sharing a cache key await one producer task
+    owned by the coalescer, which keeps running as long as any of them is
+    still waiting, so one caller giving up does not fail the others.
+    Across processes, a Redis lock elects a leader per key and followers wait
+    for its pub/sub notification, then read the result from the cache. The
+    leader keeps renewing its lock while it runs, so slow producers keep
+    their followers; followers take over early if the lock lapses because
+    the leader died. Background refreshes of stale entries are deduplicated
+    the same way.
+    """
+    
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._waiters: Dict[asyncio.Task, int] = {}
+        self._refreshing: Dict[str, asyncio.Task] = {}
+        self.stats = {"leaders": 0, "local_followers": 0, "remote_followers": 0, "refreshes": 0}
+    
+    async def run(
+        self,
+        key: str,
+        producer: Callable[[], Awaitable[Dict[str, Any]]],
+        wait_timeout: Optional[float] = None
+    ) -> Tuple[Dict[str, Any], bool]:
+        """Run producer once per key; returns (result, shared) where shared marks a coalesced caller
+        
+        The producer is responsible for writing its result to the cache under key.
+        wait_timeout (default COALESCE_WAIT_TIMEOUT) bounds how long a follower
+        waits for another process's leader, so slow producers should pass
+        their own time limit.
+        """
+        if not settings.coalesce_enabled:
+            return await producer(), False
+        
+        task = self._inflight.get(key)
+        leader = task is None
+        if leader:
+            task = asyncio.create_task(
+                self._run_distributed(key, producer, wait_timeout or settings.coalesce_wait_timeout)
+            )
+            self._inflight[key] = task
+            self._waiters[task] = 0
+            task.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            self.stats["local_followers"] += 1
+        
+        self._waiters[task] += 1
+        try:
+            result, shared = await asyncio.shield(task)
+            return result, shared or not leader
+        finally:
+            # A caller that gave up (e.g. a client disconnect) leaves the work
+            # running for the others; it is cancelled once nobody is waiting
+            if not task.done():
+                self._waiters[task] -= 1
+                if not self._waiters[task]:
+                    task.cancel()
+                    # New callers start afresh rather than joining work being cancelled
+                    if self._inflight.get(key) is task:
+                        del self._inflight[key]
+    
+    def _forget(self, key: str, task: asyncio.Task):
+        """Drop a finished producer task, marking its exception retrieved when nobody was waiting on it"""
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        self._waiters.pop(task, None)
+        if not task.cancelled():
+            task.exception()
+    
+    async def _run_distributed(
+        self,
+        key: str,
+        producer: Callable[[], Awaitable[Dict[str, Any]]],
+        wait_timeout: float
+    ) -> Tuple[Dict[str, Any], bool]:
+        """Coordinate with other processes through a Redis lock on the key"""
+        lock_key = f"lock:{key}"
+        channel = f"notify:{key}"
+        token = uuid.uuid4().hex
+        deadline = time.monotonic() + wait_timeout
+        
+        while time.monotonic() < deadline:
+            acquired = await cache_service.acquire_lock(lock_key, token, settings.coalesce_lock_ttl)
+            if acquired is None:
+                # Redis is unavailable, so there is nobody to coordinate with
+                return await producer(), False
+            if acquired:
+                self.stats["leaders"] += 1
+                renewal = asyncio.create_task(self._renew_lock(lock_key, token))
+                try:
+                    return await producer(), False
+                finally:
+                    renewal.cancel()
+                    await cache_service.release_lock(lock_key, token)
+                    await cache_service.publish(channel, "done")
+            
+            result = await self._wait_for_leader(key, lock_key, channel, deadline)
+            if result is not None:
+                self.stats["remote_followers"] += 1
+                return result, True
+            # The leader finished without caching a result, or died, so try to take over
+        
+        app_logger.warning(f"Timed out waiting for in-flight request {key}, generating directly")
+        return await producer(), False
+    
+    async def _renew_lock(self, lock_key: str, token: str):
+        """Keep a leader's lock alive until cancelled"""
+        interval = settings.coalesce_lock_ttl / 3
+        while True:
+            await asyncio.sleep(interval)
+            if not await cache_service.extend_lock(lock_key, token, settings.coalesce_lock_ttl):
+                app_logger.warning(f"Lost coalescing lock {lock_key}")
+                return
+    
+    def schedule_refresh(self, key: str, producer: Callable[[], Awaitable[Dict[str, Any]]]) -> bool:
+        """Regenerate a cached entry in the background; returns False if a refresh is already running here"""
+        if key in self._refreshing or key in self._inflight:
+            return False
+        task = asyncio.create_task(self._refresh(key, producer))
+        self._refreshing[key] = task
+        task.add_done_callback(lambda _: self._refreshing.pop(key, None))
+        return True
+    
+    async def _refresh(self, key: str, producer: Callable[[], Awaitable[Dict[str, Any]]]):
+        """Run producer if no other process is refreshing the key"""
+        lock_key = f"refresh:{key}"
+        token = uuid.uuid4().hex
+        if not await cache_service.acquire_lock(lock_key, token, settings.cache_refresh_lock_ttl):
+            return
+        
+        try:
+            self.stats["refreshes"] += 1
+            app_logger.info(f"Refreshing cache key in background: {key}")
+            await producer()
+        except Exception as e:
+            app_logger.error(f"Background refresh failed for {key}: {str(e)}")
+        finally:
+            await cache_service.release_lock(lock_key, token)
+    
+    async def _wait_for_leader(self, key: str, lock_key: str, channel: str, deadline: float) -> Optional[Dict[str, Any]]:
+        """Wait for the leader's notification, then read its cached result
+        
+        The lock is rechecked every COALESCE_LOCK_TTL seconds, so a leader
+        that died without notifying is not waited on until the deadline.
+        """
+        pubsub = cache_service.pubsub()
+        try:
+            await pubsub.subscribe(channel)
+            # The leader may have finished before we subscribed
+            result = await cache_service.get(key)
+            if result is not None:
+                return result
+            
+            while (remaining := deadline - time.monotonic()) > 0:
+                message = await pubsub.get_message(
+                    ignore_subscribe_messages=True, timeout=min(remaining, settings.coalesce_lock_ttl)
+                )
+                if message is not None:
+                    break
+                if not await cache_service.exists(lock_key):
+                    break
+        except Exception as e:
+            app_logger.error(f"Error waiting for in-flight request {key}: {str(e)}")
+        finally:
+            try:
+                await pubsub.unsubscribe(channel)
+                await pubsub.close()
+            except Exception:
+                pass
+        
+        return await cache_service.get(key)
+
+request_coalescer = RequestCoalescer()
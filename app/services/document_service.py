@@ -0,0 +1,95 @@
+import hashlib
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Optional
+from app.core.config import settings
+from app.services.cache_service import cache_service
+from app.services.retrieval_service import BM25Index
+from app.utils.logger import app_logger
+from app.utils.text_chunker import split_text
+
+class DocumentService:
+    """Ingest documents once and keep a persistent passage index for Q&A
+    
+    Documents are identified by a hash of their content, so re-ingesting the
+    same text is a no-op. The chunked passages and the serialized BM25 index
+    are stored in Redis; recently used indexes are also kept in memory.
+    """
+    
+    def __init__(self):
+        self._indexes: "OrderedDict[str, BM25Index]" = OrderedDict()
+    
+    @staticmethod
+    def _meta_key(doc_id: str) -> str:
+        """Cache key for document metadata"""
+        return f"doc:{doc_id}"
+    
+    @staticmethod
+    def _index_key(doc_id: str) -> str:
+        """Cache key for the serialized passage index"""
+        return f"doc_index:{doc_id}"
+    
+    async def ingest(self, text: str, title: Optional[str] = None) -> Dict[str, Any]:
+        """Chunk and index a document, returning its metadata"""
+        doc_id = hashlib.sha256(text.encode()).hexdigest()[:32]
+        existing = await self.get_metadata(doc_id)
+        if existing:
+            return {**existing, "created": False}
+        
+        index = BM25Index(split_text(text, settings.qa_passage_chars))
+        metadata = {
+            "doc_id": doc_id,
+            "title": title,
+            "created_at": datetime.now().isoformat(),
+            "characters": len(text),
+            "passages": len(index.passages)
+        }
+        # Index first, so metadata never points at a missing index
+        stored = await cache_service.set(self._index_key(doc_id), index.to_dict(), ttl=settings.document_ttl)
+        if not stored or not await cache_service.set(self._meta_key(doc_id), metadata, ttl=settings.document_ttl):
+            raise Exception("Failed to store document")
+        
+        self._remember(doc_id, index)
+        app_logger.info(f"Ingested document {doc_id} with {len(index.passages)} passages")
+        return {**metadata, "created": True}
+    
+    async def get_metadata(self, doc_id: str) -> Optional[Dict[str, Any]]:
+        """Get stored document metadata"""
+        return await cache_service.get(self._meta_key(doc_id))
+    
+    async def get_index(self, doc_id: str) -> Optional[BM25Index]:
+        """Get the passage index for a document, from memory when warm
+        
+        A warm copy is only served while the document still exists in Redis,
+        so deletions and expiry made through any process take effect here too.
+        """
+        index = self._indexes.get(doc_id)
+        if index is not None:
+            if not await cache_service.exists(self._meta_key(doc_id)):
+                self._indexes.pop(doc_id, None)
+                return None
+            self._indexes.move_to_end(doc_id)
+            return index
+        
+        data = await cache_service.get(self._index_key(doc_id))
+        if not data:
+            return None
+        
+        index = BM25Index.from_dict(data)
+        self._remember(doc_id, index)
+        return index
+    
+    async def delete(self, doc_id: str) -> bool:
+        """Delete a document and its index"""
+        self._indexes.pop(doc_id, None)
+        await cache_service.delete(self._index_key(doc_id))
+        return await cache_service.delete(self._meta_key(doc_id))
+    
+    def _remember(self, doc_id: str, index: BM25Index):
+        """Keep an index warm, evicting the least recently used ones"""
+        self._indexes[doc_id] = index
+        self._indexes.move_to_end(doc_id)
+        while len(self._indexes) > settings.document_index_cache_size:
+            self._indexes.popitem(last=False)
+
+document_service = DocumentService()
@@ -1,42 +1,298 @@
+import asyncio
+import hashlib
+import json
+import time
 import uuid
 from datetime import datetime
-from typing import Dict, Any, Optional
-from app.models.responses import JobResponse, JobStatus
+from typing import Dict, Any, AsyncIterator, Awaitable, Callable, List, Optional, Set, Tuple, TypeVar
+from app.core.config import settings
+from app.models.responses import BatchStatusResponse, JobResponse, JobStatus
 from app.services.cache_service import cache_service
 from app.utils.logger import app_logger
 
+# Create a job hash with its TTL in one round trip
+# KEYS: job hash; ARGV: ttl, then field/value pairs
+CREATE_JOB_SCRIPT = """
+redis.call("hset", KEYS[1], unpack(ARGV, 2))
+redis.call("expire", KEYS[1], ARGV[1])
+return 1
+"""
+
+# Move a job to a new status only from one of the allowed current statuses,
+# setting the given fields in the same step. Terminal transitions restart the TTL
+# so results stay readable for the full JOB_TTL after completion. For a job of a
+# batch, the batch's per-status counters move in the same step.
+# KEYS: job hash, then for a batch job its batch counters hash (same hash slot)
+# ARGV: new status, comma-separated allowed statuses, ttl (0 keeps it), field/value pairs
+# Returns nil if the job does not exist, else {applied (0/1), previous status, batch id or ""}
+TRANSITION_JOB_SCRIPT = """
+local current = redis.call("hget", KEYS[1], "status")
+if not current then return nil end
+local allowed = false
+for status in string.gmatch(ARGV[2], "[^,]+") do
+    if status == current then allowed = true end
+end
+if not allowed then return {0, current, ""} end
+redis.call("hset", KEYS[1], "status", ARGV[1], unpack(ARGV, 4))
+local ttl = tonumber(ARGV[3])
+if ttl > 0 then redis.call("expire", KEYS[1], ttl) end
+local batch_id = redis.call("hget", KEYS[1], "batch_id") or ""
+if not KEYS[2] then return {1, current, batch_id} end
+if current ~= ARGV[1] then
+    redis.call("hincrby", KEYS[2], current, -1)
+    redis.call("hincrby", KEYS[2], ARGV[1], 1)
+end
+-- Keep the batch readable as long as its newest finished job
+if ttl > 0 then redis.call("expire", KEYS[2], ttl) end
+return {1, current, batch_id}
+"""
+
+# Point a request's in-flight marker at a new job unless it names an unfinished one,
+# else count one more submitter of that job. A marker whose job hash is not written
+# yet counts as unfinished: its creator is still between claiming the marker and
+# creating the job, so the job is recorded as pending for the attaching caller to
+# read until its creator fills it in.
+# KEYS: marker, hash of the job the marker was read naming (else the new job's), same hash slot
+# ARGV: marker value read ("" if none), new job ID, dedup window, job ttl, creation time
+# Returns nil if the marker changed since it was read, else {attached (0/1), job ID}
+CLAIM_INFLIGHT_SCRIPT = """
+local current = redis.call("get", KEYS[1]) or ""
+if current ~= ARGV[1] then return nil end
+if current ~= "" then
+    local status = redis.call("hget", KEYS[2], "status")
+    if not status or status == "pending" or status == "processing" then
+        local submitters = tonumber(redis.call("hget", KEYS[2], "submitters") or "1")
+        redis.call("hset", KEYS[2], "submitters", submitters + 1)
+        if not status then
+            redis.call("hset", KEYS[2], "job_id", current, "status", "pending", "created_at", ARGV[5])
+            redis.call("expire", KEYS[2], ARGV[4])
+        end
+        return {1, current}
+    end
+end
+redis.call("set", KEYS[1], ARGV[2], "ex", ARGV[3])
+return {0, ARGV[2]}
+"""
+# Times a claim is retried when the marker changes under it
+CLAIM_INFLIGHT_ATTEMPTS = 3
+
+# Cancelling a job that several identical submissions share only withdraws one
+# submission while others remain; the last one cancels it through the transition
+# script this is prepended to. Same KEYS and ARGV as that script.
+# Returns {0, current status, "", submitters left} when it only withdraws
+WITHDRAW_SUBMISSION_SCRIPT = """
+local submitters = tonumber(redis.call("hget", KEYS[1], "submitters") or "1")
+if submitters > 1 then
+    local status = redis.call("hget", KEYS[1], "status")
+    if status == "pending" or status == "processing" then
+        redis.call("hset", KEYS[1], "submitters", submitters - 1)
+        return {0, status, "", submitters - 1}
+    end
+end
+"""
+CANCEL_JOB_SCRIPT = WITHDRAW_SUBMISSION_SCRIPT + TRANSITION_JOB_SCRIPT
+
+# Statuses a job may move to each status from
+ALLOWED_TRANSITIONS = {
+    # PROCESSING -> PROCESSING covers a task redelivered after a worker was lost
+    JobStatus.PROCESSING: (JobStatus.PENDING, JobStatus.PROCESSING),
+    JobStatus.COMPLETED: (JobStatus.PENDING, JobStatus.PROCESSING),
+    JobStatus.FAILED: (JobStatus.PENDING, JobStatus.PROCESSING),
+    JobStatus.CANCELLED: (JobStatus.PENDING, JobStatus.PROCESSING)
+}
+TERMINAL_STATUSES = {JobStatus.COMPLETED, JobStatus.FAILED, JobStatus.CANCELLED}
+
+# Fields holding codec-encoded values; all other fields are plain strings
+ENCODED_FIELDS = {"result"}
+# Fields needed to answer a status request
+STATUS_FIELDS = ["job_id", "status", "created_at", "completed_at", "result", "error"]
+
+# Seconds between a running job's status checks when no cancellation event arrives
+CANCELLATION_CHECK_INTERVAL = 5.0
+
+T = TypeVar("T")
+
+class JobCancelledError(Exception):
+    """Raised in a worker when its job has been cancelled"""
+
 class JobService:
-    """Service for managing background jobs"""
+    """Service for managing background jobs
+    
+    Each job is a Redis hash under job:<id>, so status transitions update
+    only the fields they change, atomically and guarded against invalid
+    moves (e.g. COMPLETED -> PROCESSING), and reads fetch only the fields
+    they need. Jobs of a batch have IDs <batch_id>.<n> and keys hash-tagged
+    with their batch's counters key, so one script moves both. Jobs claimed
+    for deduplication have IDs <tag>_<uuid>, where the tag also hash-tags the
+    request's in-flight marker, so one script can check both.
+    
+    Every applied transition is published over Redis pub/sub, so clients
+    can wait for changes instead of polling. Each process holds a single
+    pattern subscription to all job and batch events and wakes its local
+    watchers, so waiting never takes a connection per watcher.
+    """
+    
+    def __init__(self):
+        self._watchers: Dict[str, Set[asyncio.Event]] = {}
+        self._listener_task: Optional[asyncio.Task] = None
+    
+    @classmethod
+    def _job_key(cls, job_id: str) -> str:
+        """Redis key of a job hash, sharing a hash slot with its batch's counters or in-flight marker"""
+        batch_id, _, index = job_id.partition(".")
+        if index:
+            return f"job:{{{cls._batch_key(batch_id)}}}.{index}"
+        tag, _, unique = job_id.partition("_")
+        if unique:
+            return f"job:{{{tag}}}_{unique}"
+        return f"job:{job_id}"
     
     @staticmethod
-    def create_job(task_type: str, payload: Dict[str, Any]) -> str:
-        """Create a new job"""
-        job_id = str(uuid.uuid4())
-        job_data = {
-            "job_id": job_id,
-            "task_type": task_type,
-            "status": JobStatus.PENDING.value,
-            "created_at": datetime.now().isoformat(),
-            "payload": payload,
-            "result": None,
-            "error": None
+    def _batch_key(batch_id: str) -> str:
+        """Redis key of a batch's counters hash (its job IDs are listed under <key>:jobs)"""
+        return f"batch:{batch_id}"
+    
+    @classmethod
+    def _transition_keys(cls, job_id: str) -> List[str]:
+        """Keys the transition script touches for a job"""
+        batch_id, _, index = job_id.partition(".")
+        if index:
+            return [cls._job_key(job_id), cls._batch_key(batch_id)]
+        return [cls._job_key(job_id)]
+    
+    @staticmethod
+    def _job_channel(job_id: str) -> str:
+        """Pub/sub channel announcing a job's status changes"""
+        return f"job_events:{job_id}"
+    
+    @staticmethod
+    def _batch_channel(batch_id: str) -> str:
+        """Pub/sub channel announcing status changes of a batch's jobs"""
+        return f"batch_events:{batch_id}"
+    
+    @staticmethod
+    def _slot_tag(request_key: str) -> str:
+        """Short hash tag shared by a request's in-flight marker and the jobs claimed through it"""
+        return hashlib.blake2b(request_key.encode(), digest_size=4).hexdigest()
+    
+    @classmethod
+    def _inflight_key(cls, request_key: str) -> str:
+        """Redis key naming the job currently producing a request's result"""
+        return f"inflight:{{{cls._slot_tag(request_key)}}}:{request_key}"
+    
+    @staticmethod
+    def _encode_fields(fields: Dict[str, Any]) -> Dict[str, Any]:
+        """Encode fields for storage in a job hash, skipping None values"""
+        return {
+            name: cache_service.codec.encode(value) if name in ENCODED_FIELDS else value
+            for name, value in fields.items()
+            if value is not None
         }
+    
+    @staticmethod
+    def _flatten(fields: Dict[str, Any]) -> List[Any]:
+        """Field/value pairs as script arguments"""
+        return [item for pair in fields.items() for item in pair]
+    
+    @staticmethod
+    def _decode_field(name: str, value: Optional[bytes]) -> Any:
+        """Decode one stored hash field"""
+        if value is None:
+            return None
+        return cache_service.codec.decode(value) if name in ENCODED_FIELDS else value.decode()
+    
+    async def create_job(
+        self,
+        task_type: str,
+        payload_ref: Optional[str] = None,
+        job_id: Optional[str] = None,
+        result: Any = None
+    ) -> str:
+        """Create a new job in a single write, referencing its payload in the payload store
+        
+        A job given a result (e.g. one already in the result cache) is created
+        COMPLETED and is never queued.
+        """
+        if not cache_service.redis_client:
+            raise RuntimeError("Job store unavailable: Redis is not configured")
         
-        # Store job in cache
-        cache_key = f"job:{job_id}"
-        # Note: Using asyncio.create_task in real implementation
-        app_logger.info(f"Created job {job_id} for task type {task_type}")
+        job_id = job_id or str(uuid.uuid4())
+        now = datetime.now().isoformat()
+        completed = result is not None
+        fields = self._encode_fields({
+            "job_id": job_id,
+            "task_type": task_type,
+            "status": (JobStatus.COMPLETED if completed else JobStatus.PENDING).value,
+            "created_at": now,
+            "completed_at": now if completed else None,
+            "result": result,
+            "payload_ref": payload_ref,
+            # Jobs are queued with their job ID as the Celery task ID
+            "task_id": None if completed else job_id
+        })
+        await cache_service.redis_client.eval(
+            CREATE_JOB_SCRIPT, 1, self._job_key(job_id), settings.job_ttl, *self._flatten(fields)
+        )
+        app_logger.info(f"Created {'completed ' if completed else ''}job {job_id} for task type {task_type}")
         return job_id
     
-    @staticmethod
-    async def get_job_status(job_id: str) -> Optional[JobResponse]:
-        """Get job status"""
-        cache_key = f"job:{job_id}"
-        job_data = await cache_service.get(cache_key)
+    async def claim_inflight(self, request_key: str) -> Tuple[str, bool]:
+        """Reserve a job ID for a request, or find the unfinished job already producing it
+        
+        Returns (job_id, attached); attached is True when job_id names an
+        existing job, in which case nothing new should be created or queued
+        and the job counts one more submitter. A marker left by a job that has since finished (or expired) is taken
+        over. The check and the takeover are one script, so concurrent
+        identical submissions cannot both start a job.
+        """
+        job_id = f"{self._slot_tag(request_key)}_{uuid.uuid4()}"
+        if not settings.job_dedup_enabled or not cache_service.redis_client:
+            return job_id, False
         
-        if not job_data:
+        key = self._inflight_key(request_key)
+        for _ in range(CLAIM_INFLIGHT_ATTEMPTS):
+            current = await cache_service.redis_client.get(key)
+            current = current.decode() if current else ""
+            outcome = await cache_service.redis_client.eval(
+                CLAIM_INFLIGHT_SCRIPT, 2, key, self._job_key(current or job_id),
+                current, job_id, settings.job_dedup_window, settings.job_ttl, datetime.now().isoformat()
+            )
+            if outcome is None:
+                continue
+            attached, claimed = outcome
+            if attached:
+                app_logger.info(f"Attached duplicate submission to in-flight job {claimed.decode()}")
+            return claimed.decode(), bool(attached)
+        
+        app_logger.warning(f"In-flight marker for {request_key} kept changing, starting a separate job")
+        return job_id, False
+    
+    async def release_inflight(self, request_key: str, job_id: str):
+        """Drop a request's in-flight marker if it still names job_id (e.g. the job could not be created)"""
+        if settings.job_dedup_enabled:
+            await cache_service.release_lock(self._inflight_key(request_key), job_id)
+    
+    async def get_job_fields(self, job_id: str, fields: List[str]) -> Optional[Dict[str, Any]]:
+        """Read selected fields of a job, or None if it does not exist"""
+        if not cache_service.redis_client:
             return None
         
+        values = await cache_service.redis_client.hmget(self._job_key(job_id), fields)
+        if all(value is None for value in values):
+            return None
+        return {name: self._decode_field(name, value) for name, value in zip(fields, values)}
+    
+    async def get_job_status(self, job_id: str) -> Optional[JobResponse]:
+        """Get job status"""
+        job_data = await self.get_job_fields(job_id, STATUS_FIELDS)
+        
+        if not job_data or not job_data["status"]:
+            return None
+        return self._job_response(job_data)
+    
+    @staticmethod
+    def _job_response(job_data: Dict[str, Any]) -> JobResponse:
+        """Build the API view of a job from its status fields"""
         return JobResponse(
             job_id=job_data["job_id"],
             status=JobStatus(job_data["status"]),
@@ -46,22 +302,373 @@ class JobService:
             error=job_data.get("error")
         )
     
-    @staticmethod
-    async def update_job_status(job_id: str, status: JobStatus, result: Any = None, error: str = None):
-        """Update job status"""
-        cache_key = f"job:{job_id}"
-        job_data = await cache_service.get(cache_key)
-        
-        if job_data:
-            job_data["status"] = status.value
-            if status == JobStatus.COMPLETED:
-                job_data["completed_at"] = datetime.now().isoformat()
-                job_data["result"] = result
-            elif status == JobStatus.FAILED:
-                job_data["completed_at"] = datetime.now().isoformat()
-                job_data["error"] = error
-            
-            await cache_service.set(cache_key, job_data)
-            app_logger.info(f"Updated job {job_id} status to {status.value}")
+    async def update_job_status(self, job_id: str, status: JobStatus, result: Any = None, error: str = None) -> bool:
+        """Atomically move a job to a new status; returns False if the job is missing or the transition is invalid"""
+        if not cache_service.redis_client:
+            return False
+        
+        terminal = status in TERMINAL_STATUSES
+        fields = self._encode_fields({
+            "completed_at": datetime.now().isoformat() if terminal else None,
+            "result": result if status == JobStatus.COMPLETED else None,
+            "error": error if status == JobStatus.FAILED else None
+        })
+        allowed = ",".join(previous.value for previous in ALLOWED_TRANSITIONS[status])
+        keys = self._transition_keys(job_id)
+        outcome = await cache_service.redis_client.eval(
+            TRANSITION_JOB_SCRIPT, len(keys), *keys,
+            status.value, allowed, settings.job_ttl if terminal else 0, *self._flatten(fields)
+        )
+        
+        if outcome is None:
+            app_logger.warning(f"Cannot update missing job {job_id} to {status.value}")
+            return False
+        applied, previous, batch_id = outcome
+        if not applied:
+            app_logger.warning(f"Rejected job {job_id} transition {previous.decode()} -> {status.value}")
+            return False
+        await self._announce([(job_id, batch_id.decode())], status)
+        app_logger.info(f"Updated job {job_id} status to {status.value}")
+        return True
+    
+    async def _announce(self, transitions: List[Tuple[str, str]], status: JobStatus):
+        """Publish events for applied (job_id, batch_id) transitions
+        
+        Batch counters are moved by the transition script itself; a batch's
+        job list only has its TTL restarted here once a job finishes.
+        """
+        batch_ids = {batch_id for _, batch_id in transitions if batch_id}
+        if batch_ids and status in TERMINAL_STATUSES:
+            async with cache_service.redis_client.pipeline(transaction=False) as pipe:
+                for batch_id in batch_ids:
+                    pipe.expire(f"{self._batch_key(batch_id)}:jobs", settings.job_ttl)
+                await pipe.execute()
+        
+        events = [
+            (self._job_channel(job_id), json.dumps({"job_id": job_id, "status": status.value}))
+            for job_id, _ in transitions
+        ]
+        events.extend(
+            (self._batch_channel(batch_id), json.dumps({"batch_id": batch_id, "status": status.value}))
+            for batch_id in batch_ids
+        )
+        await cache_service.publish_many(events)
+    
+    async def cancel_jobs(self, job_ids: List[str]) -> Tuple[List[Tuple[str, str]], List[str]]:
+        """Mark unfinished jobs CANCELLED in one round trip
+        
+        Returns (job_id, task_id) of those cancelled, and the IDs of shared
+        jobs that only lost a submitter: a job that identical submissions
+        attached to keeps running until all of its submitters cancel it.
+        The CANCELLED status is the flag running tasks check, and it makes
+        any later PROCESSING/COMPLETED transition for the job fail.
+        """
+        if not cache_service.redis_client or not job_ids:
+            return [], []
+        
+        allowed = ",".join(previous.value for previous in ALLOWED_TRANSITIONS[JobStatus.CANCELLED])
+        fields = self._flatten({"completed_at": datetime.now().isoformat()})
+        async with cache_service.redis_client.pipeline(transaction=False) as pipe:
+            for job_id in job_ids:
+                keys = self._transition_keys(job_id)
+                pipe.eval(
+                    CANCEL_JOB_SCRIPT, len(keys), *keys,
+                    JobStatus.CANCELLED.value, allowed, settings.job_ttl, *fields
+                )
+                pipe.hget(keys[0], "task_id")
+            results = await pipe.execute()
+        
+        transitions = []
+        cancelled = []
+        withdrawn = []
+        for job_id, outcome, task_id in zip(job_ids, results[::2], results[1::2]):
+            if outcome and outcome[0]:
+                transitions.append((job_id, outcome[2].decode()))
+                cancelled.append((job_id, task_id.decode() if task_id else job_id))
+            elif outcome and len(outcome) > 3:
+                app_logger.info(f"Withdrew a submitter from shared job {job_id}, {outcome[3]} left")
+                withdrawn.append(job_id)
+        if transitions:
+            await self._announce(transitions, JobStatus.CANCELLED)
+            app_logger.info(f"Cancelled {len(transitions)} jobs")
+        return cancelled, withdrawn
+    
+    async def get_batch_job_ids(self, batch_id: str) -> List[str]:
+        """IDs of every job in a batch, in submission order"""
+        if not cache_service.redis_client:
+            return []
+        job_ids = await cache_service.redis_client.lrange(f"{self._batch_key(batch_id)}:jobs", 0, -1)
+        return [job_id.decode() for job_id in job_ids]
+    
+    async def raise_if_cancelled(self, job_id: str):
+        """Raise JobCancelledError if the job has been cancelled"""
+        if not cache_service.redis_client:
+            return
+        status = await cache_service.redis_client.hget(self._job_key(job_id), "status")
+        if status and status.decode() == JobStatus.CANCELLED.value:
+            raise JobCancelledError(f"Job {job_id} was cancelled")
+    
+    async def run_cancellable(self, job_id: str, work: Awaitable[T]) -> T:
+        """Await work, abandoning it as soon as the job is cancelled
+        
+        A cancelled job's coroutine is cancelled at its current await, so the
+        worker is freed without waiting for an in-flight upstream call.
+        """
+        task = asyncio.ensure_future(work)
+        watcher = asyncio.create_task(self._wait_for_cancellation(job_id))
+        try:
+            await asyncio.wait({task, watcher}, return_when=asyncio.FIRST_COMPLETED)
+            if not task.done() and not watcher.cancelled() and watcher.exception() is None and watcher.result():
+                raise JobCancelledError(f"Job {job_id} was cancelled")
+            return await task
+        finally:
+            watcher.cancel()
+            if not task.done():
+                task.cancel()
+    
+    async def _wait_for_cancellation(self, job_id: str) -> bool:
+        """Return True once the job is cancelled, False if it finishes otherwise
+        
+        This runs in workers, whose event loop only runs during tasks, so it
+        subscribes to this job's channel alone and only while the job runs,
+        rather than starting the process-wide listener for every job event.
+        """
+        pubsub = cache_service.pubsub() if cache_service.pubsub_client else None
+        try:
+            if pubsub is not None:
+                await pubsub.subscribe(self._job_channel(job_id))
+            while True:
+                # Read only once subscribed, so no change can slip in between
+                job = await self.get_job_status(job_id)
+                if job is None or job.status in TERMINAL_STATUSES:
+                    return job is not None and job.status == JobStatus.CANCELLED
+                if pubsub is not None:
+                    await pubsub.get_message(ignore_subscribe_messages=True, timeout=CANCELLATION_CHECK_INTERVAL)
+                else:
+                    await asyncio.sleep(CANCELLATION_CHECK_INTERVAL)
+        finally:
+            if pubsub is not None:
+                try:
+                    await pubsub.unsubscribe()
+                    await pubsub.close()
+                except Exception:
+                    pass
+    
+    async def create_batch(self, items: List[Tuple[str, str]]) -> Tuple[str, List[str]]:
+        """Create one job per (task_type, payload_ref) item plus batch counters, in one round trip
+        
+        Returns (batch_id, job_ids) with job IDs in item order.
+        """
+        if not cache_service.redis_client:
+            raise RuntimeError("Job store unavailable: Redis is not configured")
+        
+        batch_id = str(uuid.uuid4())
+        batch_key = self._batch_key(batch_id)
+        created_at = datetime.now().isoformat()
+        # Batch job IDs carry the batch ID, which places each job next to the batch counters
+        job_ids = [f"{batch_id}.{index}" for index in range(len(items))]
+        
+        async with cache_service.redis_client.pipeline(transaction=False) as pipe:
+            for job_id, (task_type, payload_ref) in zip(job_ids, items):
+                job_key = self._job_key(job_id)
+                pipe.hset(job_key, mapping=self._encode_fields({
+                    "job_id": job_id,
+                    "task_type": task_type,
+                    "status": JobStatus.PENDING.value,
+                    "created_at": created_at,
+                    "payload_ref": payload_ref,
+                    "task_id": job_id,
+                    "batch_id": batch_id
+                }))
+                pipe.expire(job_key, settings.job_ttl)
+            pipe.hset(batch_key, mapping={
+                "total": len(items),
+                "created_at": created_at,
+                **{status.value: 0 for status in JobStatus},
+                JobStatus.PENDING.value: len(items)
+            })
+            pipe.expire(batch_key, settings.job_ttl)
+            pipe.rpush(f"{batch_key}:jobs", *job_ids)
+            pipe.expire(f"{batch_key}:jobs", settings.job_ttl)
+            await pipe.execute()
+        
+        app_logger.info(f"Created batch {batch_id} with {len(items)} jobs")
+        return batch_id, job_ids
+    
+    async def get_batch_status(self, batch_id: str, offset: int = 0, limit: int = 100) -> Optional[BatchStatusResponse]:
+        """Aggregate counts and progress of a batch, plus one page of its jobs in submission order"""
+        if not cache_service.redis_client:
+            return None
+        
+        batch_key = self._batch_key(batch_id)
+        async with cache_service.redis_client.pipeline(transaction=False) as pipe:
+            pipe.hgetall(batch_key)
+            if limit > 0:
+                pipe.lrange(f"{batch_key}:jobs", offset, offset + limit - 1)
+            batch_data, *pages = await pipe.execute()
+        if not batch_data:
+            return None
+        job_ids = pages[0] if pages else []
+        
+        async with cache_service.redis_client.pipeline(transaction=False) as pipe:
+            for job_id in job_ids:
+                pipe.hmget(self._job_key(job_id.decode()), STATUS_FIELDS)
+            pages = await pipe.execute()
+        
+        items = []
+        for values in pages:
+            job_data = {name: self._decode_field(name, value) for name, value in zip(STATUS_FIELDS, values)}
+            # Jobs expire individually, so skip any already gone
+            if job_data["status"]:
+                items.append(self._job_response(job_data))
+        
+        fields = {name.decode(): value.decode() for name, value in batch_data.items()}
+        total = int(fields["total"])
+        counts = {status.value: int(fields.get(status.value, 0)) for status in JobStatus}
+        finished = sum(counts[status.value] for status in TERMINAL_STATUSES)
+        return BatchStatusResponse(
+            batch_id=batch_id,
+            total=total,
+            counts=counts,
+            progress=finished / total if total else 1.0,
+            created_at=datetime.fromisoformat(fields["created_at"]),
+            offset=offset,
+            limit=limit,
+            items=items
+        )
+    
+    def watch_job(self, job_id: str, timeout: float, heartbeat: Optional[float] = None) -> AsyncIterator[Optional[JobResponse]]:
+        """Yield a job's status now and after every change until it finishes or timeout elapses
+        
+        With a heartbeat interval, None is yielded whenever that long passes
+        without a change.
+        """
+        return self._watch(
+            self._job_channel(job_id), lambda: self.get_job_status(job_id),
+            lambda job: job.status in TERMINAL_STATUSES, timeout, heartbeat
+        )
+    
+    def watch_batch(self, batch_id: str, timeout: float, heartbeat: Optional[float] = None) -> AsyncIterator[Optional[BatchStatusResponse]]:
+        """Yield a batch's counts and progress now and as its jobs change, until all have finished
+        
+        Updates are coalesced to at most one per JOB_BATCH_EVENT_INTERVAL.
+        """
+        return self._watch(
+            self._batch_channel(batch_id), lambda: self.get_batch_status(batch_id, limit=0),
+            lambda batch: sum(batch.counts[status.value] for status in TERMINAL_STATUSES) >= batch.total, timeout, heartbeat, settings.job_batch_event_interval
+        )
+    
+    async def _watch(
+        self,
+        channel: str,
+        read: Callable[[], Awaitable[Any]],
+        finished: Callable[[Any], bool],
+        timeout: float,
+        heartbeat: Optional[float] = None,
+        min_interval: float = 0.0
+    ) -> AsyncIterator[Any]:
+        """Yield read() now and after each event on channel, until finished, gone or timed out"""
+        if not cache_service.pubsub_client:
+            state = await read()
+            if state is not None:
+                yield state
+            return
+        
+        deadline = time.monotonic() + timeout
+        wakeup = self._add_watcher(channel)
+        try:
+            # Read only once registered, so no change can slip in between
+            state = await read()
+            while state is not None:
+                yield state
+                if finished(state):
+                    return
+                last_update = idle_since = time.monotonic()
+                
+                previous = state
+                while state == previous:
+                    now = time.monotonic()
+                    if now >= deadline:
+                        return
+                    wait = deadline - now
+                    if heartbeat:
+                        wait = min(wait, max(0.0, idle_since + heartbeat - now))
+                    try:
+                        await asyncio.wait_for(wakeup.wait(), timeout=wait)
+                    except asyncio.TimeoutError:
+                        if heartbeat and time.monotonic() - idle_since >= heartbeat:
+                            idle_since = time.monotonic()
+                            yield None
+                        continue
+                    
+                    if min_interval:
+                        await asyncio.sleep(max(0.0, last_update + min_interval - time.monotonic()))
+                    # Events that arrived meanwhile are covered by this read
+                    wakeup.clear()
+                    # Wakeups after a reconnect may find nothing new, which is not reported
+                    state = await read()
+        finally:
+            self._remove_watcher(channel, wakeup)
+    
+    def _add_watcher(self, channel: str) -> asyncio.Event:
+        """Register for wakeups on a channel, starting this process's event listener if needed"""
+        wakeup = asyncio.Event()
+        self._watchers.setdefault(channel, set()).add(wakeup)
+        task = self._listener_task
+        # A listener left behind on another (closed) event loop cannot deliver here
+        if task is None or task.done() or task.get_loop() is not asyncio.get_running_loop():
+            self._listener_task = asyncio.create_task(self._listen_for_events())
+        return wakeup
+    
+    def _remove_watcher(self, channel: str, wakeup: asyncio.Event):
+        """Unregister a watcher"""
+        watchers = self._watchers.get(channel)
+        if watchers is not None:
+            watchers.discard(wakeup)
+            if not watchers:
+                del self._watchers[channel]
+    
+    def _wake_all(self):
+        """Make every watcher re-read its state"""
+        for watchers in self._watchers.values():
+            for wakeup in watchers:
+                wakeup.set()
+    
+    async def _listen_for_events(self):
+        """Wake local watchers on job and batch events over one pattern subscription, reconnecting on errors"""
+        while True:
+            pubsub = cache_service.pubsub()
+            try:
+                await pubsub.psubscribe(self._job_channel("*"), self._batch_channel("*"))
+                while True:
+                    message = await pubsub.get_message(timeout=1.0)
+                    if message is None:
+                        continue
+                    if message["type"] == "psubscribe":
+                        # Events may have been missed before (re)subscribing, so everyone re-reads
+                        self._wake_all()
+                    elif message["type"] == "pmessage":
+                        for wakeup in self._watchers.get(message["channel"].decode(), ()):
+                            wakeup.set()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                app_logger.error(f"Job event listener error: {str(e)}")
+                await asyncio.sleep(1)
+            finally:
+                try:
+                    await pubsub.close()
+                except Exception:
+                    pass
+    
+    async def stop_event_listener(self):
+        """Stop this process's event listener if it is running"""
+        if self._listener_task:
+            self._listener_task.cancel()
+            try:
+                await self._listener_task
+            except asyncio.CancelledError:
+                pass
+            self._listener_task = None
 
-job_service = JobService()
\ No newline at end of file
+job_service = JobService()
@@ -0,0 +1,70 @@
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+class LocalCache:
+    """Bounded in-process LRU cache with per-entry TTLs
+    
+    Capacity is limited both by entry count and by an approximate byte
+    budget (the serialized size of each value). Values are returned as-is,
+    so callers must treat them as read-only.
+    """
+    
+    def __init__(self, max_entries: int, max_bytes: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self._entries: "OrderedDict[str, Tuple[Any, float, int]]" = OrderedDict()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0}
+    
+    def get(self, key: str) -> Optional[Any]:
+        """Get a live value, refreshing its recency"""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.stats["misses"] += 1
+            return None
+        
+        value, expires_at, _ = entry
+        if expires_at <= time.monotonic():
+            self._remove(key)
+            self.stats["expirations"] += 1
+            self.stats["misses"] += 1
+            return None
+        
+        self._entries.move_to_end(key)
+        self.stats["hits"] += 1
+        return value
+    
+    def set(self, key: str, value: Any, ttl: float, size: int):
+        """Store a value for ttl seconds, evicting least recently used entries as needed"""
+        self._remove(key)
+        if ttl <= 0 or size > self.max_bytes:
+            return
+        
+        self._entries[key] = (value, time.monotonic() + ttl, size)
+        self.current_bytes += size
+        while len(self._entries) > self.max_entries or self.current_bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.stats["evictions"] += 1
+    
+    def delete(self, key: str) -> bool:
+        """Drop a key if present"""
+        return self._remove(key)
+    
+    def clear(self):
+        """Drop every entry"""
+        self._entries.clear()
+        self.current_bytes = 0
+    
+    def _remove(self, key: str) -> bool:
+        """Remove an entry and release its bytes"""
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return False
+        self.current_bytes -= entry[2]
+        return True
+    
+    def info(self) -> Dict[str, Any]:
+        """Counters plus current occupancy"""
+        return {**self.stats, "entries": len(self._entries), "bytes": self.current_bytes}
@@ -0,0 +1,65 @@
+"""
+Claim-check store for job payloads
+
+A job's request body is stored once under a content-addressed payload:<hash>
+key, and only that reference travels through the Celery broker and the job
+record. Workers fetch the payload when they start. Identical payloads
+submitted repeatedly share one stored copy, whose TTL is extended on reuse.
+"""
+
+import hashlib
+import json
+from typing import Any, Dict, List, Optional
+from app.core.config import settings
+from app.services.cache_service import cache_service
+from app.utils.logger import app_logger
+
+class PayloadStore:
+    """Content-addressed storage of job payloads in Redis"""
+    
+    def __init__(self):
+        self.stats = {"stored": 0, "deduplicated": 0, "fetched": 0, "missing": 0}
+    
+    @staticmethod
+    def reference(payload: Dict[str, Any]) -> str:
+        """Content-addressed key of a payload"""
+        canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+        return f"payload:{hashlib.blake2b(canonical.encode(), digest_size=16).hexdigest()}"
+    
+    async def put(self, payload: Dict[str, Any]) -> str:
+        """Store a payload (or extend the TTL of its existing copy) and return its reference"""
+        return (await self.put_many([payload]))[0]
+    
+    async def put_many(self, payloads: List[Dict[str, Any]]) -> List[str]:
+        """Store several payloads in one round trip, returning their references in order"""
+        if not cache_service.redis_client:
+            raise RuntimeError("Payload store unavailable: Redis is not configured")
+        
+        refs = [self.reference(payload) for payload in payloads]
+        unique = dict(zip(refs, payloads))
+        async with cache_service.redis_client.pipeline(transaction=False) as pipe:
+            for ref, payload in unique.items():
+                pipe.set(ref, cache_service.codec.encode(payload), nx=True, ex=settings.job_ttl)
+                # A copy already stored must outlive the new job too
+                pipe.expire(ref, settings.job_ttl)
+            results = await pipe.execute()
+        
+        stored = sum(1 for created in results[::2] if created)
+        self.stats["stored"] += stored
+        self.stats["deduplicated"] += len(refs) - stored
+        return refs
+    
+    async def get(self, ref: str) -> Optional[Dict[str, Any]]:
+        """Fetch a payload by reference, or None if it has expired"""
+        if not cache_service.redis_client:
+            return None
+        
+        data = await cache_service.redis_client.get(ref)
+        if data is None:
+            self.stats["missing"] += 1
+            app_logger.warning(f"Payload {ref} is missing or expired")
+            return None
+        self.stats["fetched"] += 1
+        return cache_service.codec.decode(data)
+
+payload_store = PayloadStore()
@@ -0,0 +1,211 @@
+"""
+Redis client construction for the cache layer: single node, client-side
+consistent-hash sharding, or native Redis Cluster
+
+Sharded mode spreads keys over REDIS_SHARD_URLS with a consistent-hash ring
+(virtual nodes), so adding or removing a node remaps only about 1/N of the
+keys. Like Redis Cluster, only the part of a key inside {braces} is hashed
+when present, which keeps related keys (e.g. a namespace's budget
+accounting used by one Lua script) on the same node. Pub/sub always goes
+through a single node.
+"""
+
+import asyncio
+import bisect
+import hashlib
+from collections import defaultdict
+from typing import Any, AsyncIterator, Dict, List, Tuple
+import redis.asyncio as aioredis
+from redis.asyncio.cluster import RedisCluster
+from app.core.config import settings
+from app.utils.logger import app_logger
+
+def hash_slot_key(key: Any) -> bytes:
+    """Part of a key that determines its shard: the first non-empty {hash tag}, else the whole key"""
+    if isinstance(key, str):
+        key = key.encode()
+    start = key.find(b"{")
+    if start != -1:
+        end = key.find(b"}", start + 1)
+        if end > start + 1:
+            return key[start + 1:end]
+    return key
+
+class HashRing:
+    """Consistent-hash ring with virtual nodes"""
+    
+    def __init__(self, nodes: List[str], vnodes: int = 160):
+        self.nodes = list(nodes)
+        self._points: List[int] = []
+        self._owners: List[str] = []
+        for point, node in sorted(
+            (self._hash(f"{node}#{replica}".encode()), node) for node in self.nodes for replica in range(vnodes)
+        ):
+            self._points.append(point)
+            self._owners.append(node)
+    
+    @staticmethod
+    def _hash(data: bytes) -> int:
+        """64-bit position on the ring"""
+        return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), "big")
+    
+    def node_for(self, key: Any) -> str:
+        """Node owning a key"""
+        index = bisect.bisect(self._points, self._hash(hash_slot_key(key))) % len(self._points)
+        return self._owners[index]
+
+class ShardedPipeline:
+    """Non-transactional pipeline that groups queued commands per shard
+    
+    Each shard's commands run as one pipeline, shards run concurrently, and
+    replies are returned in the order the commands were queued. Multi-key
+    DEL/EXISTS are split per shard and their counts summed.
+    """
+    
+    def __init__(self, client: "ShardedRedis"):
+        self.client = client
+        self._commands: List[List[Tuple[str, str, tuple, dict]]] = []
+    
+    async def __aenter__(self) -> "ShardedPipeline":
+        return self
+    
+    async def __aexit__(self, *exc_info):
+        self._commands.clear()
+    
+    def __getattr__(self, name: str):
+        def queue(*args, **kwargs) -> "ShardedPipeline":
+            self._commands.append(self.client.route(name, args, kwargs))
+            return self
+        return queue
+    
+    async def execute(self) -> List[Any]:
+        """Run every queued command, one pipeline per shard"""
+        by_shard: Dict[str, List[Tuple[int, str, tuple, dict]]] = defaultdict(list)
+        for index, parts in enumerate(self._commands):
+            for node, name, args, kwargs in parts:
+                by_shard[node].append((index, name, args, kwargs))
+        
+        async def run(node: str, commands: List[Tuple[int, str, tuple, dict]]) -> List[Any]:
+            async with self.client.shards[node].pipeline(transaction=False) as pipe:
+                for _, name, args, kwargs in commands:
+                    getattr(pipe, name)(*args, **kwargs)
+                return await pipe.execute()
+        
+        nodes = list(by_shard)
+        replies = await asyncio.gather(*(run(node, by_shard[node]) for node in nodes))
+        
+        results: List[List[Any]] = [[] for _ in self._commands]
+        for node, node_replies in zip(nodes, replies):
+            for (index, _, _, _), reply in zip(by_shard[node], node_replies):
+                results[index].append(reply)
+        self._commands.clear()
+        return [parts[0] if len(parts) == 1 else sum(parts) for parts in results]
+
+class ShardedRedis:
+    """Subset of the redis.asyncio client API routed over several nodes by key"""
+    
+    # Commands whose every positional argument is a key
+    MULTI_KEY_COMMANDS = {"delete", "exists", "unlink"}
+    
+    def __init__(self, shards: Dict[str, aioredis.Redis], vnodes: int = 160):
+        self.shards = shards
+        self.ring = HashRing(list(shards), vnodes)
+        # Pub/sub and keyless commands go to the first node
+        self.primary = next(iter(shards))
+    
+    def route(self, name: str, args: tuple, kwargs: dict) -> List[Tuple[str, str, tuple, dict]]:
+        """Split a command into (node, name, args, kwargs) parts"""
+        if name in self.MULTI_KEY_COMMANDS:
+            by_node: Dict[str, list] = defaultdict(list)
+            for key in args:
+                by_node[self.ring.node_for(key)].append(key)
+            return [(node, name, tuple(keys), kwargs) for node, keys in by_node.items()]
+        if name in ("eval", "evalsha"):
+            node = self.ring.node_for(args[2]) if args[1] else self.primary
+            return [(node, name, args, kwargs)]
+        if name == "publish" or not args:
+            return [(self.primary, name, args, kwargs)]
+        return [(self.ring.node_for(args[0]), name, args, kwargs)]
+    
+    def __getattr__(self, name: str):
+        async def command(*args, **kwargs):
+            parts = self.route(name, args, kwargs)
+            replies = await asyncio.gather(
+                *(getattr(self.shards[node], part_name)(*part_args, **part_kwargs)
+                  for node, part_name, part_args, part_kwargs in parts)
+            )
+            return replies[0] if len(replies) == 1 else sum(replies)
+        return command
+    
+    def pipeline(self, transaction: bool = False) -> ShardedPipeline:
+        """Pipeline grouped per shard (never transactional across shards)"""
+        return ShardedPipeline(self)
+    
+    def pubsub(self, **kwargs):
+        """Pub/sub on the primary node"""
+        return self.shards[self.primary].pubsub(**kwargs)
+    
+    async def ping(self) -> bool:
+        """Ping every shard"""
+        return all(await asyncio.gather(*(shard.ping() for shard in self.shards.values())))
+    
+    async def scan_iter(self, match: str = None, count: int = None) -> AsyncIterator[bytes]:
+        """Iterate matching keys across all shards"""
+        for shard in self.shards.values():
+            async for key in shard.scan_iter(match=match, count=count):
+                yield key
+    
+    async def close(self):
+        """Disconnect every shard's pool"""
+        await asyncio.gather(*(shard.connection_pool.disconnect() for shard in self.shards.values()))
+
+def _pool_options() -> Dict[str, Any]:
+    """Connection options shared by every mode"""
+    return {
+        "max_connections": settings.redis_max_connections,
+        "socket_timeout": settings.redis_socket_timeout,
+        "socket_connect_timeout": settings.redis_socket_connect_timeout,
+        "health_check_interval": settings.redis_health_check_interval
+    }
+
+def _single_client(url: str) -> aioredis.Redis:
+    """Client over its own lazily-connecting pool"""
+    return aioredis.Redis(connection_pool=aioredis.ConnectionPool.from_url(url, **_pool_options()))
+
+def create_redis_clients() -> Tuple[Any, aioredis.Redis]:
+    """Build (data client, pub/sub client) for the configured REDIS_MODE"""
+    mode = settings.redis_mode
+    if mode == "single":
+        client = _single_client(settings.redis_url)
+        app_logger.info(f"Configured Redis connection pool (max connections: {settings.redis_max_connections})")
+        return client, client
+    
+    if mode == "sharded":
+        urls = [url.strip() for url in settings.redis_shard_urls.split(",") if url.strip()]
+        if not urls:
+            raise ValueError("REDIS_SHARD_URLS is required when REDIS_MODE=sharded")
+        client = ShardedRedis({url: _single_client(url) for url in urls}, settings.redis_shard_vnodes)
+        if settings.redis_pubsub_url:
+            pubsub_client = _single_client(settings.redis_pubsub_url)
+        else:
+            pubsub_client = client.shards[client.primary]
+        app_logger.info(f"Configured sharded Redis cache over {len(urls)} nodes")
+        return client, pubsub_client
+    
+    if mode == "cluster":
+        options = _pool_options()
+        options.pop("health_check_interval")
+        client = RedisCluster.from_url(settings.redis_url, **options)
+        # Classic pub/sub is broadcast cluster-wide, so any single node will do
+        pubsub_client = _single_client(settings.redis_pubsub_url or settings.redis_url)
+        app_logger.info(f"Configured Redis Cluster cache via {settings.redis_url}")
+        return client, pubsub_client
+    
+    raise ValueError(f"Unknown Redis mode: {mode} (expected single, sharded or cluster)")
+
+async def close_redis_client(client: Any):
+    """Release a client's connections, whatever its mode"""
+    if isinstance(client, aioredis.Redis):
+        await client.connection_pool.disconnect()
+    else:
+        await client.close()
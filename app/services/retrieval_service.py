@@ -0,0 +1,112 @@
+import re
+from collections import Counter
+from typing import Any, Dict, List
+import numpy as np
+from app.utils.text_chunker import split_text
+
+_TOKEN_PATTERN = re.compile(r"\w+")
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens for lexical ranking"""
+    return _TOKEN_PATTERN.findall(text.lower())
+
+def estimate_tokens(text: str) -> int:
+    """Rough model token count (about four characters per token)"""
+    return max(1, len(text) // 4)
+
+class BM25Index:
+    """Okapi BM25 ranking over a fixed set of passages
+    
+    Term frequencies are kept as flat (passage, term, count) arrays so a
+    query is scored with a handful of vectorized NumPy operations.
+    """
+    
+    def __init__(self, passages: List[str], k1: float = 1.5, b: float = 0.75):
+        self.passages = passages
+        self.k1 = k1
+        self.b = b
+        self.vocabulary = {}
+        
+        doc_ids, term_ids, counts, lengths = [], [], [], []
+        for doc_id, passage in enumerate(passages):
+            tokens = tokenize(passage)
+            lengths.append(len(tokens))
+            for term, count in Counter(tokens).items():
+                doc_ids.append(doc_id)
+                term_ids.append(self.vocabulary.setdefault(term, len(self.vocabulary)))
+                counts.append(count)
+        
+        self.doc_ids = np.array(doc_ids, dtype=np.int32)
+        self.term_ids = np.array(term_ids, dtype=np.int32)
+        self.term_freqs = np.array(counts, dtype=np.float32)
+        self.doc_lengths = np.array(lengths, dtype=np.float32)
+        self.avg_length = float(self.doc_lengths.mean()) if len(passages) else 0.0
+        
+        doc_freqs = np.bincount(self.term_ids, minlength=len(self.vocabulary)).astype(np.float32)
+        self.idf = np.log1p((len(passages) - doc_freqs + 0.5) / (doc_freqs + 0.5))
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Serialize the built index so it can be stored and reloaded without re-tokenizing"""
+        return {
+            "passages": self.passages,
+            "k1": self.k1,
+            "b": self.b,
+            "vocabulary": list(self.vocabulary),
+            "doc_ids": self.doc_ids.tolist(),
+            "term_ids": self.term_ids.tolist(),
+            "term_freqs": self.term_freqs.tolist(),
+            "doc_lengths": self.doc_lengths.tolist(),
+            "idf": self.idf.tolist()
+        }
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "BM25Index":
+        """Rebuild an index serialized with to_dict"""
+        index = cls.__new__(cls)
+        index.passages = data["passages"]
+        index.k1 = data["k1"]
+        index.b = data["b"]
+        index.vocabulary = {term: term_id for term_id, term in enumerate(data["vocabulary"])}
+        index.doc_ids = np.array(data["doc_ids"], dtype=np.int32)
+        index.term_ids = np.array(data["term_ids"], dtype=np.int32)
+        index.term_freqs = np.array(data["term_freqs"], dtype=np.float32)
+        index.doc_lengths = np.array(data["doc_lengths"], dtype=np.float32)
+        index.avg_length = float(index.doc_lengths.mean()) if len(index.passages) else 0.0
+        index.idf = np.array(data["idf"], dtype=np.float32)
+        return index
+    
+    def score(self, query: str) -> np.ndarray:
+        """BM25 score of every passage for the query"""
+        scores = np.zeros(len(self.passages), dtype=np.float32)
+        query_ids = [self.vocabulary[term] for term in set(tokenize(query)) if term in self.vocabulary]
+        if not query_ids or self.avg_length == 0:
+            return scores
+        
+        mask = np.isin(self.term_ids, query_ids)
+        docs = self.doc_ids[mask]
+        tf = self.term_freqs[mask]
+        idf = self.idf[self.term_ids[mask]]
+        norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[docs] / self.avg_length)
+        np.add.at(scores, docs, idf * tf * (self.k1 + 1) / (tf + norm))
+        return scores
+    
+    def top_passages(self, query: str, top_k: int, token_budget: int) -> List[str]:
+        """Best-scoring passages within the token budget, in document order"""
+        scores = self.score(query)
+        selected, used = [], 0
+        for idx in np.argsort(-scores, kind="stable"):
+            if len(selected) >= top_k:
+                break
+            cost = estimate_tokens(self.passages[idx])
+            if selected and used + cost > token_budget:
+                continue
+            selected.append(int(idx))
+            used += cost
+        return [self.passages[idx] for idx in sorted(selected)]
+
+def select_passages(context: str, question: str, top_k: int, token_budget: int, passage_chars: int) -> str:
+    """Reduce a large context to the passages most relevant to the question"""
+    if estimate_tokens(context) <= token_budget:
+        return context
+    index = BM25Index(split_text(context, passage_chars))
+    return "\n\n".join(index.top_passages(question, top_k, token_budget))
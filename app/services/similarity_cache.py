@@ -0,0 +1,158 @@
+"""
+Near-duplicate result cache
+
+Requests whose text differs only slightly (timestamps, signatures, small
+edits) get the same or a close 64-bit SimHash fingerprint over word
+shingles. Fingerprints are split into bands stored as Redis sorted sets
+scored by insertion time, so any entry within a few bits of the query
+shares at least one band and is found with a handful of reads. A candidate
+is reused only when its similarity reaches the threshold configured for its
+namespace. Each band keeps only its newest members, and members older than
+any cached result can live are trimmed on insert.
+"""
+
+import hashlib
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from app.core.config import settings
+from app.services.cache_service import cache_service
+from app.services.retrieval_service import tokenize
+from app.utils.logger import app_logger
+
+SIMHASH_BITS = 64
+LSH_BANDS = 4  # Pigeonhole: fingerprints within 3 bits always share a band
+SHINGLE_SIZE = 3
+_BAND_BITS = SIMHASH_BITS // LSH_BANDS
+_BIT_POSITIONS = np.arange(SIMHASH_BITS, dtype=np.uint64)
+
+def shingles(tokens: List[str], size: int = SHINGLE_SIZE) -> List[str]:
+    """Overlapping word n-grams"""
+    if len(tokens) <= size:
+        return [" ".join(tokens)] if tokens else []
+    return [" ".join(tokens[i:i + size]) for i in range(len(tokens) - size + 1)]
+
+def simhash(tokens: List[str]) -> int:
+    """64-bit SimHash of the token shingles, weighted by shingle frequency"""
+    counts = Counter(shingles(tokens))
+    if not counts:
+        return 0
+    hashes = np.array(
+        [int.from_bytes(hashlib.blake2b(gram.encode(), digest_size=8).digest(), "little") for gram in counts],
+        dtype=np.uint64
+    )
+    weights = np.array(list(counts.values()), dtype=np.int64)
+    bits = ((hashes[:, None] >> _BIT_POSITIONS) & np.uint64(1)).astype(np.int64)
+    votes = ((2 * bits - 1) * weights[:, None]).sum(axis=0)
+    return sum(1 << int(position) for position in np.flatnonzero(votes > 0))
+
+def similarity(a: int, b: int) -> float:
+    """Fraction of matching fingerprint bits"""
+    return 1 - (a ^ b).bit_count() / SIMHASH_BITS
+
+class SimilarityCache:
+    """Reuse cached results of near-duplicate requests within a parameter scope
+    
+    The scope is a key over everything except the text (task, model, prompt
+    version, length or language, ...), so only requests that would otherwise
+    share a prompt template are ever matched.
+    """
+    
+    def __init__(self):
+        self.thresholds: Dict[str, float] = {}
+        for item in settings.similarity_cache_thresholds.split(","):
+            namespace, _, threshold = item.partition(":")
+            if namespace.strip() and threshold.strip():
+                self.thresholds[namespace.strip()] = float(threshold)
+        self.stats = {"lookups": 0, "hits": 0, "misses": 0, "indexed": 0}
+    
+    def _threshold(self, scope: str) -> Optional[float]:
+        """Similarity threshold for a scope's namespace, or None when disabled"""
+        if not settings.similarity_cache_enabled or not cache_service.redis_client:
+            return None
+        return self.thresholds.get(scope.split(":", 1)[0])
+    
+    @staticmethod
+    def _band_keys(scope: str, fingerprint: int) -> List[str]:
+        """LSH bucket keys for every band of a fingerprint"""
+        mask = (1 << _BAND_BITS) - 1
+        return [
+            f"simband:{scope}:{band}:{(fingerprint >> (band * _BAND_BITS)) & mask:x}"
+            for band in range(LSH_BANDS)
+        ]
+    
+    @staticmethod
+    def _fingerprint(text: str) -> Optional[int]:
+        """Fingerprint of a text, or None when it is too short to compare reliably"""
+        tokens = tokenize(text)
+        if len(tokens) < settings.similarity_cache_min_tokens:
+            return None
+        return simhash(tokens)
+    
+    async def lookup(self, scope: str, text: str) -> Optional[Tuple[Dict[str, Any], float]]:
+        """Find a cached result for a near-duplicate text, returning it with its similarity"""
+        threshold = self._threshold(scope)
+        if threshold is None:
+            return None
+        fingerprint = self._fingerprint(text)
+        if fingerprint is None:
+            return None
+        
+        self.stats["lookups"] += 1
+        try:
+            band_keys = self._band_keys(scope, fingerprint)
+            async with cache_service.redis_client.pipeline(transaction=False) as pipe:
+                for band_key in band_keys:
+                    pipe.zrange(band_key, 0, -1)
+                buckets = await pipe.execute()
+            
+            candidates = []
+            for member in set().union(*buckets):
+                candidate_fingerprint, _, cache_key = member.decode().partition("|")
+                score = similarity(fingerprint, int(candidate_fingerprint, 16))
+                if score >= threshold:
+                    candidates.append((score, cache_key, member))
+            
+            for score, cache_key, member in sorted(candidates, reverse=True)[:3]:
+                result = await cache_service.get(cache_key)
+                if result is not None:
+                    self.stats["hits"] += 1
+                    app_logger.info(f"Similarity cache hit for {cache_key} (similarity {score:.3f})")
+                    return result, score
+                # The exact entry expired, so drop it from the index
+                async with cache_service.redis_client.pipeline(transaction=False) as pipe:
+                    for band_key in band_keys:
+                        pipe.zrem(band_key, member)
+                    await pipe.execute()
+        except Exception as e:
+            app_logger.error(f"Error looking up similar results for {scope}: {str(e)}")
+        
+        self.stats["misses"] += 1
+        return None
+    
+    async def add(self, scope: str, text: str, cache_key: str):
+        """Index a freshly cached result so near-duplicates can find it"""
+        if self._threshold(scope) is None:
+            return
+        fingerprint = self._fingerprint(text)
+        if fingerprint is None:
+            return
+        
+        member = f"{fingerprint:016x}|{cache_key}"
+        # No cached result outlives this, so older members can only point at expired entries
+        retention = settings.cache_max_ttl + settings.cache_stale_ttl
+        now = time.time()
+        try:
+            async with cache_service.redis_client.pipeline(transaction=False) as pipe:
+                for band_key in self._band_keys(scope, fingerprint):
+                    pipe.zadd(band_key, {member: now})
+                    pipe.zremrangebyscore(band_key, "-inf", now - retention)
+                    pipe.zremrangebyrank(band_key, 0, -settings.similarity_cache_max_band_size - 1)
+                    pipe.expire(band_key, retention)
+                await pipe.execute()
+            self.stats["indexed"] += 1
+        except Exception as e:
+            app_logger.error(f"Error indexing similar results for {cache_key}: {str(e)}")
+
+similarity_cache = SimilarityCache()
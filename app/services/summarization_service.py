@@ -0,0 +1,74 @@
+import asyncio
+from typing import Awaitable, Callable, Optional
+from app.core.config import settings
+from app.models.requests import SummarizeRequest, LongSummarizeRequest
+from app.services.ai_service import ai_service
+from app.services.cache_keys import cache_keys
+from app.services.cache_service import cache_service
+from app.utils.logger import app_logger
+from app.utils.text_chunker import split_text
+
+class LongDocumentSummarizer:
+    """Map-reduce summarization for documents beyond the single-prompt limit
+    
+    The document is split on paragraph/sentence boundaries, chunks are
+    summarized concurrently with bounded parallelism, and the partial
+    summaries are reduced (hierarchically if still too long) to the
+    requested length. Each chunk summary is cached on its own, so a mostly
+    unchanged document only pays for the chunks that changed. An optional
+    check_cancelled coroutine is awaited before every model call and should
+    raise to abandon the remaining work.
+    """
+    
+    async def summarize(
+        self,
+        request: LongSummarizeRequest,
+        check_cancelled: Optional[Callable[[], Awaitable[None]]] = None
+    ) -> str:
+        """Summarize an arbitrarily long document"""
+        chunk_chars = settings.long_summary_chunk_chars
+        text = request.text.strip()
+        if len(text) <= chunk_chars:
+            return await ai_service.summarize_text(SummarizeRequest(text=text, max_length=request.max_length))
+        
+        semaphore = asyncio.Semaphore(settings.long_summary_concurrency)
+        level = 0
+        while len(text) > chunk_chars:
+            chunks = split_text(text, chunk_chars)
+            app_logger.info(f"Summarizing {len(chunks)} chunks at reduce level {level}")
+            partials = await asyncio.gather(
+                *(self._summarize_chunk(chunk, semaphore, check_cancelled) for chunk in chunks)
+            )
+            reduced = "\n\n".join(partials)
+            if len(reduced) >= len(text):
+                raise Exception("AI summarization failed: partial summaries did not shrink the document")
+            text = reduced
+            level += 1
+        
+        if check_cancelled:
+            await check_cancelled()
+        return await ai_service.summarize_text(SummarizeRequest(text=text, max_length=request.max_length))
+    
+    async def _summarize_chunk(
+        self,
+        chunk: str,
+        semaphore: asyncio.Semaphore,
+        check_cancelled: Optional[Callable[[], Awaitable[None]]] = None
+    ) -> str:
+        """Summarize one chunk, reusing a cached summary when the chunk is unchanged"""
+        max_length = settings.long_summary_chunk_summary_length
+        if len(chunk) <= max_length:
+            return chunk
+        cache_key = cache_keys.summary_chunk(chunk, max_length)
+        cached_result = await cache_service.get(cache_key)
+        if cached_result:
+            return cached_result["summary"]
+        
+        async with semaphore:
+            if check_cancelled:
+                await check_cancelled()
+            summary = await ai_service.summarize_text(SummarizeRequest(text=chunk, max_length=max_length))
+        await cache_service.set(cache_key, {"summary": summary})
+        return summary
+
+long_document_summarizer = LongDocumentSummarizer()
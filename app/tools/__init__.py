@@ -0,0 +1 @@
+"""Operational command-line tools"""
\ No newline at end of file
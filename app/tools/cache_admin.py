@@ -0,0 +1,291 @@
+"""
+Cache administration: bulk export/import and warm-up
+
+Subcommands:
+    export   Dump cache namespaces (raw encoded values and remaining TTLs)
+             to a gzip-compressed MessagePack file
+    import   Load an export file back with pipelined writes, skipping keys
+             that already exist unless --overwrite is given
+    warm     Pre-populate result caches by replaying a JSONL request corpus
+             through AIService with bounded concurrency and rate limiting
+
+Examples:
+    python -m app.tools.cache_admin export cache-backup.msgpack.gz --namespaces summary,qa,translate
+    python -m app.tools.cache_admin import cache-backup.msgpack.gz --batch-size 500
+    python -m app.tools.cache_admin warm requests.jsonl --task summarize --concurrency 8 --rate 5
+"""
+
+import argparse
+import asyncio
+import gzip
+import json
+import time
+from datetime import datetime
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterator, List, Tuple
+import msgpack
+from pydantic import BaseModel
+from app.core.config import settings
+from app.models.requests import QuestionAnswerRequest, SummarizeRequest, ToneRewriteRequest, TranslateRequest
+from app.services.ai_service import ai_service
+from app.services.cache_keys import cache_keys
+from app.services.cache_service import cache_service
+
+EXPORT_FORMAT = "ai-backend-cache-export"
+EXPORT_VERSION = 1
+DEFAULT_NAMESPACES = "summary,summary_long,summary_chunk,qa,qa_doc,tone,translate,doc,doc_index"
+
+# task -> (request model, cache key builder, generator, result field)
+WARM_TASKS: Dict[str, Tuple[type, Callable[[Any], str], Callable[[Any], Awaitable[str]], str]] = {
+    "summarize": (SummarizeRequest, cache_keys.summarize, ai_service.summarize_text, "summary"),
+    "question_answer": (QuestionAnswerRequest, cache_keys.question_answer, ai_service.answer_question, "answer"),
+    "tone_rewrite": (ToneRewriteRequest, cache_keys.tone_rewrite, ai_service.rewrite_tone, "rewritten_text"),
+    "translate": (TranslateRequest, cache_keys.translate, ai_service.translate_text, "translation")
+}
+
+ROUTE_TASKS = {
+    "/ai/summarize": "summarize",
+    "/ai/question-answer": "question_answer",
+    "/ai/tone-rewrite": "tone_rewrite",
+    "/ai/translate": "translate"
+}
+
+class Progress:
+    """Counters printed at most once per interval"""
+    
+    def __init__(self, label: str, total: int = 0, interval: float = 2.0):
+        self.label = label
+        self.total = total
+        self.interval = interval
+        self.counts: Dict[str, int] = {}
+        self.start = time.perf_counter()
+        self._last_report = self.start
+    
+    def add(self, name: str, count: int = 1):
+        """Increment a counter and report if the interval has passed"""
+        self.counts[name] = self.counts.get(name, 0) + count
+        now = time.perf_counter()
+        if now - self._last_report >= self.interval:
+            self._last_report = now
+            self.report()
+    
+    def report(self, final: bool = False):
+        """Print the current counters"""
+        done = sum(self.counts.get(name, 0) for name in ("written", "generated", "skipped", "failed", "not_admitted"))
+        of_total = f"/{self.total}" if self.total else ""
+        elapsed = time.perf_counter() - self.start
+        counters = ", ".join(f"{name}={count}" for name, count in sorted(self.counts.items()))
+        print(f"[{self.label}{' done' if final else ''}] {done}{of_total} in {elapsed:.1f}s ({counters})", flush=True)
+
+class RateLimiter:
+    """Token bucket allowing `rate` acquisitions per second (unlimited when rate <= 0)"""
+    
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+    
+    async def acquire(self):
+        """Wait for a token"""
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+def load_corpus(path: str, default_task: str) -> List[Tuple[str, Dict[str, Any]]]:
+    """Load (task, payload) pairs from a JSONL request corpus
+    
+    Lines may carry "task" or an API "path" plus a "payload". Any other line
+    (for example a backlog entry with title/body) becomes a `default_task`
+    request built from its text fields.
+    """
+    corpus = []
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if "payload" in record and ("task" in record or "path" in record):
+                task = record.get("task")
+                if task is None:
+                    route = record["path"].removeprefix(settings.api_v1_prefix).removesuffix("/async")
+                    task = ROUTE_TASKS.get(route)
+                if task in WARM_TASKS:
+                    corpus.append((task, record["payload"]))
+                continue
+            
+            text = "\n\n".join(str(record[field]) for field in ("title", "body", "text") if record.get(field))
+            if not text:
+                continue
+            if default_task == "summarize":
+                payload = {"text": text[:10000], "max_length": record.get("max_length", 200)}
+            elif default_task == "question_answer":
+                payload = {"context": text[:5000], "question": record.get("question", "What is being requested?")}
+            elif default_task == "tone_rewrite":
+                payload = {"text": text[:2000], "target_tone": record.get("target_tone", "formal")}
+            else:
+                payload = {"text": text[:2000], "target_language": record.get("target_language", "Spanish")}
+            corpus.append((default_task, payload))
+    return corpus
+
+async def scan_namespace(namespace: str, batch_size: int) -> AsyncIterator[List[bytes]]:
+    """Yield batches of keys in a namespace"""
+    batch = []
+    async for key in cache_service.redis_client.scan_iter(match=f"{namespace}:*", count=batch_size):
+        batch.append(key)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+async def export_cache(args: argparse.Namespace):
+    """Write raw values and remaining TTLs of the selected namespaces to a file"""
+    namespaces = [namespace.strip() for namespace in args.namespaces.split(",") if namespace.strip()]
+    progress = Progress("export")
+    packer = msgpack.Packer(use_bin_type=True)
+    
+    with gzip.open(args.file, "wb", compresslevel=args.compression_level) as f:
+        f.write(packer.pack({
+            "format": EXPORT_FORMAT,
+            "version": EXPORT_VERSION,
+            "exported_at": datetime.now().isoformat(),
+            "namespaces": namespaces
+        }))
+        for namespace in namespaces:
+            async for keys in scan_namespace(namespace, args.batch_size):
+                entries = await cache_service.dump_many(keys)
+                for entry in entries:
+                    f.write(packer.pack(list(entry)))
+                progress.add("written", len(entries))
+                progress.add("vanished", len(keys) - len(entries))
+    progress.report(final=True)
+
+def read_export(path: str) -> Iterator[List[Any]]:
+    """Yield [key, value, ttl_ms] records from an export file"""
+    with gzip.open(path, "rb") as f:
+        unpacker = msgpack.Unpacker(f, raw=False)
+        header = next(unpacker, None)
+        if not isinstance(header, dict) or header.get("format") != EXPORT_FORMAT:
+            raise SystemExit(f"{path} is not a cache export file")
+        if header.get("version", 0) > EXPORT_VERSION:
+            raise SystemExit(f"{path} was written by a newer version (format {header['version']})")
+        yield from unpacker
+
+async def import_cache(args: argparse.Namespace):
+    """Load an export file with pipelined writes"""
+    progress = Progress("import")
+    batch = []
+    
+    async def flush():
+        written, evicted = await cache_service.restore_many(batch, overwrite=args.overwrite)
+        progress.add("written", written)
+        progress.add("skipped", len(batch) - written)
+        if evicted:
+            progress.add("evicted_for_budget", evicted)
+        batch.clear()
+    
+    for key, value, ttl_ms in read_export(args.file):
+        batch.append((key, value, ttl_ms))
+        if len(batch) >= args.batch_size:
+            await flush()
+    if batch:
+        await flush()
+    progress.report(final=True)
+
+async def warm_cache(args: argparse.Namespace):
+    """Generate and cache results for every corpus request that is not cached yet"""
+    corpus = load_corpus(args.file, args.task)
+    if args.limit:
+        corpus = corpus[:args.limit]
+    progress = Progress("warm", total=len(corpus))
+    limiter = RateLimiter(args.rate, burst=args.concurrency)
+    queue: asyncio.Queue = asyncio.Queue()
+    for item in corpus:
+        queue.put_nowait(item)
+    
+    async def warm_one(task: str, payload: Dict[str, Any]):
+        model, build_key, generate, result_field = WARM_TASKS[task]
+        try:
+            request: BaseModel = model(**payload)
+        except ValueError:
+            progress.add("invalid")
+            return
+        
+        cache_key = build_key(request)
+        if await cache_service.exists(cache_key):
+            progress.add("skipped")
+            return
+        
+        await limiter.acquire()
+        start_time = time.time()
+        try:
+            value = await generate(request)
+        except Exception as e:
+            print(f"Failed {task} request: {str(e)}", flush=True)
+            progress.add("failed")
+            return
+        
+        processing_time = time.time() - start_time
+        stored = await cache_service.set(
+            cache_key, {result_field: value, "processing_time": processing_time},
+            stale_ttl=settings.cache_stale_ttl, compute_time=processing_time
+        )
+        progress.add("generated" if stored else "not_admitted")
+    
+    async def worker():
+        while not queue.empty():
+            await warm_one(*queue.get_nowait())
+    
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    progress.report(final=True)
+
+def build_parser() -> argparse.ArgumentParser:
+    """Command-line interface"""
+    parser = argparse.ArgumentParser(description="Export, import and warm the AI result cache")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    
+    export = subparsers.add_parser("export", help="Dump cache namespaces to a file")
+    export.add_argument("file")
+    export.add_argument("--namespaces", default=DEFAULT_NAMESPACES, help="Comma-separated key namespaces")
+    export.add_argument("--compression-level", type=int, default=6)
+    
+    restore = subparsers.add_parser("import", help="Load an export file")
+    restore.add_argument("file")
+    restore.add_argument("--overwrite", action="store_true", help="Replace keys that already exist")
+    
+    warm = subparsers.add_parser("warm", help="Replay a JSONL request corpus to pre-populate result caches")
+    warm.add_argument("file")
+    warm.add_argument("--task", choices=list(WARM_TASKS), default="summarize", help="Task for lines without a task/path")
+    warm.add_argument("--concurrency", type=int, default=4, help="Requests generated in parallel")
+    warm.add_argument("--rate", type=float, default=0.0, help="Max model calls per second (0 for unlimited)")
+    warm.add_argument("--limit", type=int, default=0, help="Only replay the first N requests")
+    
+    for sub in (export, restore):
+        sub.add_argument("--batch-size", type=int, default=500, help="Keys per pipelined round trip")
+    return parser
+
+COMMANDS = {"export": export_cache, "import": import_cache, "warm": warm_cache}
+
+def main():
+    """Run the selected command"""
+    args = build_parser().parse_args()
+    
+    async def run():
+        try:
+            await COMMANDS[args.command](args)
+        finally:
+            await cache_service.close()
+    
+    asyncio.run(run())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Binary codecs for values stored in Redis
+
+Every encoded value starts with a header byte naming the codec, with the
+high bit set when the body is zlib-compressed. JSON text never starts with
+one of these bytes, so entries written as plain JSON before the codec layer
+existed still decode.
+"""
+
+import json
+import zlib
+from typing import Any, Dict, Protocol
+
+FLAG_ZLIB = 0x80
+
+class Codec(Protocol):
+    """Interface every value codec implements"""
+    
+    name: str
+    format_id: int
+    
+    def dumps(self, value: Any) -> bytes:
+        """Serialize a value"""
+        ...
+    
+    def loads(self, data: bytes) -> Any:
+        """Deserialize a value"""
+        ...
+
+class JsonCodec:
+    """Compact UTF-8 JSON"""
+    
+    name = "json"
+    format_id = 0x01
+    
+    def dumps(self, value: Any) -> bytes:
+        """Serialize a value"""
+        return json.dumps(value, default=str, separators=(",", ":")).encode()
+    
+    def loads(self, data: bytes) -> Any:
+        """Deserialize a value"""
+        return json.loads(data)
+
+class MsgpackCodec:
+    """MessagePack: smaller and faster to decode than JSON"""
+    
+    name = "msgpack"
+    format_id = 0x02
+    
+    def __init__(self):
+        import msgpack
+        
+        self._msgpack = msgpack
+    
+    def dumps(self, value: Any) -> bytes:
+        """Serialize a value"""
+        return self._msgpack.packb(value, default=str, use_bin_type=True)
+    
+    def loads(self, data: bytes) -> Any:
+        """Deserialize a value"""
+        return self._msgpack.unpackb(data, raw=False)
+
+CODECS = {
+    JsonCodec.name: JsonCodec,
+    MsgpackCodec.name: MsgpackCodec
+}
+_FORMATS = {codec_class.format_id: codec_class for codec_class in CODECS.values()}
+
+class ValueCodec:
+    """Encode values with one codec and decode anything any codec has written"""
+    
+    def __init__(self, codec: str, compress_min_bytes: int, compression_level: int):
+        codec_class = CODECS.get(codec)
+        if codec_class is None:
+            raise ValueError(f"Unknown cache codec: {codec} (expected one of {', '.join(CODECS)})")
+        self.codec = codec_class()
+        self.compress_min_bytes = compress_min_bytes
+        self.compression_level = compression_level
+        self._decoders: Dict[int, Codec] = {self.codec.format_id: self.codec}
+        self.stats = {"encoded": 0, "compressed": 0, "raw_bytes": 0, "stored_bytes": 0, "legacy_decoded": 0}
+    
+    def _decoder(self, format_id: int) -> Codec:
+        """Codec for a header byte, created on first use"""
+        decoder = self._decoders.get(format_id)
+        if decoder is None:
+            decoder = self._decoders[format_id] = _FORMATS[format_id]()
+        return decoder
+    
+    def encode(self, value: Any) -> bytes:
+        """Serialize a value, compressing bodies above the size threshold"""
+        body = self.codec.dumps(value)
+        header = self.codec.format_id
+        self.stats["encoded"] += 1
+        self.stats["raw_bytes"] += len(body)
+        
+        if self.compress_min_bytes and len(body) >= self.compress_min_bytes:
+            compressed = zlib.compress(body, self.compression_level)
+            # Incompressible bodies are stored as-is
+            if len(compressed) < len(body):
+                body = compressed
+                header |= FLAG_ZLIB
+                self.stats["compressed"] += 1
+        
+        data = bytes([header]) + body
+        self.stats["stored_bytes"] += len(data)
+        return data
+    
+    def decode(self, data: bytes) -> Any:
+        """Deserialize a value written by any codec, or as legacy JSON text"""
+        if isinstance(data, str):
+            data = data.encode()
+        
+        header = data[0]
+        if header & ~FLAG_ZLIB not in _FORMATS:
+            self.stats["legacy_decoded"] += 1
+            return json.loads(data)
+        
+        body = data[1:]
+        if header & FLAG_ZLIB:
+            body = zlib.decompress(body)
+        return self._decoder(header & ~FLAG_ZLIB).loads(body)
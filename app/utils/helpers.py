@@ -1,7 +1,8 @@
 import time
+import json
 import asyncio
 from functools import wraps
-from typing import Callable, Any
+from typing import Callable, Any, Dict, Optional
 from app.utils.logger import app_logger
 
 def timing_decorator(func: Callable) -> Callable:
@@ -29,4 +30,9 @@ def truncate_text(text: str, max_length: int = 100) -> str:
     """Truncate text for logging"""
     if len(text) <= max_length:
         return text
-    return text[:max_length] + "..."
\ No newline at end of file
+    return text[:max_length] + "..."
+
+def format_sse_event(data: Dict[str, Any], event: Optional[str] = None) -> str:
+    """Format a Server-Sent Event"""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
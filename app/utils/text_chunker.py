@@ -0,0 +1,47 @@
+"""
+Text chunking utilities for long documents
+"""
+
+import re
+from typing import List, Tuple
+
+_PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+def _hard_split(text: str, max_chars: int) -> List[str]:
+    """Split an oversized sentence on whitespace, or mid-word as a last resort"""
+    parts = []
+    while len(text) > max_chars:
+        cut = text.rfind(" ", 0, max_chars + 1)
+        if cut <= 0:
+            cut = max_chars
+        parts.append(text[:cut].strip())
+        text = text[cut:].strip()
+    if text:
+        parts.append(text)
+    return parts
+
+def split_text(text: str, max_chars: int) -> List[str]:
+    """Split text into chunks of at most max_chars, preferring paragraph then sentence boundaries"""
+    pieces: List[Tuple[str, str]] = []  # (separator before piece, piece)
+    for paragraph in _PARAGRAPH_BREAK.split(text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        separator = "\n\n"
+        sentences = [paragraph] if len(paragraph) <= max_chars else _SENTENCE_END.split(paragraph)
+        for sentence in sentences:
+            for part in _hard_split(sentence, max_chars):
+                pieces.append((separator, part))
+                separator = " "
+    
+    chunks: List[str] = []
+    current = ""
+    for separator, piece in pieces:
+        if current and len(current) + len(separator) + len(piece) > max_chars:
+            chunks.append(current)
+            current = ""
+        current = f"{current}{separator}{piece}" if current else piece
+    if current:
+        chunks.append(current)
+    return chunks
@@ -1,10 +1,18 @@
 import asyncio
-from celery import Celery
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from celery import Celery, group
+from celery.signals import worker_init
 from app.core.config import settings
-from app.services.ai_service import ai_service
-from app.services.job_service import job_service
+from app.services.ai_service import ai_service, AIServiceError
+from app.services.cache_keys import cache_keys
+from app.services.cache_service import cache_service
+from app.services.coalescing_service import request_coalescer
+from app.services.job_service import job_service, JobCancelledError
+from app.services.payload_store import payload_store
+from app.services.summarization_service import long_document_summarizer
 from app.models.requests import (
-    SummarizeRequest, QuestionAnswerRequest,
+    SummarizeRequest, LongSummarizeRequest, QuestionAnswerRequest,
     ToneRewriteRequest, TranslateRequest
 )
 from app.models.responses import JobStatus
@@ -25,115 +33,263 @@ celery_app.conf.update(
     timezone="UTC",
     enable_utc=True,
     task_track_started=True,
+    # Results are kept on the job records, so nothing reads them from the result backend
+    task_ignore_result=True,
     task_time_limit=300,  # 5 minutes
     task_soft_time_limit=240,  # 4 minutes
 )
 
+@worker_init.connect
+def disable_l1_cache(**kwargs):
+    """Read results straight from Redis in workers
+    
+    Tasks only run the event loop while they execute, so an L1 invalidation
+    listener could not keep worker copies current between tasks. Worker
+    writes still publish invalidations for the API processes' copies.
+    """
+    cache_service.l1 = None
+
+_worker_loop = None
+
+def run_async(coro):
+    """Run a coroutine on this worker process's persistent event loop
+    
+    Pooled asyncio Redis connections are bound to the loop that opened them,
+    so tasks share one loop instead of creating a fresh one each time.
+    """
+    global _worker_loop
+    if _worker_loop is None or _worker_loop.is_closed():
+        _worker_loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(_worker_loop)
+    return _worker_loop.run_until_complete(coro)
+
+async def generate_cached(
+    cache_key: str,
+    result_field: str,
+    generate: Callable[[], Awaitable[str]],
+    wait_timeout: Optional[float] = None
+) -> str:
+    """Serve a fresh result from the shared cache, or generate and cache it under the same key the routes use
+    
+    Generation is coalesced with identical sync requests and jobs on the
+    same key, so concurrent sync and async traffic makes one upstream call.
+    Deterministic failures are negatively cached under the key too, so
+    resubmitting the same input fails fast. Slow tasks pass their time
+    limit as wait_timeout so coalesced jobs keep waiting for the leader.
+    """
+    cached_result, refresh = await cache_service.get_with_refresh(cache_key)
+    if cached_result and not refresh:
+        app_logger.info(f"Served job result from cache key: {cache_key}")
+        return cached_result[result_field]
+    
+    async def produce() -> Dict[str, Any]:
+        failure = await cache_service.get_negative(cache_key)
+        if failure:
+            raise AIServiceError(failure["error"], failure["reason"])
+        
+        start_time = time.time()
+        try:
+            result = await generate()
+        except AIServiceError as e:
+            if e.deterministic:
+                await cache_service.set_negative(cache_key, str(e), e.reason)
+            raise
+        processing_time = time.time() - start_time
+        result_data = {result_field: result, "processing_time": processing_time}
+        await cache_service.set(
+            cache_key, result_data, stale_ttl=settings.cache_stale_ttl, compute_time=processing_time
+        )
+        return result_data
+    
+    result_data, shared = await request_coalescer.run(cache_key, produce, wait_timeout)
+    if shared:
+        app_logger.info(f"Shared in-flight result for cache key: {cache_key}")
+    return result_data[result_field]
+
+async def load_payload(payload_ref: str) -> Dict[str, Any]:
+    """Fetch a job's request body from the payload store"""
+    payload = await payload_store.get(payload_ref)
+    if payload is None:
+        raise Exception(f"Job payload {payload_ref} has expired")
+    return payload
+
 @celery_app.task(bind=True, name="process_summarize_task")
-def process_summarize_task(self, job_id: str, payload: dict):
+def process_summarize_task(self, job_id: str, payload_ref: str):
     """Process text summarization task"""
     async def _process():
         try:
-            await job_service.update_job_status(job_id, JobStatus.PROCESSING)
-            request = SummarizeRequest(**payload)
-            result = await ai_service.summarize_text(request)
+            if not await job_service.update_job_status(job_id, JobStatus.PROCESSING):
+                app_logger.warning(f"Skipping task for job {job_id}: job is missing or already finished")
+                return None
+            request = SummarizeRequest(**await load_payload(payload_ref))
+            result = await job_service.run_cancellable(job_id, generate_cached(
+                cache_keys.summarize(request), "summary", lambda: ai_service.summarize_text(request)
+            ))
             await job_service.update_job_status(
                 job_id, JobStatus.COMPLETED, 
                 {"summary": result, "task_type": "summarize"}
             )
             app_logger.info(f"Completed summarize task for job {job_id}")
             return result
+        except JobCancelledError:
+            app_logger.info(f"Cancelled summarize task for job {job_id}")
+            return None
         except Exception as e:
             error_msg = str(e)
             await job_service.update_job_status(job_id, JobStatus.FAILED, error=error_msg)
             app_logger.error(f"Failed summarize task for job {job_id}: {error_msg}")
             raise
     
-    # Run async function in sync context
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    try:
-        return loop.run_until_complete(_process())
-    finally:
-        loop.close()
+    return run_async(_process())
+
+@celery_app.task(
+    bind=True, name="process_long_summarize_task",
+    soft_time_limit=settings.long_summary_timeout, time_limit=settings.long_summary_timeout + 60
+)
+def process_long_summarize_task(self, job_id: str, payload_ref: str):
+    """Process long-document map-reduce summarization task"""
+    async def _process():
+        try:
+            if not await job_service.update_job_status(job_id, JobStatus.PROCESSING):
+                app_logger.warning(f"Skipping task for job {job_id}: job is missing or already finished")
+                return None
+            request = LongSummarizeRequest(**await load_payload(payload_ref))
+            result = await job_service.run_cancellable(job_id, generate_cached(
+                cache_keys.summarize_long(request), "summary",
+                lambda: long_document_summarizer.summarize(request, lambda: job_service.raise_if_cancelled(job_id)),
+                wait_timeout=settings.long_summary_timeout
+            ))
+            await job_service.update_job_status(
+                job_id, JobStatus.COMPLETED, 
+                {"summary": result, "task_type": "summarize_long"}
+            )
+            app_logger.info(f"Completed long summarize task for job {job_id}")
+            return result
+        except JobCancelledError:
+            app_logger.info(f"Cancelled long summarize task for job {job_id}")
+            return None
+        except Exception as e:
+            error_msg = str(e)
+            await job_service.update_job_status(job_id, JobStatus.FAILED, error=error_msg)
+            app_logger.error(f"Failed long summarize task for job {job_id}: {error_msg}")
+            raise
+    
+    return run_async(_process())
 
 @celery_app.task(bind=True, name="process_question_answer_task")
-def process_question_answer_task(self, job_id: str, payload: dict):
+def process_question_answer_task(self, job_id: str, payload_ref: str):
     """Process question answering task"""
     async def _process():
         try:
-            await job_service.update_job_status(job_id, JobStatus.PROCESSING)
-            request = QuestionAnswerRequest(**payload)
-            result = await ai_service.answer_question(request)
+            if not await job_service.update_job_status(job_id, JobStatus.PROCESSING):
+                app_logger.warning(f"Skipping task for job {job_id}: job is missing or already finished")
+                return None
+            request = QuestionAnswerRequest(**await load_payload(payload_ref))
+            result = await job_service.run_cancellable(job_id, generate_cached(
+                cache_keys.question_answer(request), "answer", lambda: ai_service.answer_question(request)
+            ))
             await job_service.update_job_status(
                 job_id, JobStatus.COMPLETED, 
                 {"answer": result, "task_type": "question_answer"}
             )
             app_logger.info(f"Completed Q&A task for job {job_id}")
             return result
+        except JobCancelledError:
+            app_logger.info(f"Cancelled Q&A task for job {job_id}")
+            return None
         except Exception as e:
             error_msg = str(e)
             await job_service.update_job_status(job_id, JobStatus.FAILED, error=error_msg)
             app_logger.error(f"Failed Q&A task for job {job_id}: {error_msg}")
             raise
     
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    try:
-        return loop.run_until_complete(_process())
-    finally:
-        loop.close()
+    return run_async(_process())
 
 @celery_app.task(bind=True, name="process_tone_rewrite_task")
-def process_tone_rewrite_task(self, job_id: str, payload: dict):
+def process_tone_rewrite_task(self, job_id: str, payload_ref: str):
     """Process tone rewriting task"""
     async def _process():
         try:
-            await job_service.update_job_status(job_id, JobStatus.PROCESSING)
-            request = ToneRewriteRequest(**payload)
-            result = await ai_service.rewrite_tone(request)
+            if not await job_service.update_job_status(job_id, JobStatus.PROCESSING):
+                app_logger.warning(f"Skipping task for job {job_id}: job is missing or already finished")
+                return None
+            request = ToneRewriteRequest(**await load_payload(payload_ref))
+            result = await job_service.run_cancellable(job_id, generate_cached(
+                cache_keys.tone_rewrite(request), "rewritten_text", lambda: ai_service.rewrite_tone(request)
+            ))
             await job_service.update_job_status(
                 job_id, JobStatus.COMPLETED, 
                 {"rewritten_text": result, "task_type": "tone_rewrite"}
             )
             app_logger.info(f"Completed tone rewrite task for job {job_id}")
             return result
+        except JobCancelledError:
+            app_logger.info(f"Cancelled tone rewrite task for job {job_id}")
+            return None
         except Exception as e:
             error_msg = str(e)
             await job_service.update_job_status(job_id, JobStatus.FAILED, error=error_msg)
             app_logger.error(f"Failed tone rewrite task for job {job_id}: {error_msg}")
             raise
     
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    try:
-        return loop.run_until_complete(_process())
-    finally:
-        loop.close()
+    return run_async(_process())
 
 @celery_app.task(bind=True, name="process_translate_task")
-def process_translate_task(self, job_id: str, payload: dict):
+def process_translate_task(self, job_id: str, payload_ref: str):
     """Process translation task"""
     async def _process():
         try:
-            await job_service.update_job_status(job_id, JobStatus.PROCESSING)
-            request = TranslateRequest(**payload)
-            result = await ai_service.translate_text(request)
+            if not await job_service.update_job_status(job_id, JobStatus.PROCESSING):
+                app_logger.warning(f"Skipping task for job {job_id}: job is missing or already finished")
+                return None
+            request = TranslateRequest(**await load_payload(payload_ref))
+            result = await job_service.run_cancellable(job_id, generate_cached(
+                cache_keys.translate(request), "translation", lambda: ai_service.translate_text(request)
+            ))
             await job_service.update_job_status(
                 job_id, JobStatus.COMPLETED, 
                 {"translation": result, "task_type": "translate"}
             )
             app_logger.info(f"Completed translation task for job {job_id}")
             return result
+        except JobCancelledError:
+            app_logger.info(f"Cancelled translation task for job {job_id}")
+            return None
         except Exception as e:
             error_msg = str(e)
             await job_service.update_job_status(job_id, JobStatus.FAILED, error=error_msg)
             app_logger.error(f"Failed translation task for job {job_id}: {error_msg}")
             raise
     
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
+    return run_async(_process())
+
+# Task processing each job type, used to fan out batch submissions
+TASKS_BY_TYPE = {
+    "summarize": process_summarize_task,
+    "summarize_long": process_long_summarize_task,
+    "question_answer": process_question_answer_task,
+    "tone_rewrite": process_tone_rewrite_task,
+    "translate": process_translate_task
+}
+
+def enqueue_batch(jobs: List[Tuple[str, str, str]]) -> List[str]:
+    """Queue (job_id, task_type, payload_ref) jobs as one Celery group, returning their task IDs in order
+    
+    The group publishes every message over a single broker connection
+    instead of one connection checkout per delay() call. Each task's ID is
+    its job ID, as for single submissions.
+    """
+    result = group(
+        TASKS_BY_TYPE[task_type].s(job_id, payload_ref).set(task_id=job_id) for job_id, task_type, payload_ref in jobs
+    ).apply_async()
+    return [task.id for task in result.results]
+
+def revoke_tasks(task_ids: List[str]):
+    """Tell workers to discard queued tasks; running ones stop at their next cancellation check"""
+    if not task_ids:
+        return
     try:
-        return loop.run_until_complete(_process())
-    finally:
-        loop.close()
\ No newline at end of file
+        celery_app.control.revoke(task_ids)
+    except Exception as e:
+        # The CANCELLED status alone still stops the tasks when they start
+        app_logger.warning(f"Could not revoke {len(task_ids)} tasks: {str(e)}")
@@ -0,0 +1,427 @@
+"""
+Load testing and benchmark harness for the AI Backend Service
+
+Subcommands:
+    http     Drive the /ai/* routes (sync and /async + /jobs polling) with a
+             configurable request mix, concurrency, text sizes and cache-hit ratio
+    replay   Replay a captured JSONL traffic file against the API
+    cache    Benchmark the cache layer in isolation, without HTTP
+    compare  Compare two saved result files and flag regressions
+
+Every run prints a summary and saves a JSON result file, so runs can be
+compared with `compare`. Pair with AI_BACKEND=stub to benchmark without
+calling the real model.
+
+Examples:
+    python -m benchmarks.load_test http --concurrency 32 --requests 2000 \\
+        --mix summarize=4,translate=2,question_answer=1,tone_rewrite=1 --cache-hit-ratio 0.5
+    python -m benchmarks.load_test replay requests.jsonl --task summarize --concurrency 8
+    python -m benchmarks.load_test cache --concurrency 64 --operations 50000 --value-size 2048
+    python -m benchmarks.load_test compare benchmarks/results/old.json benchmarks/results/new.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+import httpx
+import numpy as np
+
+TASK_PATHS = {
+    "summarize": "/ai/summarize",
+    "question_answer": "/ai/question-answer",
+    "tone_rewrite": "/ai/tone-rewrite",
+    "translate": "/ai/translate"
+}
+
+# Per-task input limits from app.models.requests
+TASK_MAX_CHARS = {
+    "summarize": 10000,
+    "question_answer": 5000,
+    "tone_rewrite": 2000,
+    "translate": 2000
+}
+
+WORDS = (
+    "system cache latency request model summary document report market growth revenue "
+    "customer product service data network quarter team result analysis policy update "
+    "release feature performance security platform user support cost memory queue worker"
+).split()
+
+TONES = ["formal", "casual", "professional", "friendly"]
+LANGUAGES = ["Spanish", "French", "German", "Japanese"]
+
+class LatencyRecorder:
+    """Collect per-endpoint latencies, errors and cache hits"""
+    
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.statuses: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self.cached: Dict[str, int] = defaultdict(int)
+        self.counters: Dict[str, int] = defaultdict(int)
+    
+    def record(self, name: str, latency: float, status: Any, ok: bool, cached: bool = False):
+        """Record one completed operation"""
+        self.latencies[name].append(latency)
+        self.statuses[name][str(status)] += 1
+        if not ok:
+            self.errors[name] += 1
+        if cached:
+            self.cached[name] += 1
+    
+    def summary(self, elapsed: float) -> Dict[str, Dict[str, Any]]:
+        """Throughput and latency percentiles per endpoint"""
+        results = {}
+        for name, values in sorted(self.latencies.items()):
+            samples = np.array(values) * 1000
+            results[name] = {
+                "count": len(values),
+                "errors": self.errors[name],
+                "error_rate": self.errors[name] / len(values),
+                "cache_hit_ratio": self.cached[name] / len(values),
+                "throughput_rps": len(values) / elapsed if elapsed else 0.0,
+                "latency_ms": {
+                    "mean": float(samples.mean()),
+                    "p50": float(np.percentile(samples, 50)),
+                    "p95": float(np.percentile(samples, 95)),
+                    "p99": float(np.percentile(samples, 99)),
+                    "max": float(samples.max())
+                },
+                "statuses": dict(self.statuses[name])
+            }
+        return results
+
+class PayloadFactory:
+    """Build request payloads with controlled sizes and cache-hit ratio"""
+    
+    def __init__(self, text_sizes: List[int], cache_hit_ratio: float, seed: int):
+        self.text_sizes = text_sizes
+        self.cache_hit_ratio = cache_hit_ratio
+        self.rng = random.Random(seed)
+        self.sent: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        self.counter = 0
+    
+    def _text(self, size: int) -> str:
+        """Unique filler text of roughly the requested size"""
+        self.counter += 1
+        words = [f"item{self.counter}"]
+        length = len(words[0])
+        while length < size:
+            word = self.rng.choice(WORDS)
+            words.append(word)
+            length += len(word) + 1
+        return " ".join(words)[:size]
+    
+    def build(self, task: str) -> Dict[str, Any]:
+        """A repeated payload with probability cache_hit_ratio, otherwise a fresh one"""
+        previous = self.sent[task]
+        if previous and self.rng.random() < self.cache_hit_ratio:
+            return self.rng.choice(previous)
+        
+        size = min(self.rng.choice(self.text_sizes), TASK_MAX_CHARS[task])
+        text = self._text(max(size, 20))
+        if task == "summarize":
+            payload = {"text": text, "max_length": 200}
+        elif task == "question_answer":
+            payload = {"context": text, "question": "What is the main topic of this text?"}
+        elif task == "tone_rewrite":
+            payload = {"text": text, "target_tone": self.rng.choice(TONES)}
+        else:
+            payload = {"text": text, "target_language": self.rng.choice(LANGUAGES)}
+        previous.append(payload)
+        return payload
+
+def parse_mix(mix: str) -> List[Tuple[str, float]]:
+    """Parse 'summarize=4,translate=1' into weighted tasks"""
+    weights = []
+    for part in mix.split(","):
+        task, _, weight = part.partition("=")
+        if task not in TASK_PATHS:
+            raise SystemExit(f"Unknown task in mix: {task} (expected one of {', '.join(TASK_PATHS)})")
+        weights.append((task, float(weight or 1)))
+    return weights
+
+async def poll_job(client: httpx.AsyncClient, job_id: str, interval: float, timeout: float) -> Tuple[bool, str, int]:
+    """Poll /jobs/{id} until the job finishes; returns (ok, final status, polls)"""
+    deadline = time.perf_counter() + timeout
+    polls = 0
+    while time.perf_counter() < deadline:
+        response = await client.get(f"/jobs/{job_id}")
+        polls += 1
+        if response.status_code == 200:
+            status = response.json()["status"]
+            if status in ("completed", "failed", "cancelled"):
+                return status == "completed", status, polls
+        await asyncio.sleep(interval)
+    return False, "timeout", polls
+
+async def send_request(
+    client: httpx.AsyncClient,
+    recorder: LatencyRecorder,
+    path: str,
+    payload: Dict[str, Any],
+    use_async: bool,
+    args: argparse.Namespace
+):
+    """Send one sync request, or one async submission followed by job polling"""
+    name = f"{path}/async" if use_async else path
+    start = time.perf_counter()
+    try:
+        response = await client.post(name, json=payload)
+        if not use_async or response.status_code != 200:
+            data = response.json().get("data") if response.status_code == 200 else None
+            recorder.record(
+                name, time.perf_counter() - start, response.status_code,
+                response.status_code == 200, bool(data and data.get("cached"))
+            )
+            return
+        
+        recorder.record(f"{name} (submit)", time.perf_counter() - start, response.status_code, True)
+        job_id = response.json()["data"]["job_id"]
+        ok, status, polls = await poll_job(client, job_id, args.poll_interval, args.job_timeout)
+        recorder.record(f"{name} (end-to-end)", time.perf_counter() - start, status, ok)
+        recorder.counters["jobs_polled"] += 1
+        recorder.counters["job_polls"] += polls
+    except Exception as e:
+        recorder.record(name, time.perf_counter() - start, type(e).__name__, False)
+
+async def run_workers(total: Optional[int], duration: Optional[float], concurrency: int, next_request) -> float:
+    """Run a closed-loop load with `concurrency` workers; returns elapsed seconds"""
+    issued = 0
+    deadline = time.perf_counter() + duration if duration else None
+    
+    async def worker():
+        nonlocal issued
+        while True:
+            if total is not None and issued >= total:
+                return
+            if deadline is not None and time.perf_counter() >= deadline:
+                return
+            issued += 1
+            await next_request(issued - 1)
+    
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return time.perf_counter() - start
+
+def make_client(args: argparse.Namespace) -> httpx.AsyncClient:
+    """HTTP client sized for the requested concurrency"""
+    return httpx.AsyncClient(
+        base_url=args.base_url.rstrip("/") + args.api_prefix,
+        timeout=args.timeout,
+        limits=httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    )
+
+async def run_http(args: argparse.Namespace) -> Dict[str, Any]:
+    """Benchmark the /ai/* routes with a weighted request mix"""
+    mix = parse_mix(args.mix)
+    tasks, weights = zip(*mix)
+    rng = random.Random(args.seed)
+    factory = PayloadFactory([int(size) for size in args.text_sizes.split(",")], args.cache_hit_ratio, args.seed)
+    recorder = LatencyRecorder()
+    
+    async with make_client(args) as client:
+        async def next_request(_: int):
+            task = rng.choices(tasks, weights)[0]
+            use_async = rng.random() < args.async_ratio
+            await send_request(client, recorder, TASK_PATHS[task], factory.build(task), use_async, args)
+        
+        total = None if args.duration else args.requests
+        elapsed = await run_workers(total, args.duration, args.concurrency, next_request)
+    return {"elapsed_s": elapsed, "counters": dict(recorder.counters), "results": recorder.summary(elapsed)}
+
+def load_replay(path: str, task: str) -> List[Tuple[str, Dict[str, Any]]]:
+    """Load (path, payload) pairs from a JSONL traffic file
+    
+    Lines with "path" and "payload" are sent as-is. Any other line (for
+    example a backlog entry with title/body) becomes a `task` request built
+    from its text fields.
+    """
+    requests = []
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if "path" in record and "payload" in record:
+                requests.append((record["path"], record["payload"]))
+                continue
+            
+            text = "\n\n".join(str(record[field]) for field in ("title", "body", "text") if record.get(field))
+            text = text[:TASK_MAX_CHARS[task]]
+            if task == "summarize":
+                payload = {"text": text, "max_length": 200}
+            elif task == "question_answer":
+                payload = {"context": text, "question": record.get("question", "What is being requested?")}
+            elif task == "tone_rewrite":
+                payload = {"text": text, "target_tone": record.get("target_tone", "formal")}
+            else:
+                payload = {"text": text, "target_language": record.get("target_language", "Spanish")}
+            requests.append((TASK_PATHS[task], payload))
+    return requests
+
+async def run_replay(args: argparse.Namespace) -> Dict[str, Any]:
+    """Replay captured traffic, looping over the file `--passes` times"""
+    traffic = load_replay(args.file, args.task)
+    if not traffic:
+        raise SystemExit(f"No requests found in {args.file}")
+    total = len(traffic) * args.passes
+    recorder = LatencyRecorder()
+    
+    async with make_client(args) as client:
+        async def next_request(index: int):
+            path, payload = traffic[index % len(traffic)]
+            use_async = path.endswith("/async")
+            await send_request(client, recorder, path[:-len("/async")] if use_async else path, payload, use_async, args)
+        
+        elapsed = await run_workers(total, None, args.concurrency, next_request)
+    return {
+        "elapsed_s": elapsed,
+        "requests_in_file": len(traffic),
+        "counters": dict(recorder.counters),
+        "results": recorder.summary(elapsed)
+    }
+
+async def run_cache(args: argparse.Namespace) -> Dict[str, Any]:
+    """Benchmark CacheService get/set directly against the configured Redis"""
+    from app.services.cache_service import cache_service
+    
+    rng = random.Random(args.seed)
+    recorder = LatencyRecorder()
+    value = {"summary": "x" * args.value_size, "processing_time": 1.0}
+    hot_keys = [f"bench:{args.seed}:hot:{i}" for i in range(args.keys)]
+    for key in hot_keys:
+        await cache_service.set(key, value, ttl=args.ttl)
+    
+    async def next_request(index: int):
+        roll = rng.random()
+        start = time.perf_counter()
+        if roll < args.write_ratio:
+            ok = await cache_service.set(rng.choice(hot_keys), value, ttl=args.ttl)
+            recorder.record("set", time.perf_counter() - start, "ok" if ok else "error", bool(ok))
+        elif roll < args.write_ratio + (1 - args.write_ratio) * args.cache_hit_ratio:
+            result = await cache_service.get(rng.choice(hot_keys))
+            recorder.record("get (hit)", time.perf_counter() - start, "hit" if result else "miss", result is not None)
+        else:
+            result = await cache_service.get(f"bench:{args.seed}:cold:{index}")
+            recorder.record("get (miss)", time.perf_counter() - start, "miss" if result is None else "hit", True)
+    
+    total = None if args.duration else args.operations
+    elapsed = await run_workers(total, args.duration, args.concurrency, next_request)
+    for key in hot_keys:
+        await cache_service.delete(key)
+    return {"elapsed_s": elapsed, "results": recorder.summary(elapsed)}
+
+def compare(args: argparse.Namespace):
+    """Print throughput and p95 deltas between two result files"""
+    with open(args.baseline) as f:
+        baseline = json.load(f)["results"]
+    with open(args.candidate) as f:
+        candidate = json.load(f)["results"]
+    
+    regressions = 0
+    print(f"{'endpoint':45} {'rps':>18} {'p95 ms':>22}")
+    for name in sorted(set(baseline) & set(candidate)):
+        old, new = baseline[name], candidate[name]
+        rps_delta = (new["throughput_rps"] / old["throughput_rps"] - 1) * 100 if old["throughput_rps"] else 0.0
+        p95_old, p95_new = old["latency_ms"]["p95"], new["latency_ms"]["p95"]
+        p95_delta = (p95_new / p95_old - 1) * 100 if p95_old else 0.0
+        flag = ""
+        if p95_delta > args.threshold or rps_delta < -args.threshold:
+            flag = "  REGRESSION"
+            regressions += 1
+        print(f"{name:45} {new['throughput_rps']:9.1f} ({rps_delta:+6.1f}%) {p95_new:11.1f} ({p95_delta:+6.1f}%){flag}")
+    sys.exit(1 if regressions else 0)
+
+def save_results(args: argparse.Namespace, report: Dict[str, Any]) -> str:
+    """Write a result file and return its path"""
+    os.makedirs(args.output_dir, exist_ok=True)
+    started = datetime.now().strftime("%Y%m%d-%H%M%S")
+    path = os.path.join(args.output_dir, f"{args.command}-{started}.json")
+    config = {key: value for key, value in vars(args).items() if key != "func"}
+    with open(path, "w") as f:
+        json.dump({"benchmark": args.command, "started_at": started, "config": config, **report}, f, indent=2)
+    return path
+
+def print_summary(report: Dict[str, Any]):
+    """Print a human-readable table of the results"""
+    print(f"{'endpoint':45} {'count':>7} {'err%':>6} {'hit%':>6} {'rps':>8} {'p50':>9} {'p95':>9} {'p99':>9}")
+    for name, stats in report["results"].items():
+        latency = stats["latency_ms"]
+        print(
+            f"{name:45} {stats['count']:7d} {stats['error_rate'] * 100:6.1f} {stats['cache_hit_ratio'] * 100:6.1f} "
+            f"{stats['throughput_rps']:8.1f} {latency['p50']:9.1f} {latency['p95']:9.1f} {latency['p99']:9.1f}"
+        )
+    for name, value in report.get("counters", {}).items():
+        print(f"{name}: {value}")
+
+def add_load_options(parser: argparse.ArgumentParser):
+    """Options shared by the HTTP-driving subcommands"""
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--api-prefix", default="/api/v1")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Per-request timeout in seconds")
+    parser.add_argument("--poll-interval", type=float, default=0.5, help="Seconds between /jobs polls")
+    parser.add_argument("--job-timeout", type=float, default=300.0, help="Max seconds to wait for an async job")
+
+def build_parser() -> argparse.ArgumentParser:
+    """Command-line interface"""
+    parser = argparse.ArgumentParser(description="Benchmark the AI Backend Service")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    
+    http = subparsers.add_parser("http", help="Drive the /ai/* routes with a synthetic request mix")
+    add_load_options(http)
+    http.add_argument("--mix", default="summarize=1,question_answer=1,tone_rewrite=1,translate=1")
+    http.add_argument("--text-sizes", default="200,1000,5000", help="Comma-separated text sizes in characters")
+    http.add_argument("--cache-hit-ratio", type=float, default=0.0, help="Fraction of requests that repeat a payload")
+    http.add_argument("--async-ratio", type=float, default=0.0, help="Fraction sent to /async and polled via /jobs")
+    
+    replay = subparsers.add_parser("replay", help="Replay a JSONL traffic file")
+    add_load_options(replay)
+    replay.add_argument("file")
+    replay.add_argument("--task", choices=list(TASK_PATHS), default="summarize", help="Task for lines without a path")
+    replay.add_argument("--passes", type=int, default=1, help="Times to replay the file")
+    
+    cache = subparsers.add_parser("cache", help="Benchmark the cache layer in isolation")
+    cache.add_argument("--operations", type=int, default=10000)
+    cache.add_argument("--keys", type=int, default=1000, help="Number of hot keys")
+    cache.add_argument("--value-size", type=int, default=1024, help="Cached text size in characters")
+    cache.add_argument("--write-ratio", type=float, default=0.1)
+    cache.add_argument("--cache-hit-ratio", type=float, default=0.9, help="Fraction of reads that hit")
+    cache.add_argument("--ttl", type=int, default=600)
+    
+    for sub in (http, replay, cache):
+        sub.add_argument("--concurrency", type=int, default=10)
+        sub.add_argument("--seed", type=int, default=42)
+        sub.add_argument("--output-dir", default="benchmarks/results")
+    http.add_argument("--requests", type=int, default=1000, help="Total requests")
+    for sub in (http, cache):
+        sub.add_argument("--duration", type=float, default=None, help="Run for this many seconds instead of a fixed count")
+    
+    diff = subparsers.add_parser("compare", help="Compare two result files")
+    diff.add_argument("baseline")
+    diff.add_argument("candidate")
+    diff.add_argument("--threshold", type=float, default=10.0, help="Percent change flagged as a regression")
+    return parser
+
+RUNNERS = {"http": run_http, "replay": run_replay, "cache": run_cache}
+
+def main():
+    """Run the selected benchmark and save its results"""
+    args = build_parser().parse_args()
+    if args.command == "compare":
+        compare(args)
+        return
+    
+    report = asyncio.run(RUNNERS[args.command](args))
+    print_summary(report)
+    print(f"\nSaved results to {save_results(args, report)}")
+
+if __name__ == "__main__":
+    main()
@@ -78,16 +78,30 @@ class AIBackendClient:
         return response.json()
     
     def wait_for_job(self, job_id: str, timeout: int = 60) -> Dict[str, Any]:
-        """Wait for async job to complete"""
-        start_time = time.time()
+        """Wait for async job to complete
         
-        while time.time() - start_time < timeout:
-            status = self.get_job_status(job_id)
+        Long-polls /jobs/{job_id}?wait=..., so the server answers as soon as
+        the job finishes instead of the client sleeping between polls. Server
+        errors are retried after a growing delay; an unknown job is returned
+        as an error right away.
+        """
+        deadline = time.time() + timeout
+        retry_delay = 1
+        
+        while (remaining := deadline - time.time()) > 0:
+            wait = min(30, remaining)
+            response = requests.get(f"{self.api_base}/jobs/{job_id}", params={"wait": wait}, timeout=wait + 10)
+            if response.status_code == 404:
+                return {"error": "Job not found"}
+            if response.status_code != 200:
+                time.sleep(min(retry_delay, max(0, deadline - time.time())))
+                retry_delay = min(retry_delay * 2, 10)
+                continue
             
-            if status.get("status") in ["completed", "failed"]:
+            retry_delay = 1
+            status = response.json()
+            if status.get("status") in ["completed", "failed", "cancelled"]:
                 return status
-            
-            time.sleep(2)
         
         return {"error": "Job timeout"}
 
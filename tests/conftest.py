@@ -1,6 +1,14 @@
+import os
+
+# Run the suite offline against the deterministic stub model backend
+os.environ.setdefault("AI_BACKEND", "stub")
+os.environ.setdefault("STUB_LATENCY_MS", "0")
+
+import fakeredis
 import pytest
 from fastapi.testclient import TestClient
 from app.main import app
+from app.services.cache_service import cache_service
 
 @pytest.fixture
 def client():
@@ -15,4 +23,13 @@ def sample_text():
 @pytest.fixture
 def sample_context():
     """Sample context for Q&A testing"""
-    return "Python is a high-level programming language. It was created by Guido van Rossum and released in 1991. Python is known for its simple syntax and readability."
\ No newline at end of file
+    return "Python is a high-level programming language. It was created by Guido van Rossum and released in 1991. Python is known for its simple syntax and readability."
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    """In-memory Redis (with Lua scripting) serving the cache, job store and pub/sub; no L1 in front"""
+    client = fakeredis.aioredis.FakeRedis()
+    monkeypatch.setattr(cache_service, "redis_client", client)
+    monkeypatch.setattr(cache_service, "pubsub_client", client)
+    monkeypatch.setattr(cache_service, "l1", None)
+    return client
@@ -1,5 +1,6 @@
 import pytest
 from fastapi.testclient import TestClient
+from app.services.ai_service import ai_service
 
 def test_root_endpoint(client):
     """Test root endpoint"""
@@ -53,6 +54,58 @@ def test_async_summarize_endpoint(client, sample_text):
     assert data["success"] is True
     assert "job_id" in data["data"]
 
+def test_summarize_stream_endpoint(client, sample_text, monkeypatch):
+    """Test streaming summarization endpoint"""
+    class StreamingBackend:
+        name = "streaming"
+        
+        def stream(self, prompt):
+            yield "A short "
+            yield "summary."
+    
+    monkeypatch.setattr(ai_service, "backend", StreamingBackend())
+    payload = {
+        "text": sample_text,
+        "max_length": 100
+    }
+    response = client.post("/api/v1/ai/summarize/stream", json=payload)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert "event: done" in response.text
+    assert "A short summary." in response.text
+
+def test_blocked_prompt_returns_422(client):
+    """Deterministic upstream refusals should be reported as unprocessable input"""
+    from app.core.config import settings
+    
+    payload = {
+        "text": f"This text is refused upstream {settings.stub_block_marker}",
+        "max_length": 100
+    }
+    response = client.post("/api/v1/ai/summarize", json=payload)
+    assert response.status_code == 422
+    assert "blocked" in response.json()["detail"]
+
+def test_batch_submit_validates_each_item(client):
+    """Batch items should be validated against their task type's request model"""
+    payload = {
+        "items": [
+            {"task_type": "translate", "payload": {"text": "Hello", "target_language": "fr"}},
+            {"task_type": "summarize", "payload": {"text": "too short"}}
+        ]
+    }
+    response = client.post("/api/v1/ai/batch", json=payload)
+    assert response.status_code == 422
+
+def test_long_context_requires_passage_selection(client):
+    """Contexts over the whole-context limit should be rejected unless passages are selected"""
+    payload = {
+        "context": "Python is a programming language. " * 200,
+        "question": "Who created Python?"
+    }
+    response = client.post("/api/v1/ai/question-answer", json=payload)
+    assert response.status_code == 422
+
 def test_invalid_input_validation(client):
     """Test input validation"""
     payload = {
@@ -60,4 +113,104 @@ def test_invalid_input_validation(client):
         "max_length": 100
     }
     response = client.post("/api/v1/ai/summarize", json=payload)
-    assert response.status_code == 422  # Validation error
\ No newline at end of file
+    assert response.status_code == 422  # Validation error
+
+@pytest.mark.asyncio
+async def test_cancel_job_endpoints(monkeypatch, fake_redis):
+    """Cancelling should revoke unfinished jobs, 404 on unknown IDs and 409 on finished jobs"""
+    from fastapi import HTTPException
+    from app.api.routes import jobs
+    from app.models.responses import JobStatus
+    from app.services.job_service import job_service
+    
+    revoked = []
+    monkeypatch.setattr(jobs, "revoke_tasks", revoked.extend)
+    job_id = await job_service.create_job("summarize", "payload:abc")
+    
+    response = await jobs.cancel_job(job_id, user={})
+    assert response.data == {"job_id": job_id, "status": "cancelled"}
+    assert revoked == [job_id]
+    for missing_or_finished, status_code in (("missing", 404), (job_id, 409)):
+        with pytest.raises(HTTPException) as error:
+            await jobs.cancel_job(missing_or_finished, user={})
+        assert error.value.status_code == status_code
+    
+    batch_id, job_ids = await job_service.create_batch([("translate", f"payload:{i}") for i in range(3)])
+    await job_service.update_job_status(job_ids[0], JobStatus.COMPLETED, {"translation": "texte"})
+    response = await jobs.cancel_batch(batch_id, user={})
+    assert response.data == {"batch_id": batch_id, "cancelled": 2, "total": 3}
+    assert revoked == [job_id] + job_ids[1:]
+    with pytest.raises(HTTPException) as error:
+        await jobs.cancel_batch("missing", user={})
+    assert error.value.status_code == 404
+
+@pytest.mark.asyncio
+async def test_cancelling_shared_job_withdraws_one_submission(monkeypatch, fake_redis):
+    """A job identical submissions attached to should only be cancelled by its last submitter"""
+    from app.api.routes import jobs
+    from app.models.responses import JobStatus
+    from app.services.job_service import job_service
+    
+    revoked = []
+    monkeypatch.setattr(jobs, "revoke_tasks", revoked.extend)
+    job_id, _ = await job_service.claim_inflight("summary:shared")
+    await job_service.create_job("summarize", "payload:abc", job_id=job_id)
+    for _ in range(2):
+        assert await job_service.claim_inflight("summary:shared") == (job_id, True)
+    
+    for _ in range(2):
+        response = await jobs.cancel_job(job_id, user={})
+        assert response.data == {"job_id": job_id, "status": "withdrawn"}
+        assert (await job_service.get_job_status(job_id)).status == JobStatus.PENDING
+    assert revoked == []
+    
+    response = await jobs.cancel_job(job_id, user={})
+    assert response.data == {"job_id": job_id, "status": "cancelled"}
+    assert revoked == [job_id]
+
+@pytest.mark.asyncio
+async def test_document_question_accepts_more_passages_than_full_context_limit(fake_redis):
+    """Selected document passages should reach the model even when they exceed the inline context limit"""
+    from app.api.routes import ai_tasks
+    from app.models.requests import QA_FULL_CONTEXT_MAX_LENGTH, DocumentQuestionRequest
+    from app.services.document_service import document_service
+    
+    text = " ".join(f"Python release {i} shipped new syntax and faster startup for developers." for i in range(200))
+    document = await document_service.ingest(text)
+    request = DocumentQuestionRequest(
+        doc_id=document["doc_id"], question="What did Python releases ship?", top_k=8, max_context_tokens=4000
+    )
+    
+    passages = (await document_service.get_index(request.doc_id)).top_passages(
+        request.question, request.top_k, request.max_context_tokens
+    )
+    assert len("\n\n".join(passages)) > QA_FULL_CONTEXT_MAX_LENGTH
+    response = await ai_tasks.answer_document_question_sync(request, user={})
+    assert response.success and response.data["answer"]
+
+@pytest.mark.asyncio
+async def test_job_that_cannot_be_queued_fails_for_attached_submitters(fake_redis):
+    """Submitters attached to a job should see it fail if it cannot be queued, and never see a partial record"""
+    from app.api.routes import ai_tasks
+    from app.models.responses import JobStatus
+    from app.services.job_service import job_service
+    
+    # Attaching while the creator is still between claiming and creating the job
+    job_id, _ = await job_service.claim_inflight("summary:creating")
+    assert await job_service.claim_inflight("summary:creating") == (job_id, True)
+    assert (await job_service.get_job_status(job_id)).status == JobStatus.PENDING
+    
+    class BrokerDown:
+        queued = []
+        
+        def apply_async(self, args, task_id):
+            self.queued.append(task_id)
+            raise ConnectionError("broker unavailable")
+    
+    broker = BrokerDown()
+    with pytest.raises(ConnectionError):
+        await ai_tasks._submit_job("summarize", {"text": "Some text to summarize."}, broker, "summary:unqueued", "summary")
+    job = await job_service.get_job_status(broker.queued[0])
+    assert job.status == JobStatus.FAILED and "broker unavailable" in job.error
+    _, attached = await job_service.claim_inflight("summary:unqueued")
+    assert not attached
@@ -1,4 +1,7 @@
+import asyncio
+import time
 import pytest
+from app.services.ai_service import ai_service
 from app.services.cache_service import cache_service
 from app.models.requests import SummarizeRequest
 
@@ -27,4 +30,643 @@ def test_summarize_request_validation():
     
     # Test validation with invalid data
     with pytest.raises(ValueError):
-        SummarizeRequest(text="", max_length=100)  # Empty text
\ No newline at end of file
+        SummarizeRequest(text="", max_length=100)  # Empty text
+
+@pytest.mark.asyncio
+async def test_ai_service_runs_upstream_calls_concurrently(monkeypatch):
+    """Blocking SDK calls should run off the event loop in parallel"""
+    class SlowBackend:
+        name = "slow"
+        
+        def generate(self, prompt):
+            time.sleep(0.2)
+            return f" {prompt} "
+    
+    monkeypatch.setattr(ai_service, "backend", SlowBackend())
+    start_time = time.perf_counter()
+    results = await asyncio.gather(*(ai_service._generate(f"p{i}") for i in range(4)))
+    
+    assert results == ["p0", "p1", "p2", "p3"]
+    assert time.perf_counter() - start_time < 0.6
+
+@pytest.mark.asyncio
+async def test_request_coalescer_runs_identical_requests_once():
+    """Concurrent callers with the same key should share one upstream call"""
+    from app.services.coalescing_service import RequestCoalescer
+    
+    coalescer = RequestCoalescer()
+    calls = []
+    
+    async def producer():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return {"summary": "shared"}
+    
+    results = await asyncio.gather(*(coalescer.run("summary:abc", producer) for _ in range(5)))
+    
+    assert len(calls) == 1
+    assert all(result == {"summary": "shared"} for result, _ in results)
+    assert sum(shared for _, shared in results) == 4
+
+@pytest.mark.asyncio
+async def test_request_coalescer_keeps_producing_when_leader_caller_is_cancelled():
+    """A cancelled first caller should not cancel the shared work other callers wait on"""
+    from app.services.coalescing_service import RequestCoalescer
+    
+    coalescer = RequestCoalescer()
+    calls = []
+    
+    async def producer():
+        calls.append(1)
+        await asyncio.sleep(0.1)
+        return {"summary": "shared"}
+    
+    leader = asyncio.create_task(coalescer.run("summary:abc", producer))
+    await asyncio.sleep(0.01)
+    follower = asyncio.create_task(coalescer.run("summary:abc", producer))
+    await asyncio.sleep(0.01)
+    leader.cancel()
+    
+    assert await follower == ({"summary": "shared"}, True)
+    assert leader.cancelled() and len(calls) == 1
+    
+    abandoned = asyncio.create_task(coalescer.run("summary:gone", producer))
+    await asyncio.sleep(0.01)
+    abandoned.cancel()
+    await asyncio.sleep(0)
+    assert not coalescer._inflight
+
+@pytest.mark.asyncio
+async def test_request_coalescer_renews_lock_for_slow_leaders(monkeypatch, fake_redis):
+    """A producer that outlives the lock TTL should still run once across processes"""
+    from app.core.config import settings
+    from app.services.coalescing_service import RequestCoalescer
+    
+    monkeypatch.setattr(settings, "coalesce_lock_ttl", 1)
+    calls = []
+    
+    async def producer():
+        calls.append(1)
+        await asyncio.sleep(1.5)
+        result = {"summary": "slow"}
+        await cache_service.set("summary:slow", result)
+        return result
+    
+    leader, follower = RequestCoalescer(), RequestCoalescer()
+    results = await asyncio.gather(
+        leader.run("summary:slow", producer),
+        follower.run("summary:slow", producer, wait_timeout=5)
+    )
+    
+    assert len(calls) == 1
+    assert results == [({"summary": "slow"}, False), ({"summary": "slow"}, True)]
+
+@pytest.mark.asyncio
+async def test_micro_batcher_groups_requests_by_language(monkeypatch):
+    """Short translations to the same language should share one model call"""
+    from app.core.config import settings
+    from app.models.requests import TranslateRequest
+    from app.services.batch_service import MicroBatcher
+    
+    monkeypatch.setattr(settings, "batch_window_ms", 20)
+    calls = []
+    
+    async def translate_batch(texts, target_language, source_language=None):
+        calls.append(texts)
+        return [f"{target_language}:{text}" for text in texts]
+    
+    monkeypatch.setattr(ai_service, "translate_batch", translate_batch)
+    batcher = MicroBatcher()
+    results = await asyncio.gather(
+        batcher.translate(TranslateRequest(text="one", target_language="French")),
+        batcher.translate(TranslateRequest(text="two", target_language="French")),
+        batcher.translate(TranslateRequest(text="three", target_language="French"))
+    )
+    
+    assert results == ["French:one", "French:two", "French:three"]
+    assert calls == [["one", "two", "three"]]
+
+def test_parse_batch_response_rejects_wrong_length():
+    """Malformed batch answers should raise so callers can fall back"""
+    assert ai_service.parse_batch_response('```json\n["a", "b"]\n```', 2) == ["a", "b"]
+    with pytest.raises(ValueError):
+        ai_service.parse_batch_response('["a"]', 2)
+
+def test_split_text_respects_boundaries():
+    """Chunks should stay under the limit and prefer paragraph boundaries"""
+    from app.utils.text_chunker import split_text
+    
+    paragraphs = [f"Paragraph {i}. " + "Sentence here. " * 10 for i in range(6)]
+    chunks = split_text("\n\n".join(paragraphs), 400)
+    
+    assert all(len(chunk) <= 400 for chunk in chunks)
+    assert chunks[0].startswith("Paragraph 0.")
+    assert sum(chunk.count("Paragraph") for chunk in chunks) == 6
+
+@pytest.mark.asyncio
+async def test_long_document_summarizer_reduces_chunks(monkeypatch):
+    """Long documents should be summarized per chunk and then reduced"""
+    from app.core.config import settings
+    from app.models.requests import LongSummarizeRequest
+    from app.services.summarization_service import LongDocumentSummarizer
+    
+    monkeypatch.setattr(settings, "long_summary_chunk_chars", 1000)
+    monkeypatch.setattr(settings, "long_summary_chunk_summary_length", 50)
+    calls = []
+    
+    async def summarize_text(request):
+        calls.append(len(request.text))
+        return f"summary of {len(request.text)} chars"
+    
+    monkeypatch.setattr(ai_service, "summarize_text", summarize_text)
+    text = "\n\n".join("Sentence number one. " * 20 for _ in range(10))
+    result = await LongDocumentSummarizer().summarize(LongSummarizeRequest(text=text))
+    
+    assert result.startswith("summary of")
+    assert len(calls) > 2
+    assert calls[-1] < 1000
+
+def test_bm25_selects_relevant_passages():
+    """Passage selection should keep the passages that match the question"""
+    from app.services.retrieval_service import BM25Index
+    
+    passages = [
+        "Python was created by Guido van Rossum.",
+        "Bananas are rich in potassium.",
+        "The Eiffel Tower is in Paris.",
+        "Guido worked at Google and Dropbox."
+    ]
+    index = BM25Index(passages)
+    
+    selected = index.top_passages("Who created Python?", top_k=1, token_budget=100)
+    assert selected == ["Python was created by Guido van Rossum."]
+    assert index.top_passages("Where did Guido work?", top_k=2, token_budget=100)[-1] == passages[3]
+
+def test_bm25_index_round_trips_through_dict():
+    """A stored document index should rank exactly like the freshly built one"""
+    from app.services.retrieval_service import BM25Index
+    
+    index = BM25Index(["Redis stores data in memory.", "Celery runs background jobs.", "FastAPI serves HTTP."])
+    restored = BM25Index.from_dict(index.to_dict())
+    
+    assert restored.score("background jobs").tolist() == index.score("background jobs").tolist()
+
+def test_stub_backend_is_deterministic(monkeypatch):
+    """The stub backend should answer identical prompts identically, offline"""
+    from app.core.config import settings
+    from app.services.ai_backends import StubBackend
+    
+    monkeypatch.setattr(settings, "stub_latency_ms", 0)
+    backend = StubBackend()
+    prompt = "Summarize the following text: caching makes repeated requests cheap."
+    
+    assert backend.generate(prompt) == StubBackend().generate(prompt)
+    assert "".join(backend.stream(prompt)) == backend.generate(prompt)
+    assert backend.generate(prompt) != backend.generate(prompt + " Again.")
+
+def test_local_cache_evicts_lru_and_expires():
+    """The L1 cache should stay within its entry/byte budgets and honour TTLs"""
+    from app.services.local_cache import LocalCache
+    
+    cache = LocalCache(max_entries=2, max_bytes=100)
+    cache.set("a", 1, ttl=60, size=10)
+    cache.set("b", 2, ttl=60, size=10)
+    cache.get("a")
+    cache.set("c", 3, ttl=60, size=10)
+    assert cache.get("b") is None and cache.get("a") == 1
+    
+    cache.set("big", 4, ttl=60, size=95)
+    assert cache.info()["bytes"] <= 100 and cache.get("big") == 4
+    
+    cache.set("short", 5, ttl=0.01, size=1)
+    time.sleep(0.02)
+    assert cache.get("short") is None
+    assert cache.info()["expirations"] == 1
+
+def test_value_codec_round_trips_and_reads_legacy_json():
+    """Encoded values should round-trip, compress when large and still read old JSON entries"""
+    from app.utils.codec import ValueCodec
+    
+    codec = ValueCodec("msgpack", compress_min_bytes=256, compression_level=1)
+    small = {"summary": "short", "cached": False}
+    large = {"summary": "repeated words " * 200}
+    
+    assert codec.decode(codec.encode(small)) == small
+    encoded = codec.encode(large)
+    assert len(encoded) < len("repeated words " * 200) and codec.decode(encoded) == large
+    assert codec.stats["compressed"] == 1
+    assert codec.decode(b'{"summary": "legacy"}') == {"summary": "legacy"}
+    assert ValueCodec("json", 0, 1).decode(codec.encode(small)) == small
+
+def test_cache_keys_normalize_and_include_model(monkeypatch):
+    """Equivalent requests should share a key; model or parameter changes should not"""
+    from app.core.config import settings
+    from app.models.requests import TranslateRequest
+    from app.services.cache_keys import cache_keys
+    
+    key = cache_keys.translate(TranslateRequest(text="Hello  world\n", target_language="French"))
+    assert key.startswith("translate:")
+    assert key == cache_keys.translate(TranslateRequest(text="Hello world", target_language="french"))
+    assert key != cache_keys.translate(TranslateRequest(text="Hello world", target_language="German"))
+    
+    monkeypatch.setattr(settings, "ai_model", "another-model")
+    assert key != cache_keys.translate(TranslateRequest(text="Hello world", target_language="French"))
+
+def test_simhash_matches_near_duplicates_only():
+    """Texts differing by a timestamp should fingerprint as near-duplicates, unrelated texts should not"""
+    from app.services.retrieval_service import tokenize
+    from app.services.similarity_cache import similarity, simhash
+    
+    body = " ".join(f"Item {i} of the weekly operations report was reviewed and approved by the team." for i in range(8))
+    first = simhash(tokenize(f"Report generated 2024-01-05 10:00. {body}"))
+    second = simhash(tokenize(f"Report generated 2024-01-06 11:30. {body}"))
+    other = simhash(tokenize("Redis keeps cached values in memory and expires them after their TTL. " * 3))
+    
+    assert similarity(first, second) >= 0.95
+    assert similarity(first, other) < 0.8
+
+@pytest.mark.asyncio
+async def test_similarity_bands_keep_only_newest_members(monkeypatch, fake_redis):
+    """LSH band sets should be trimmed to their size cap as entries are indexed"""
+    from app.core.config import settings
+    from app.services.similarity_cache import SimilarityCache
+    
+    monkeypatch.setattr(settings, "similarity_cache_enabled", True)
+    monkeypatch.setattr(settings, "similarity_cache_max_band_size", 3)
+    cache = SimilarityCache()
+    text = "The weekly operations report was reviewed and approved by the whole team today. " * 3
+    for i in range(10):
+        await cache.add("summary:scope", text, f"summary:{i}")
+    
+    band_keys = await fake_redis.keys("simband:*")
+    assert band_keys
+    for band_key in band_keys:
+        members = await fake_redis.zrange(band_key, 0, -1)
+        assert sorted(member.decode().partition("|")[2] for member in members) == ["summary:7", "summary:8", "summary:9"]
+
+@pytest.mark.asyncio
+async def test_stale_entries_are_served_and_refreshed_once(monkeypatch):
+    """A stale hit should be returned as-is while a single background refresh runs"""
+    from app.services.cache_service import SWR_MARKER
+    from app.services.coalescing_service import RequestCoalescer
+    
+    async def stale_entry(key):
+        return {SWR_MARKER: 1, "value": {"summary": "old"}, "fresh_until": time.time() - 1, "delta": 0.5}
+    
+    async def fresh_entry(key):
+        return {SWR_MARKER: 1, "value": {"summary": "new"}, "fresh_until": time.time() + 3600, "delta": 0.5}
+    
+    monkeypatch.setattr(cache_service, "_get_entry", stale_entry)
+    assert await cache_service.get_with_refresh("summary:k") == ({"summary": "old"}, True)
+    monkeypatch.setattr(cache_service, "_get_entry", fresh_entry)
+    assert await cache_service.get_with_refresh("summary:k") == ({"summary": "new"}, False)
+    
+    async def acquire_lock(key, token, ttl):
+        return True
+    
+    async def release_lock(key, token):
+        return True
+    
+    monkeypatch.setattr(cache_service, "acquire_lock", acquire_lock)
+    monkeypatch.setattr(cache_service, "release_lock", release_lock)
+    coalescer = RequestCoalescer()
+    calls = []
+    
+    async def producer():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"summary": "new"}
+    
+    assert coalescer.schedule_refresh("summary:k", producer)
+    assert not coalescer.schedule_refresh("summary:k", producer)
+    await asyncio.sleep(0.05)
+    assert len(calls) == 1 and coalescer.stats["refreshes"] == 1
+
+def test_cache_policy_scales_ttl_by_cost_and_reuse():
+    """Expensive, popular results should be kept longer; cheap one-offs skipped"""
+    from app.services.cache_policy import CachePolicy
+    
+    policy = CachePolicy()
+    policy.record_access("tone:cheap")
+    assert policy.ttl_for("tone:cheap", compute_time=0.01, size=100, base_ttl=3600) is None
+    
+    policy.record_access("summary:once")
+    for _ in range(8):
+        policy.record_access("summary:popular")
+    once = policy.ttl_for("summary:once", compute_time=2.0, size=100, base_ttl=3600)
+    popular = policy.ttl_for("summary:popular", compute_time=2.0, size=100, base_ttl=3600)
+    large = policy.ttl_for("summary:once", compute_time=2.0, size=200_000, base_ttl=3600)
+    
+    assert large < once < popular
+
+def test_cache_admin_loads_request_corpus(tmp_path):
+    """Corpus lines may name a task, an API path, or just carry text for the default task"""
+    import json
+    from app.models.requests import QuestionAnswerRequest
+    from app.tools.cache_admin import load_corpus
+    
+    corpus = tmp_path / "corpus.jsonl"
+    corpus.write_text("\n".join([
+        json.dumps({"task": "translate", "payload": {"text": "Hello", "target_language": "French"}}),
+        json.dumps({"path": "/api/v1/ai/tone-rewrite/async", "payload": {"text": "Hi there", "target_tone": "formal"}}),
+        json.dumps({"request_id": "r-1", "title": "Warm the cache", "body": "Replay requests after a deploy."}),
+        ""
+    ]))
+    
+    tasks = [task for task, _ in load_corpus(str(corpus), "summarize")]
+    assert tasks == ["translate", "tone_rewrite", "summarize"]
+    
+    long_text = tmp_path / "long.jsonl"
+    long_text.write_text(json.dumps({"body": "Replay requests after a deploy. " * 500}))
+    payload = load_corpus(str(long_text), "question_answer")[0][1]
+    assert QuestionAnswerRequest(**payload).context == payload["context"]
+
+def test_hash_ring_remaps_few_keys_and_honours_hash_tags():
+    """Adding a shard should move roughly 1/N of the keys; {tagged} keys should stay together"""
+    from app.services.redis_sharding import HashRing
+    
+    keys = [f"summary:{i}" for i in range(5000)]
+    before = HashRing(["redis://a", "redis://b", "redis://c"])
+    after = HashRing(["redis://a", "redis://b", "redis://c", "redis://d"])
+    moved = sum(before.node_for(key) != after.node_for(key) for key in keys)
+    
+    assert 0.15 < moved / len(keys) < 0.35
+    assert len({after.node_for(f"budget:{{summary}}:{part}") for part in ("keys", "sizes", "bytes")}) == 1
+
+@pytest.mark.asyncio
+async def test_ai_service_classifies_deterministic_failures(monkeypatch):
+    """Blocked prompts should be marked deterministic and injected failures transient"""
+    from app.core.config import settings
+    from app.services.ai_backends import StubBackend
+    from app.services.ai_service import AIServiceError
+    
+    monkeypatch.setattr(settings, "stub_latency_ms", 0)
+    monkeypatch.setattr(ai_service, "backend", StubBackend())
+    with pytest.raises(AIServiceError) as blocked:
+        await ai_service.summarize_text(SummarizeRequest(text=f"Unsafe {settings.stub_block_marker} text", max_length=50))
+    assert blocked.value.deterministic and blocked.value.reason == "prompt_blocked"
+    
+    monkeypatch.setattr(settings, "stub_error_rate", 1.0)
+    with pytest.raises(AIServiceError) as transient:
+        await ai_service.summarize_text(SummarizeRequest(text="Ordinary text", max_length=50))
+    assert not transient.value.deterministic
+
+@pytest.mark.asyncio
+async def test_job_transitions_are_guarded(fake_redis):
+    """Jobs should be created in one write and reject transitions out of a finished state"""
+    from app.models.responses import JobStatus
+    from app.services.job_service import job_service
+    
+    job_id = await job_service.create_job("summarize", "payload:abc")
+    assert (await job_service.get_job_status(job_id)).status == JobStatus.PENDING
+    
+    assert await job_service.update_job_status(job_id, JobStatus.PROCESSING)
+    assert await job_service.update_job_status(job_id, JobStatus.COMPLETED, {"summary": "hi"})
+    assert not await job_service.update_job_status(job_id, JobStatus.PROCESSING)
+    
+    job = await job_service.get_job_status(job_id)
+    assert job.status == JobStatus.COMPLETED and job.result == {"summary": "hi"}
+    assert await job_service.get_job_fields(job_id, ["payload_ref"]) == {"payload_ref": "payload:abc"}
+
+@pytest.mark.asyncio
+async def test_batch_counts_follow_job_transitions(fake_redis):
+    """Batch counters should track each job's status and page results in submission order"""
+    from app.models.responses import JobStatus
+    from app.services.job_service import job_service
+    
+    items = [("translate", f"payload:{i}") for i in range(4)]
+    batch_id, job_ids = await job_service.create_batch(items)
+    await job_service.update_job_status(job_ids[0], JobStatus.PROCESSING)
+    await job_service.update_job_status(job_ids[0], JobStatus.COMPLETED, {"translation": "texte 0"})
+    await job_service.update_job_status(job_ids[1], JobStatus.FAILED, error="upstream error")
+    
+    batch = await job_service.get_batch_status(batch_id, offset=0, limit=2)
+    assert batch.counts == {"pending": 2, "processing": 0, "completed": 1, "failed": 1, "cancelled": 0}
+    assert batch.progress == 0.5 and batch.total == 4
+    assert [item.job_id for item in batch.items] == job_ids[:2]
+    # Counters move in the transition script, so each job must share its batch's hash slot
+    from app.services.redis_sharding import hash_slot_key
+    assert hash_slot_key(job_service._job_key(job_ids[3])) == hash_slot_key(job_service._batch_key(batch_id))
+
+@pytest.mark.asyncio
+async def test_watch_job_wakes_on_published_transition(fake_redis):
+    """Waiting on a job should return as soon as a worker publishes its completion"""
+    from app.models.responses import JobStatus
+    from app.services.job_service import job_service
+    
+    job_id = await job_service.create_job("summarize", "payload:abc")
+    
+    async def complete():
+        await asyncio.sleep(0.1)
+        await job_service.update_job_status(job_id, JobStatus.COMPLETED, {"summary": "hi"})
+    
+    asyncio.create_task(complete())
+    start_time = time.perf_counter()
+    statuses = [job.status async for job in job_service.watch_job(job_id, timeout=5)]
+    
+    assert statuses == [JobStatus.PENDING, JobStatus.COMPLETED]
+    assert time.perf_counter() - start_time < 1
+    await job_service.stop_event_listener()
+
+@pytest.mark.asyncio
+async def test_job_watchers_share_one_subscription(monkeypatch, fake_redis):
+    """Many concurrent waiters should hold a single pub/sub connection between them"""
+    from app.models.responses import JobStatus
+    from app.services.job_service import job_service
+    
+    subscriptions = []
+    
+    def pubsub():
+        subscriptions.append(fake_redis.pubsub())
+        return subscriptions[-1]
+    
+    monkeypatch.setattr(cache_service, "pubsub", pubsub)
+    job_ids = [await job_service.create_job("summarize", f"payload:{i}") for i in range(60)]
+    
+    async def wait(job_id):
+        return [job.status async for job in job_service.watch_job(job_id, timeout=5)][-1]
+    
+    waiters = asyncio.gather(*(wait(job_id) for job_id in job_ids))
+    await asyncio.sleep(0.1)
+    for job_id in job_ids:
+        await job_service.update_job_status(job_id, JobStatus.COMPLETED, {"summary": "hi"})
+    
+    assert await asyncio.wait_for(waiters, 2) == [JobStatus.COMPLETED] * len(job_ids)
+    assert len(subscriptions) == 1
+    await job_service.stop_event_listener()
+
+@pytest.mark.asyncio
+async def test_long_document_summarizer_stops_between_chunks_when_cancelled(monkeypatch):
+    """A cancellation check raising mid-document should prevent further model calls"""
+    from app.core.config import settings
+    from app.models.requests import LongSummarizeRequest
+    from app.services.job_service import JobCancelledError
+    from app.services.summarization_service import LongDocumentSummarizer
+    
+    monkeypatch.setattr(settings, "long_summary_chunk_chars", 1000)
+    monkeypatch.setattr(settings, "long_summary_chunk_summary_length", 50)
+    monkeypatch.setattr(settings, "long_summary_concurrency", 1)
+    monkeypatch.setattr(cache_service, "redis_client", None)
+    calls = []
+    
+    async def summarize_text(request):
+        calls.append(1)
+        return "partial summary"
+    
+    async def check_cancelled():
+        if len(calls) >= 2:
+            raise JobCancelledError("cancelled")
+    
+    monkeypatch.setattr(ai_service, "summarize_text", summarize_text)
+    text = "\n\n".join(f"Sentence number {i}. " * 20 for i in range(10))
+    with pytest.raises(JobCancelledError):
+        await LongDocumentSummarizer().summarize(LongSummarizeRequest(text=text), check_cancelled)
+    assert len(calls) == 2
+
+@pytest.mark.asyncio
+async def test_payload_store_shares_identical_payloads(fake_redis):
+    """Identical payloads should be stored once under a content-addressed key"""
+    from app.services.payload_store import PayloadStore
+    
+    store = PayloadStore()
+    payload = {"text": "A long document. " * 500, "max_length": 200}
+    
+    refs = await store.put_many([payload, dict(payload), {"text": "Other", "max_length": 200}])
+    assert refs[0] == refs[1] != refs[2]
+    assert await store.put(payload) == refs[0]
+    assert store.stats["stored"] == 2 and store.stats["deduplicated"] == 2
+    assert len(await fake_redis.keys("payload:*")) == 2
+    assert await store.get(refs[0]) == payload
+
+@pytest.mark.asyncio
+async def test_duplicate_submissions_attach_to_unfinished_job(fake_redis):
+    """Identical submissions should share one unfinished job, and start a new one once it finishes"""
+    from app.models.responses import JobStatus
+    from app.services.job_service import job_service
+    
+    claims = await asyncio.gather(*(job_service.claim_inflight("summarize:abc") for _ in range(10)))
+    job_id = claims[0][0]
+    # Claims made before the job is even created attach to it
+    assert claims == [(job_id, False)] + [(job_id, True)] * 9
+    await job_service.create_job("summarize", "payload:abc", job_id=job_id)
+    assert await job_service.claim_inflight("summarize:abc") == (job_id, True)
+    
+    await job_service.update_job_status(job_id, JobStatus.COMPLETED, {"summary": "hi"})
+    next_id, attached = await job_service.claim_inflight("summarize:abc")
+    assert next_id != job_id and not attached
+    
+    cached_id = await job_service.create_job("summarize", result={"summary": "hi"})
+    job = await job_service.get_job_status(cached_id)
+    assert job.status == JobStatus.COMPLETED and job.completed_at is not None
+
+@pytest.mark.asyncio
+async def test_warm_document_index_follows_deletion_elsewhere(fake_redis):
+    """A document deleted by another process should stop being served from the in-memory index"""
+    from app.services.document_service import DocumentService
+    
+    service, other_process = DocumentService(), DocumentService()
+    document = await service.ingest("Python was created by Guido van Rossum. " * 50)
+    assert await service.get_index(document["doc_id"]) is not None
+    
+    assert await other_process.delete(document["doc_id"])
+    assert await service.get_index(document["doc_id"]) is None
+
+@pytest.mark.asyncio
+async def test_processes_without_l1_still_publish_invalidations(fake_redis):
+    """Worker writes and deletes should reach the L1 copies held by API processes"""
+    from app.core.config import settings
+    
+    pubsub = fake_redis.pubsub()
+    await pubsub.subscribe(settings.cache_invalidation_channel)
+    await pubsub.get_message(timeout=1)
+    await cache_service.set("summary:worker", {"summary": "new"})
+    await cache_service.delete("summary:worker")
+    await cache_service.set("job:other", {"status": "done"})
+    
+    messages = [await pubsub.get_message(timeout=1) for _ in range(3)]
+    keys = [message["data"].decode().split("|", 1)[1] for message in messages if message]
+    assert keys == ["summary:worker", "summary:worker"]
+    await pubsub.aclose()
+
+@pytest.mark.asyncio
+async def test_cache_set_keeps_budget_and_soft_expiry_consistent(monkeypatch, fake_redis):
+    """A failed write should not stay charged to its budget, and stored entries should report their soft expiry"""
+    
+    
+    assert await cache_service.set("summary:swr", {"summary": "hi"}, ttl=100, stale_ttl=50)
+    value, refresh = await cache_service.get_with_refresh("summary:swr")
+    assert value == {"summary": "hi"} and not refresh
+    assert 0 < await fake_redis.ttl("summary:swr") <= 150
+    
+    async def failing_setex(*args, **kwargs):
+        raise ConnectionError("connection lost")
+    
+    monkeypatch.setattr(fake_redis, "setex", failing_setex)
+    assert not await cache_service.set("summary:lost", {"summary": "x" * 1000})
+    assert await fake_redis.hget("budget:{summary}:sizes", "summary:lost") is None
+    assert await fake_redis.get("budget:{summary}:bytes") == await fake_redis.hget("budget:{summary}:sizes", "summary:swr")
+
+@pytest.mark.asyncio
+async def test_cancel_jobs_skips_finished_jobs_and_moves_batch_counts(fake_redis):
+    """Cancelling a batch's jobs should only touch unfinished ones and keep its counters in step"""
+    from app.models.responses import JobStatus
+    from app.services.job_service import job_service
+    
+    batch_id, job_ids = await job_service.create_batch([("translate", f"payload:{i}") for i in range(3)])
+    await job_service.update_job_status(job_ids[0], JobStatus.COMPLETED, {"translation": "texte"})
+    await job_service.update_job_status(job_ids[1], JobStatus.PROCESSING)
+    
+    cancelled, withdrawn = await job_service.cancel_jobs(job_ids + ["missing"])
+    assert cancelled == [(job_ids[1], job_ids[1]), (job_ids[2], job_ids[2])] and withdrawn == []
+    batch = await job_service.get_batch_status(batch_id, limit=0)
+    assert batch.counts == {"pending": 0, "processing": 0, "completed": 1, "failed": 0, "cancelled": 2}
+    assert not await job_service.update_job_status(job_ids[2], JobStatus.PROCESSING)
+    with pytest.raises(Exception, match="cancelled"):
+        await job_service.raise_if_cancelled(job_ids[2])
+
+@pytest.mark.asyncio
+async def test_run_cancellable_abandons_work_when_job_is_cancelled(fake_redis):
+    """A running coroutine should be cancelled as soon as its job turns CANCELLED"""
+    from app.services.job_service import job_service, JobCancelledError
+    
+    job_id = await job_service.create_job("summarize", "payload:abc")
+    work_cancelled = asyncio.Event()
+    
+    async def slow_work():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            work_cancelled.set()
+            raise
+    
+    async def cancel_soon():
+        await asyncio.sleep(0.1)
+        await job_service.cancel_jobs([job_id])
+    
+    asyncio.create_task(cancel_soon())
+    start_time = time.perf_counter()
+    with pytest.raises(JobCancelledError):
+        await job_service.run_cancellable(job_id, slow_work())
+    await asyncio.sleep(0)
+    
+    assert work_cancelled.is_set()
+    assert time.perf_counter() - start_time < 1
+    # Workers subscribe to their own job's channel only, and only while it runs
+    assert await fake_redis.pubsub_numpat() == 0
+    assert await fake_redis.pubsub_numsub(f"job_events:{job_id}") == [(f"job_events:{job_id}".encode(), 0)]
+
+def test_revoke_tasks_tolerates_broker_errors(monkeypatch):
+    """Revoking should pass task IDs to Celery and never fail the cancellation itself"""
+    from app.workers.celery_worker import celery_app, revoke_tasks
+    
+    revoked = []
+    monkeypatch.setattr(celery_app.control, "revoke", lambda task_ids: revoked.append(task_ids))
+    revoke_tasks(["a", "b"])
+    revoke_tasks([])
+    assert revoked == [["a", "b"]]
+    
+    def unreachable(task_ids):
+        raise ConnectionError("broker unreachable")
+    
+    monkeypatch.setattr(celery_app.control, "revoke", unreachable)
+    revoke_tasks(["c"])